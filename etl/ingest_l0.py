@@ -9,10 +9,12 @@ import logging
 import os
 import re
 import sys
+from functools import lru_cache
 from pathlib import Path
 from typing import Any, Optional
 
 import pandas as pd
+import pyarrow.parquet as pq
 import psycopg2
 import psycopg2.extras
 
@@ -572,10 +574,18 @@ def _infer_pg_type(dtype) -> str:
     return "TEXT"
 
 
+@lru_cache(maxsize=256)
+def _parquet_column_defs(path: str, mtime_ns: int) -> tuple[tuple[str, str], ...]:
+    """Column defs del footer del parquet; mtime_ns en la clave invalida la caché si cambia."""
+    # Tabla vacía con el esquema: mismos dtypes (y metadatos pandas) que read_parquet
+    df = pq.read_schema(path).empty_table().to_pandas()
+    return tuple((c, _infer_pg_type(df.dtypes[c])) for c in df.columns)
+
+
 def infer_column_defs_from_parquet(parquet_path: Path) -> list[tuple[str, str]]:
-    """Infiere (nombre, tipo_pg) a partir del esquema del parquet (leyendo una muestra)."""
+    """Infiere (nombre, tipo_pg) a partir del esquema del parquet (solo el footer, sin datos)."""
     try:
-        df = pd.read_parquet(parquet_path)
+        return list(_parquet_column_defs(str(parquet_path), Path(parquet_path).stat().st_mtime_ns))
     except Exception as e:
         _configure_logging()
         err_msg = str(e).lower()
@@ -586,7 +596,6 @@ def infer_column_defs_from_parquet(parquet_path: Path) -> list[tuple[str, str]]:
                 e,
             )
         raise
-    return [(c, _infer_pg_type(df.dtypes[c])) for c in df.columns]
 
 
 def ensure_l0_table(
@@ -774,16 +783,21 @@ def load_parquet_to_l0(
         )
         conn.commit()
 
-    # Build INSERT statement based on dataset type
+    # Build INSERT statement based on dataset type.
+    # ON CONFLICT DO NOTHING va multi-fila (execute_values, VALUES %s): admite
+    # claves repetidas en la misma sentencia (gana la primera, como fila a
+    # fila) y RETURNING cuenta las insertadas. DO UPDATE no admite tocar la
+    # misma fila dos veces en un INSERT, así que sigue siendo una sentencia por
+    # fila, enviadas por páginas con execute_batch.
     if is_subvenciones:
         insert_cols = [c for c, _ in column_defs]
-        placeholders = ", ".join(["%s"] * len(insert_cols))
         quoted = ", ".join(f'"{c}"' for c in insert_cols)
         full_table = f'"{schema}"."{table_name}"'
         insert_sql = f"""
             INSERT INTO {full_table} ({quoted})
-            VALUES ({placeholders})
+            VALUES %s
             ON CONFLICT (id) DO NOTHING
+            RETURNING 1
         """
     else:
         if has_cpv:
@@ -817,8 +831,9 @@ def load_parquet_to_l0(
         else:
             insert_sql = f"""
             INSERT INTO {full_table} ({quoted})
-            VALUES ({placeholders})
+            VALUES %s
             ON CONFLICT (natural_id) DO NOTHING
+            RETURNING 1
         """
 
     parquet_cols_ordered = [c for c, _ in column_defs]
@@ -999,10 +1014,14 @@ def load_parquet_to_l0(
 
                 total_candidates += len(rows)
                 if rows:
-                    for row_tuple in rows:
-                        cur.execute(insert_sql, row_tuple)
-                        if not is_nacional:
-                            inserted += cur.rowcount or 0
+                    # Un round-trip por lote en vez de uno por fila
+                    if is_nacional:
+                        psycopg2.extras.execute_batch(cur, insert_sql, rows, page_size=len(rows))
+                    else:
+                        returned = psycopg2.extras.execute_values(
+                            cur, insert_sql, rows, page_size=len(rows), fetch=True
+                        )
+                        inserted += len(returned)
                     conn.commit()
         if is_nacional:
             with conn.cursor() as cur:
@@ -154,31 +154,45 @@ def cross_validate(df_placsp, df_ted):
     # Índice secundario: nº expediente → entries
     ted_lookup_exp = defaultdict(list)
     
-    for _, row in ted_valid.iterrows():
-        nif = str(row.get('win_nif_clean', '')).strip()
-        imp = row['importe_ted']
-        yr = row.get('year', np.nan)
+    # Columnas como arrays: el bucle recorre tuplas con zip, sin construir
+    # una Series por fila (iterrows)
+    def _col(name, default=''):
+        if name in ted_valid.columns:
+            return ted_valid[name].to_numpy()
+        return np.full(len(ted_valid), default, dtype=object)
+    
+    ted_cols = zip(
+        _col('win_nif_clean'), ted_valid['importe_ted'].to_numpy(), _col('year', np.nan),
+        _col('ted_notice_id'), _col('number_offers', np.nan), _col('cpv'), _col('cae_name'),
+        _col('win_size'), _col('direct_award_justification'), _col('sme_participation'),
+        _col('buyer_legal_type'), _col('duration_lot', np.nan), _col('award_criterion_type'),
+        _col('internal_id_proc'),
+    )
+    for (nif, imp, yr, ted_id, n_ofertas, cpv, cae, win_size, direct_award, sme_part,
+         legal_type, duration, criterion, internal_id) in ted_cols:
+        nif = str(nif).strip()
+        internal_id = str(internal_id)
         
         entry = {
             'importe': imp,
-            'ted_id': str(row.get('ted_notice_id', '')),
-            'n_ofertas': row.get('number_offers', np.nan),
-            'cpv_ted': str(row.get('cpv', '')),
-            'cae_ted': str(row.get('cae_name', '')),
-            'win_size': str(row.get('win_size', '')),
-            'direct_award': str(row.get('direct_award_justification', '')),
-            'sme_part': str(row.get('sme_participation', '')),
-            'buyer_legal_type': str(row.get('buyer_legal_type', '')),
-            'duration_lot': row.get('duration_lot', np.nan),
-            'award_criterion_type': str(row.get('award_criterion_type', '')),
-            'internal_id': str(row.get('internal_id_proc', '')),
+            'ted_id': str(ted_id),
+            'n_ofertas': n_ofertas,
+            'cpv_ted': str(cpv),
+            'cae_ted': str(cae),
+            'win_size': str(win_size),
+            'direct_award': str(direct_award),
+            'sme_part': str(sme_part),
+            'buyer_legal_type': str(legal_type),
+            'duration_lot': duration,
+            'award_criterion_type': str(criterion),
+            'internal_id': internal_id,
             'consumed': False,
         }
         
         if nif and len(nif) >= 5 and pd.notna(yr):
             ted_lookup[(nif, int(yr))].append(entry)
         
-        exp_id = str(row.get('internal_id_proc', '')).strip()
+        exp_id = internal_id.strip()
         if exp_id and len(exp_id) >= 4:
             ted_lookup_exp[exp_id.upper()].append(entry)
     
@@ -208,15 +222,21 @@ def cross_validate(df_placsp, df_ted):
     n_match_exp = 0
     
     total = len(pipeline_ue)
-    for count, (idx, row) in enumerate(pipeline_ue.iterrows()):
+    # Mismo patrón que el índice TED: columnas como arrays y zip, sin una
+    # Series por fila
+    pipe_exps = pipeline_ue['_expediente'].to_numpy() if '_expediente' in pipeline_ue.columns \
+        else np.full(total, '', dtype=object)
+    pipe_rows = zip(
+        pipeline_ue.index, pipeline_ue['_nif'].to_numpy(), pipeline_ue['_imp_adj'].to_numpy(),
+        pipeline_ue['_año'].to_numpy(), pipe_exps,
+    )
+    for count, (idx, nif, imp, yr, expediente) in enumerate(pipe_rows):
         if count % 100_000 == 0 and count > 0:
             elapsed = time.time() - t0
             pct = count / total * 100
             print(f"    {count:,}/{total:,} ({pct:.0f}%) - {len(matched_idx):,} matches - {elapsed:.0f}s")
         
-        nif = row['_nif']
-        imp = row['_imp_adj']
-        yr = int(row['_año'])
+        yr = int(yr)
         
         tol = max(imp * MATCH_TOLERANCE_PCT, MATCH_TOLERANCE_ABS)
         
@@ -244,7 +264,7 @@ def cross_validate(df_placsp, df_ted):
         
         # Estrategia 2: Nº expediente
         if best_match is None:
-            exp_id = row['_expediente'].strip().upper()
+            exp_id = expediente.strip().upper()
             if exp_id and len(exp_id) >= 4:
                 entries = ted_lookup_exp.get(exp_id, [])
                 for i, entry in enumerate(entries):
@@ -17,6 +17,7 @@ Uso:
 
 import pandas as pd
 import numpy as np
+import pyarrow.feather as pf
 import time
 import re
 from pathlib import Path
@@ -40,6 +41,15 @@ MATCH_TOLERANCE_ABS = 10_000
 #  HELPERS
 # ======================================================================
 
+def read_crossval(path):
+    """Lee una salida de run_ted_crossvalidation, usando la copia .feather
+    (Arrow IPC, memory-mapped) si existe y no es mas antigua que el parquet."""
+    feather = path.with_suffix('.feather')
+    if feather.exists() and feather.stat().st_mtime >= path.stat().st_mtime:
+        return pf.read_table(feather, memory_map=True).to_pandas()
+    return pd.read_parquet(path)
+
+
 def normalize_name(name):
     """Normaliza nombre de organo/empresa para fuzzy matching."""
     if not name or pd.isna(name):
@@ -84,15 +94,15 @@ print(f"{'='*70}")
 t0 = time.time()
 
 # Missing
-df_miss = pd.read_parquet(MISSING_PATH)
+df_miss = read_crossval(MISSING_PATH)
 print(f"\n  Missing cargados: {len(df_miss):,}")
 
 # SARA completo (para contexto)
-df_sara = pd.read_parquet(SARA_PATH)
+df_sara = read_crossval(SARA_PATH)
 print(f"  SARA total: {len(df_sara):,}")
 
 # Matched (para saber que organos SI tienen presencia TED)
-df_matched = pd.read_parquet(MATCHED_PATH)
+df_matched = read_crossval(MATCHED_PATH)
 print(f"  Matched: {len(df_matched):,}")
 
 # TED
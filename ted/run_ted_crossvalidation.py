@@ -33,10 +33,30 @@ Outputs:
 
 import pandas as pd
 import numpy as np
+import pyarrow as pa
+import pyarrow.dataset as pads
+import pyarrow.feather as pf
+import pyarrow.parquet as pq
+import json
+import os
 import re
 import time
 from pathlib import Path
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from numba import njit
+    HAS_NUMBA = True
+except ImportError:
+    HAS_NUMBA = False
+
+# Buffers Arrow (conversion y escritura de salidas) con jemalloc cuando el
+# build lo incluye; si no (p. ej. wheels de Windows) se queda el pool por defecto
+try:
+    pa.set_memory_pool(pa.jemalloc_memory_pool())
+except NotImplementedError:
+    pass
 
 
 # ======================================================================
@@ -47,6 +67,22 @@ PLACSP_PATH = Path("nacional/licitaciones_espana.parquet")
 TED_PATH = Path("ted/ted_es_can.parquet")
 OUTPUT_DIR = Path("ted")
 
+# Columnas que realmente usa el pipeline (proyeccion al leer el parquet)
+PLACSP_COLUMNS = [
+    'tipo_registro', 'estado', 'conjunto', 'expediente', 'ano',
+    'organo_contratante', 'nif_organo', 'dependencia',
+    'nif_adjudicatario', 'adjudicatario',
+    'importe_adjudicacion', 'importe_sin_iva',
+    'tipo_contrato', 'procedimiento', 'cpv_principal', 'fecha_adjudicacion',
+]
+TED_COLUMNS = [
+    'ted_notice_id', 'year', 'importe_ted', 'award_value', 'value',
+    'total_value', 'estimated_value_proc', 'number_offers',
+    'win_nationalid', 'cae_nationalid', 'cae_name', 'internal_id_proc',
+    'cpv', 'win_size', 'direct_award_justification', 'sme_participation',
+    'buyer_legal_type', 'duration_lot', 'award_criterion_type',
+]
+
 # -- Umbrales SARA por bienio (sin IVA, en euros) --
 SARA_THRESHOLDS = {
     (2010, 2011): {
@@ -131,6 +167,18 @@ MATCH_TOL_ABS = 5_000
 MATCH_TOL_PCT_WIDE = 0.15       # Para lotes agrupados (E4)
 MATCH_TOL_ABS_WIDE = 20_000
 MATCH_YEAR_WINDOW = 1
+# E1: un match libre con diff por debajo de esto en un paso de la ventana
+# (yr, luego yr+1 e yr-1 juntos...) detiene la busqueda en los pasos
+# siguientes (no se consume un TED de otro año solo por estar algo mas cerca
+# en importe)
+MATCH_EARLY_EXIT_DIFF = MATCH_TOL_ABS * 0.1
+
+# Orden de busqueda por año: E1 (yr, yr+1, yr-1, ...) y E3-E7 (yr, yr-1, yr+1).
+# El orden importa en empates de importe.
+YEAR_OFFSETS = tuple(dict.fromkeys(
+    [0] + [o for k in range(1, MATCH_YEAR_WINDOW + 1) for o in (k, -k)]
+))
+ADV_YEAR_OFFSETS = (0, -1, 1)
 
 # Tabla de equivalencias nombre PLACSP → nombre(s) TED (normalizados, truncados 40 chars)
 # Construida a partir del diagnostico_missing_hc.py
@@ -175,10 +223,13 @@ ORGAN_ALIASES = {
 #  FUNCIONES AUXILIARES
 # ======================================================================
 
+# Umbrales del ultimo periodo: fallback para anos fuera de SARA_THRESHOLDS
+_DEFAULT_THRESHOLD = list(SARA_THRESHOLDS.values())[-1]
+
+
 def get_sara_threshold(year, tipo_contrato, is_age, is_sector):
     """Devuelve el umbral SARA aplicable. None si no es candidato SARA."""
-    if tipo_contrato in ('Privado', 'Patrimonial', 'Administrativo Especial',
-                         'Gestion Servicios Publicos', '22', '32', '999', 'nan', ''):
+    if tipo_contrato in _TIPOS_NO_SARA:
         return None
 
     thresholds = None
@@ -187,7 +238,7 @@ def get_sara_threshold(year, tipo_contrato, is_age, is_sector):
             thresholds = thr
             break
     if thresholds is None:
-        thresholds = list(SARA_THRESHOLDS.values())[-1]
+        thresholds = _DEFAULT_THRESHOLD
 
     if tipo_contrato == 'Obras':
         return thresholds['obras']
@@ -202,38 +253,134 @@ def get_sara_threshold(year, tipo_contrato, is_age, is_sector):
         return thresholds['servicios_resto']
 
 
+# Tabla densa ano x categoria de umbral, para resolver el umbral de todo el
+# DataFrame con indexado numpy en vez de un get_sara_threshold por fila
+_TIPOS_NO_SARA = ('Privado', 'Patrimonial', 'Administrativo Especial',
+                  'Gestion Servicios Publicos', '22', '32', '999', 'nan', '')
+_SARA_BUCKETS = ('obras', 'servicios_age', 'servicios_resto', 'sectores')
+_SARA_YEAR_MIN = min(y0 for y0, _ in SARA_THRESHOLDS)
+_SARA_YEAR_MAX = max(y1 for _, y1 in SARA_THRESHOLDS)
+_SARA_TABLE = np.array([
+    [thr[b] for b in _SARA_BUCKETS]
+    for yr in range(_SARA_YEAR_MIN, _SARA_YEAR_MAX + 1)
+    for thr in [next((t for (y0, y1), t in SARA_THRESHOLDS.items() if y0 <= yr <= y1),
+                     _DEFAULT_THRESHOLD)]
+], dtype=float)
+
+
+def get_sara_thresholds(ano, tipo_contrato, is_age, is_sector):
+    """Version vectorizada de get_sara_threshold. NaN si no es candidato SARA."""
+    years = ano.fillna(2024).to_numpy(dtype=float).astype(np.int64)
+    in_range = (years >= _SARA_YEAR_MIN) & (years <= _SARA_YEAR_MAX)
+    # Fuera de la tabla se aplica el ultimo bienio (igual que get_sara_threshold)
+    row = np.where(in_range, years - _SARA_YEAR_MIN, len(_SARA_TABLE) - 1)
+
+    tc = tipo_contrato.to_numpy()
+    is_serv = np.isin(tc, ['Servicios', 'Suministros'])
+    is_age = is_age.to_numpy(dtype=bool)
+    is_sector = is_sector.to_numpy(dtype=bool)
+    bucket = np.select(
+        [tc == 'Obras', is_serv & is_sector, is_serv & is_age],
+        [_SARA_BUCKETS.index('obras'), _SARA_BUCKETS.index('sectores'),
+         _SARA_BUCKETS.index('servicios_age')],
+        default=_SARA_BUCKETS.index('servicios_resto'),
+    )
+
+    umbral = _SARA_TABLE[row, bucket]
+    umbral[np.isin(tc, _TIPOS_NO_SARA)] = np.nan
+    return pd.Series(umbral, index=ano.index)
+
+
+# Patrones en mayusculas una sola vez (no en cada llamada)
+_AGE_UP = tuple(p.upper() for p in AGE_PATTERNS)
+_SECTOR_UP = tuple(p.upper() for p in SECTORES_PATTERNS)
+
+
 def classify_buyer(dependencia):
     """Clasifica: (is_age, is_sector)."""
     if not dependencia or pd.isna(dependencia):
         return False, False
     dep_upper = str(dependencia).upper()
-    is_sector = any(p.upper() in dep_upper for p in SECTORES_PATTERNS)
-    is_age = any(p.upper() in dep_upper for p in AGE_PATTERNS) and not is_sector
+    is_sector = any(p in dep_upper for p in _SECTOR_UP)
+    is_age = any(p in dep_upper for p in _AGE_UP) and not is_sector
     return is_age, is_sector
 
 
+# Alternancias precompiladas para clasificar la columna completa de una vez
+_AGE_RE = re.compile('|'.join(re.escape(p) for p in _AGE_UP))
+_SECTOR_RE = re.compile('|'.join(re.escape(p) for p in _SECTOR_UP))
+
+
+# Texto respaldado por Arrow: los .str.* corren en kernels de pyarrow (sin objetos Python)
+_ARROW_STR = pd.StringDtype('pyarrow')
+
+
+def classify_buyers(dependencia):
+    """Version vectorizada de classify_buyer: (is_age, is_sector) como Series.
+
+    Las regex se evaluan sobre las dependencias distintas (pocos miles) y el
+    resultado se difunde a las filas por codigo; los nulos (-1) son False.
+    """
+    codes, uniques = pd.factorize(dependencia)
+    dep_up = pd.Series(uniques, dtype=object).astype(_ARROW_STR).str.upper()
+    sector_u = dep_up.str.contains(_SECTOR_RE.pattern, na=False).to_numpy(dtype=bool)
+    age_u = dep_up.str.contains(_AGE_RE.pattern, na=False).to_numpy(dtype=bool) & ~sector_u
+    is_sector = pd.Series(np.append(sector_u, False)[codes], index=dependencia.index)
+    is_age = pd.Series(np.append(age_u, False)[codes], index=dependencia.index)
+    return is_age, is_sector
+
+
+_ACCENT_TABLE = str.maketrans('ÁÉÍÓÚÑÜÇ', 'AEIOUNUC')
+_NAME_PUNCT_RE = re.compile(r'[.,;:\-\/\\()\[\]"\'`]')
+_SPACES_RE = re.compile(r'\s+')
+
+
 def normalize_name(name):
     """Normaliza nombre organo para matching fuzzy."""
     if not name or pd.isna(name):
         return ''
-    s = str(name).upper().strip()
-    for a, b in [('Á','A'),('É','E'),('Í','I'),('Ó','O'),('Ú','U'),
-                 ('Ñ','N'),('Ü','U'),('Ç','C')]:
-        s = s.replace(a, b)
-    s = re.sub(r'[.,;:\-\/\\()\[\]"\'`]', ' ', s)
-    s = re.sub(r'\s+', ' ', s).strip()
+    s = str(name).upper().strip().translate(_ACCENT_TABLE)
+    s = _NAME_PUNCT_RE.sub(' ', s)
+    s = _SPACES_RE.sub(' ', s).strip()
     return s
 
 
+def normalize_names(names):
+    """normalize_name sobre un array: una llamada por nombre distinto, no por fila."""
+    codes, uniques = pd.factorize(np.asarray(names, dtype=object))
+    # El codigo -1 (nulos) cae en el '' final
+    normalized = np.array([normalize_name(u) for u in uniques] + [''], dtype=object)
+    return normalized[codes]
+
+
+_ES_PREFIX_RE = re.compile(r'^ES[-\s]*')
+
+
 def clean_nif(nif):
     """Limpia NIF: mayusculas, sin prefijo ES."""
     if not nif or pd.isna(nif):
         return ''
     s = str(nif).strip().upper()
-    s = re.sub(r'^ES[-\s]*', '', s)
+    s = _ES_PREFIX_RE.sub('', s)
     return s if len(s) >= 5 else ''
 
 
+def strip_es_prefix(nifs):
+    """Quita el prefijo ES solo en las filas que lo tienen (sin regex en el resto)."""
+    has_es = nifs.str.startswith('ES', na=False)
+    if has_es.any():
+        nifs = nifs.copy()
+        nifs[has_es] = nifs[has_es].str.replace(_ES_PREFIX_RE, '', regex=True)
+    return nifs
+
+
+def clean_nifs(nifs):
+    """Version vectorizada de clean_nif sobre una Series."""
+    s = nifs.astype(_ARROW_STR).fillna('').str.strip().str.upper()
+    s = strip_es_prefix(s)
+    return s.where(s.str.len() >= 5, '').astype(object)
+
+
 def tol(imp, pct=MATCH_TOL_PCT, abs_val=MATCH_TOL_ABS):
     """Tolerancia de matching para un importe."""
     return max(imp * pct, abs_val)
@@ -249,13 +396,23 @@ _STOPWORDS = frozenset([
 ])
 
 
+def overlap_tokens(name):
+    """Tokens significativos (len > 2, sin stopwords) usados por token_overlap."""
+    if not name:
+        return frozenset()
+    return frozenset(t for t in name.split() if len(t) > 2 and t not in _STOPWORDS)
+
+
 def token_overlap(name_a, name_b, min_tokens=2):
     """Calcula solapamiento de tokens significativos entre dos nombres.
     Returns: (overlap_ratio, n_common) where ratio = common / min(len_a, len_b)."""
     if not name_a or not name_b:
         return 0.0, 0
-    toks_a = {t for t in name_a.split() if len(t) > 2 and t not in _STOPWORDS}
-    toks_b = {t for t in name_b.split() if len(t) > 2 and t not in _STOPWORDS}
+    return token_overlap_sets(overlap_tokens(name_a), overlap_tokens(name_b), min_tokens)
+
+
+def token_overlap_sets(toks_a, toks_b, min_tokens=2):
+    """token_overlap sobre conjuntos de tokens ya calculados (overlap_tokens)."""
     if len(toks_a) < min_tokens or len(toks_b) < min_tokens:
         return 0.0, 0
     common = toks_a & toks_b
@@ -265,6 +422,276 @@ def token_overlap(name_a, name_b, min_tokens=2):
     return ratio, len(common)
 
 
+def read_parquet_columns(path, columns, filter_fn=None):
+    """Lee solo las columnas indicadas que existan en el esquema del parquet.
+
+    filter_fn(schema) puede devolver una expresion pyarrow para filtrar filas
+    en la lectura (se salta row groups por estadisticas) o None.
+    """
+    dataset = pads.dataset(str(path), format='parquet')
+    cols = [c for c in columns if c in dataset.schema.names]
+    row_filter = filter_fn(dataset.schema) if filter_fn else None
+    # self_destruct libera cada columna Arrow al pasarla a pandas (split_blocks
+    # evita consolidar): el pico de memoria no dobla la tabla leida
+    table = dataset.to_table(columns=cols, filter=row_filter)
+    return table.to_pandas(split_blocks=True, self_destruct=True)
+
+
+def _placsp_read_filter(schema):
+    """Adjudicaciones de licitaciones con NIF e importe (prefiltro de lectura).
+
+    Es un superconjunto del mask de load_placsp, que se sigue aplicando; las
+    exclusiones por conjunto y ano se hacen despues para mantener sus conteos.
+    """
+    return (
+        (pads.field('tipo_registro') == 'LICITACION') &
+        pads.field('estado').isin(['Resuelta', 'Adjudicada']) &
+        pads.field('nif_adjudicatario').is_valid() &
+        (pads.field('importe_adjudicacion').is_valid() |
+         pads.field('importe_sin_iva').is_valid())
+    )
+
+
+def _ted_read_filter(schema):
+    """Solo avisos con importe_ted > 0, si la columna existe y es numerica."""
+    if 'importe_ted' not in schema.names:
+        return None
+    tp = schema.field('importe_ted').type
+    if not (pa.types.is_integer(tp) or pa.types.is_floating(tp)):
+        return None
+    return pads.field('importe_ted') > 0
+
+
+def _ted_col(ted_valid, name, default=np.nan):
+    """Columna de ted_valid como array; constante si la columna no existe."""
+    if name in ted_valid.columns:
+        return ted_valid[name].to_numpy()
+    return np.full(len(ted_valid), default, dtype=object)
+
+
+def _shared_categories(*keys):
+    """CategoricalDtype comun a varias columnas clave (join por codigo entero)."""
+    return pd.CategoricalDtype(pd.unique(np.concatenate([k.to_numpy() for k in keys])))
+
+
+class _CSRIndex:
+    """Indice clave -> [(tidx, valor)] en buckets CSR contiguos.
+
+    Las claves se factorizan una vez (pd.factorize / MultiIndex) y las
+    posiciones se ordenan de forma estable por codigo, asi cada bucket es un
+    slice [offsets[c], offsets[c+1]) que conserva el orden de insercion.
+    Ademas se guarda, por bucket, la permutacion que ordena los valores, para
+    acotar por bisect los candidatos dentro de una tolerancia (nearest).
+    """
+
+    # Buckets mas pequenos se recorren enteros: el bisect no compensa
+    WINDOW_MIN_BUCKET = 32
+
+    def __init__(self, key_a, key_b=None, tidx=None, vals=None):
+        if len(key_a) == 0:
+            codes, uniques = np.empty(0, dtype=np.int64), []
+        elif key_b is None:
+            codes, uniques = pd.factorize(pd.Series(key_a, dtype=object))
+        else:
+            codes, uniques = pd.MultiIndex.from_arrays([
+                pd.Series(key_a, dtype=object), pd.Series(key_b, dtype=np.int64)
+            ]).factorize()
+        n = len(codes)
+        order = np.argsort(codes, kind='stable')
+        self.offsets = np.zeros(len(uniques) + 1, dtype=np.int64)
+        self.offsets[1:] = np.cumsum(np.bincount(codes, minlength=len(uniques)))
+        self.key_to_code = {k: i for i, k in enumerate(uniques)}
+        self.uniques = uniques
+        self.tidx = (np.arange(n) if tidx is None else np.asarray(tidx, dtype=np.int64))[order]
+        self.vals = None if vals is None else np.asarray(vals, dtype=float)[order]
+        if self.vals is not None:
+            bucket = np.repeat(np.arange(len(uniques)), np.diff(self.offsets))
+            self.sorted_pos = np.lexsort((self.vals, bucket))
+            self.sorted_vals = self.vals[self.sorted_pos]
+
+    def __len__(self):
+        return len(self.key_to_code)
+
+    def positions(self, key):
+        """Array de tidx del bucket, o None si la clave no existe."""
+        code = self.key_to_code.get(key)
+        if code is None:
+            return None
+        return self.tidx[self.offsets[code]:self.offsets[code + 1]]
+
+    def get(self, key, default=()):
+        """Pares (tidx, valor) del bucket, como dict.get sobre listas."""
+        code = self.key_to_code.get(key)
+        if code is None:
+            return default
+        a, b = self.offsets[code], self.offsets[code + 1]
+        return zip(self.tidx[a:b].tolist(), self.vals[a:b].tolist())
+
+    def nearest(self, key, center, radius, consumed):
+        """Primer par libre con |valor - center| minimo y <= radius.
+
+        Equivale a recorrer el bucket en orden de insercion quedandose con el
+        primer diff estrictamente menor. consumed es un array bool por tidx.
+        Devuelve (tidx, diff) o (None, inf).
+        """
+        code = self.key_to_code.get(key)
+        if code is None:
+            return None, float('inf')
+        return self.nearest_code(code, center, radius, consumed)
+
+    def nearest_code(self, code, center, radius, consumed):
+        """nearest() sobre un codigo de bucket ya resuelto (codes_of); -1 = vacio."""
+        if code < 0:
+            return None, float('inf')
+        a, b = self.offsets[code], self.offsets[code + 1]
+        if b - a <= self.WINDOW_MIN_BUCKET:
+            best, best_diff = None, float('inf')
+            for tidx, val in zip(self.tidx[a:b].tolist(), self.vals[a:b].tolist()):
+                if consumed[tidx]:
+                    continue
+                diff = abs(val - center)
+                if diff <= radius and diff < best_diff:
+                    best, best_diff = tidx, diff
+            return best, best_diff
+        # Bucket grande: acotar por bisect (margen relativo 1e-9) y argmin
+        slack = radius * (1 + 1e-9) + 1e-9
+        sv = self.sorted_vals[a:b]
+        lo = a + np.searchsorted(sv, center - slack, side='left')
+        hi = a + np.searchsorted(sv, center + slack, side='right')
+        sel = np.sort(self.sorted_pos[lo:hi])
+        tidx = self.tidx[sel]
+        diffs = np.abs(self.vals[sel] - center)
+        diffs[(diffs > radius) | consumed[tidx]] = np.inf
+        if len(diffs) == 0 or diffs.min() == np.inf:
+            return None, float('inf')
+        j = int(diffs.argmin())
+        return int(tidx[j]), float(diffs[j])
+
+    def codes_of(self, key_a, key_b):
+        """Codigo de bucket de cada clave (key_a, key_b), -1 si no existe."""
+        if len(self.uniques) == 0:
+            return np.full(len(key_a), -1, dtype=np.int64)
+        query = pd.MultiIndex.from_arrays([
+            pd.Series(key_a, dtype=object), pd.Series(key_b, dtype=np.int64)
+        ])
+        return self.uniques.get_indexer(query).astype(np.int64)
+
+    def nearest_greedy(self, keys, years, centers, radii, valid, consumed, year_offsets):
+        """nearest() en lote para indices (clave, ano), consumiendo en orden.
+
+        Para cada fila valida (en orden) busca en los buckets (clave, ano+off)
+        de year_offsets y se queda con el primer diff estrictamente menor;
+        marca el TED elegido en consumed antes de pasar a la siguiente fila.
+        Devuelve (tidx o -1, diff) por fila.
+        """
+        n = len(keys)
+        if not HAS_NUMBA:
+            best = np.full(n, -1, dtype=np.int64)
+            best_diff = np.full(n, np.inf)
+            for i in np.flatnonzero(valid).tolist():
+                yr = int(years[i])
+                for off in year_offsets:
+                    tidx, diff = self.nearest((keys[i], yr + off), centers[i], radii[i], consumed)
+                    if diff < best_diff[i]:
+                        best[i], best_diff[i] = tidx, diff
+                if best[i] >= 0:
+                    consumed[best[i]] = True
+            return best, best_diff
+        yrs = np.where(valid, years, 0).astype(np.int64)
+        codes = np.stack([self.codes_of(keys, yrs + off) for off in year_offsets], axis=1)
+        codes[~np.asarray(valid, dtype=bool)] = -1
+        return _nearest_greedy(
+            codes, np.asarray(centers, dtype=float), np.asarray(radii, dtype=float),
+            self.offsets, self.tidx, self.vals, self.sorted_pos, self.sorted_vals, consumed,
+        )
+
+
+def _resolve_greedy(rows, e1_ptr, e1_tpos, e1_diff, e1_step, e2_ptr, e2_tpos,
+                    consumed, early_diff):
+    """Resolucion greedy E1/E2 sobre pares candidatos en formato CSR.
+
+    Recorre las filas SARA en orden y toma el primer TED libre de sus pares
+    E1 (ya ordenados por diff); si no hay, el primero libre de E2. Marca el
+    TED como consumido. Devuelve (posicion TED o -1, 1 si E1 / 2 si E2).
+
+    Salida temprana E1: e1_step es el paso de la ventana de cada par (|offset|
+    de año: yr es 0, yr+1 e yr-1 son 1...). Si algun par libre tiene
+    diff < early_diff, solo se consideran los pasos hasta el primero que lo
+    tiene, igual que cortar el recorrido tras cada yr_offset (ya vistos yr+k
+    e yr-k) en cuanto best_diff < early_diff.
+    """
+    best = np.full(len(rows), -1, dtype=np.int64)
+    kind = np.zeros(len(rows), dtype=np.int8)
+    no_limit = np.iinfo(np.int64).max
+    for k in range(len(rows)):
+        p = rows[k]
+        max_step = no_limit
+        for j in range(e1_ptr[p], e1_ptr[p + 1]):
+            if (not consumed[e1_tpos[j]] and e1_diff[j] < early_diff
+                    and e1_step[j] < max_step):
+                max_step = e1_step[j]
+        for j in range(e1_ptr[p], e1_ptr[p + 1]):
+            if not consumed[e1_tpos[j]] and e1_step[j] <= max_step:
+                best[k] = e1_tpos[j]
+                kind[k] = 1
+                break
+        if best[k] < 0:
+            for j in range(e2_ptr[p], e2_ptr[p + 1]):
+                if not consumed[e2_tpos[j]]:
+                    best[k] = e2_tpos[j]
+                    kind[k] = 2
+                    break
+        if best[k] >= 0:
+            consumed[best[k]] = True
+    return best, kind
+
+
+def _nearest_greedy(codes, centers, radii, offsets, tidx, vals, sorted_pos, sorted_vals,
+                    consumed):
+    """Nucleo de _CSRIndex.nearest_greedy sobre los arrays CSR.
+
+    codes[i] son los buckets a probar para la fila i (-1 = ninguno), en orden.
+    Dentro de un bucket, el candidato es el diff minimo y, a igualdad, la
+    primera posicion de insercion (igual que nearest). Entre buckets gana el
+    primer diff estrictamente menor. Las filas se resuelven en orden y cada
+    TED elegido queda consumido para las siguientes.
+    """
+    n = codes.shape[0]
+    best = np.full(n, -1, dtype=np.int64)
+    best_diff = np.full(n, np.inf)
+    for i in range(n):
+        center = centers[i]
+        radius = radii[i]
+        slack = radius * (1 + 1e-9) + 1e-9
+        for j in range(codes.shape[1]):
+            c = codes[i, j]
+            if c < 0:
+                continue
+            a, b = offsets[c], offsets[c + 1]
+            lo = a + np.searchsorted(sorted_vals[a:b], center - slack, side='left')
+            hi = a + np.searchsorted(sorted_vals[a:b], center + slack, side='right')
+            bt, bd, bp = -1, np.inf, b
+            for k in range(lo, hi):
+                p = sorted_pos[k]
+                t = tidx[p]
+                if consumed[t]:
+                    continue
+                d = abs(vals[p] - center)
+                if d <= radius and (d < bd or (d == bd and p < bp)):
+                    bt, bd, bp = t, d, p
+            if bt >= 0 and bd < best_diff[i]:
+                best[i] = bt
+                best_diff[i] = bd
+        if best[i] >= 0:
+            consumed[best[i]] = True
+    return best, best_diff
+
+
+if HAS_NUMBA:
+    _resolve_greedy = njit(cache=True)(_resolve_greedy)
+    _nearest_greedy = njit(cache=True)(_nearest_greedy)
+
+
 # ======================================================================
 #  1. CARGA PLACSP
 # ======================================================================
@@ -274,8 +701,8 @@ def load_placsp(path):
     print(f"\n{'='*70}")
     print(f"  CARGA PLACSP")
     print(f"{'='*70}")
-    df = pd.read_parquet(path)
-    print(f"  Total registros: {len(df):,}")
+    df = read_parquet_columns(path, PLACSP_COLUMNS, _placsp_read_filter)
+    print(f"  Registros leidos (licitaciones adjudicadas): {len(df):,}")
 
     # Solo adjudicaciones reales
     mask = (
@@ -284,42 +711,43 @@ def load_placsp(path):
         (df['nif_adjudicatario'].notna()) &
         (df['importe_adjudicacion'].notna() | df['importe_sin_iva'].notna())
     )
-    df = df[mask].copy()
-    print(f"  Adjudicaciones con NIF + importe: {len(df):,}")
+    print(f"  Adjudicaciones con NIF + importe: {mask.sum():,}")
+
+    # Exclusiones acumuladas en una sola mascara: una unica copia del frame
+    conjunto = df['conjunto']
 
     # Excluir menores
-    n_menores = (df['conjunto'] == 'menores').sum()
-    df = df[df['conjunto'] != 'menores'].copy()
+    n_menores = (mask & (conjunto == 'menores')).sum()
     print(f"  Excluidos contratos menores: {n_menores:,}")
 
     # Excluir encargos
-    n_enc = (df['conjunto'] == 'encargos').sum()
-    df = df[df['conjunto'] != 'encargos'].copy()
+    n_enc = (mask & (conjunto == 'encargos')).sum()
     if n_enc > 0:
         print(f"  Excluidos encargos: {n_enc:,}")
 
     # Excluir consultas
-    n_con = (df['conjunto'] == 'consultas').sum()
-    df = df[df['conjunto'] != 'consultas'].copy()
+    n_con = (mask & (conjunto == 'consultas')).sum()
     if n_con > 0:
         print(f"  Excluidas consultas: {n_con:,}")
+    mask &= ~conjunto.isin(['menores', 'encargos', 'consultas'])
 
     # Excluir tipos no SARA (art. 25-27 LCSP)
     tipos_no_sara = ['Privado', 'Patrimonial', 'Administrativo Especial',
                      '22', '999', '32']
     _tc = df['tipo_contrato'].astype(str).replace('nan', '')
-    mask_no_sara = _tc.isin(tipos_no_sara)
+    mask_no_sara = mask & _tc.isin(tipos_no_sara)
     n_no_sara = mask_no_sara.sum()
-    df = df[~mask_no_sara].copy()
     if n_no_sara > 0:
         print(f"  Excluidos tipos no SARA (Privado/Patrimonial/otros): {n_no_sara:,}")
+    df = df[mask & ~mask_no_sara].copy()
 
     print(f"  Registros tras exclusiones: {len(df):,}")
 
     # -- Campos auxiliares --
-    df['_nif'] = df['nif_adjudicatario'].apply(clean_nif)
-    df['_imp_adj'] = pd.to_numeric(df['importe_adjudicacion'].astype(str).replace('nan', ''), errors='coerce')
-    df['_imp_sin_iva'] = pd.to_numeric(df['importe_sin_iva'].astype(str).replace('nan', ''), errors='coerce')
+    df['_nif'] = clean_nifs(df['nif_adjudicatario'])
+    # to_numeric directo: si la columna ya es numerica no hay ida y vuelta por str
+    df['_imp_adj'] = pd.to_numeric(df['importe_adjudicacion'], errors='coerce')
+    df['_imp_sin_iva'] = pd.to_numeric(df['importe_sin_iva'], errors='coerce')
 
     # Para SARA: usar importe_sin_iva (proxy VEC), fallback a importe_adjudicacion
     df['_imp_sara'] = np.where(df['_imp_sin_iva'].notna(), df['_imp_sin_iva'], df['_imp_adj'])
@@ -339,22 +767,16 @@ def load_placsp(path):
 
     df['_expediente'] = df['expediente'].astype(str).replace('nan', '').str.strip()
     df['_fecha_adj'] = pd.to_datetime(df['fecha_adjudicacion'], errors='coerce')
-    df['_tipo_contrato'] = df['tipo_contrato'].astype(str).replace('nan', '').str.strip()
-    df['_procedimiento'] = df['procedimiento'].astype(str).replace('nan', '').str.strip()
+    # Baja cardinalidad: category desde el inicio, comparaciones y flags por codigo
+    df['_tipo_contrato'] = df['tipo_contrato'].astype(str).replace('nan', '').str.strip().astype('category')
+    df['_procedimiento'] = df['procedimiento'].astype(str).replace('nan', '').str.strip().astype('category')
 
     # Clasificar comprador
-    buyer_class = df['dependencia'].apply(classify_buyer)
-    df['_is_age'] = buyer_class.apply(lambda x: x[0])
-    df['_is_sector'] = buyer_class.apply(lambda x: x[1])
+    df['_is_age'], df['_is_sector'] = classify_buyers(df['dependencia'])
 
     # Umbral SARA por contrato
-    df['_umbral_sara'] = df.apply(
-        lambda r: get_sara_threshold(
-            int(r['_ano']) if pd.notna(r['_ano']) else 2024,
-            r['_tipo_contrato'],
-            r['_is_age'],
-            r['_is_sector']
-        ), axis=1
+    df['_umbral_sara'] = get_sara_thresholds(
+        df['_ano'], df['_tipo_contrato'], df['_is_age'], df['_is_sector']
     )
 
     # Candidato SARA individual
@@ -362,38 +784,39 @@ def load_placsp(path):
 
     # -- Suma de lotes por expediente (VEC = suma de todos los lotes) --
     n_sara_before_lots = df['_es_sara'].sum()
-
-    non_sara = df[~df['_es_sara'] & (df['_expediente'].str.len() > 3)].copy()
-    if len(non_sara) > 0:
-        lot_sums = non_sara.groupby('_expediente').agg(
-            imp_total=('_imp_sara', 'sum'),
-            n_lotes=('_imp_sara', 'count'),
-            umbral=('_umbral_sara', 'min'),
-        )
-        lot_sums = lot_sums[
-            (lot_sums['n_lotes'] >= 2) &
-            lot_sums['umbral'].notna() &
-            (lot_sums['imp_total'] >= lot_sums['umbral'])
-        ]
-        sara_expedientes = set(lot_sums.index)
-        lot_mask = (~df['_es_sara']) & (df['_expediente'].isin(sara_expedientes))
-        df.loc[lot_mask, '_es_sara'] = True
-        df.loc[lot_mask, '_sara_por_lotes'] = True
+    lot_mask = np.zeros(len(df), dtype=bool)
+
+    lot_cand = (~df['_es_sara'] & (df['_expediente'].str.len() > 3)).to_numpy()
+    if lot_cand.any():
+        # Totales por expediente difundidos a cada lote (transform), sin sets
+        non_sara = df.loc[lot_cand, ['_expediente', '_imp_sara', '_umbral_sara']]
+        g = non_sara.groupby('_expediente', sort=False)
+        n_lotes = g['_imp_sara'].transform('count')
+        imp_total = g['_imp_sara'].transform('sum')
+        umbral = g['_umbral_sara'].transform('min')
+        promote = ((n_lotes >= 2) & umbral.notna() & (imp_total >= umbral)).to_numpy()
+        lot_mask[lot_cand] = promote
+        n_sara_expedientes = non_sara['_expediente'][promote].nunique()
+        df['_es_sara'] = df['_es_sara'].to_numpy() | lot_mask
 
         n_sara_lots = lot_mask.sum()
         print(f"\n  Suma de lotes por expediente:")
-        print(f"    Expedientes con lotes que suman >= umbral: {len(sara_expedientes):,}")
+        print(f"    Expedientes con lotes que suman >= umbral: {n_sara_expedientes:,}")
         print(f"    Contratos adicionales marcados SARA:       {n_sara_lots:,}")
         print(f"    SARA antes de lotes: {n_sara_before_lots:,} -> despues: {df['_es_sara'].sum():,}")
 
-    if '_sara_por_lotes' not in df.columns:
-        df['_sara_por_lotes'] = False
-    df['_sara_por_lotes'] = df['_sara_por_lotes'].fillna(False).astype(bool)
+    df['_sara_por_lotes'] = lot_mask
 
     # Negociado sin publicidad
-    df['_es_neg_sin_pub'] = df['_procedimiento'].str.contains(
-        'Negociado sin publicidad', case=False, na=False
-    )
+    # (evaluado sobre las categorias distintas y difundido por codigo)
+    proc = df['_procedimiento'].cat
+    neg_cats = proc.categories.str.lower().str.contains('negociado sin publicidad', regex=False)
+    df['_es_neg_sin_pub'] = np.append(np.asarray(neg_cats, dtype=bool), False)[proc.codes.to_numpy()]
+
+    # Organos se repiten mucho: category para groupby/isin por codigo
+    # (los groupby sobre estas columnas usan observed=True)
+    for col in ['organo_contratante', 'nif_organo']:
+        df[col] = df[col].astype('category')
 
     # -- Stats --
     n_sara = df['_es_sara'].sum()
@@ -433,8 +856,8 @@ def load_ted(path):
     print(f"\n{'='*70}")
     print(f"  CARGA TED")
     print(f"{'='*70}")
-    df = pd.read_parquet(path)
-    print(f"  Total registros: {len(df):,}")
+    df = read_parquet_columns(path, TED_COLUMNS, _ted_read_filter)
+    print(f"  Registros leidos: {len(df):,}")
 
     for col in ['year', 'number_offers']:
         if col in df.columns:
@@ -452,7 +875,7 @@ def load_ted(path):
     # NIF ganador limpio
     df['win_nif_clean'] = df.get('win_nationalid', pd.Series(dtype=str)) \
         .fillna('').astype(str).str.strip().str.upper()
-    df['win_nif_clean'] = df['win_nif_clean'].str.replace(r'^ES[-\s]*', '', regex=True)
+    df['win_nif_clean'] = strip_es_prefix(df['win_nif_clean'])
 
     valid = df['importe_ted'].notna() & (df['importe_ted'] > 0)
     has_nif = df['win_nif_clean'].str.len() >= 5
@@ -477,41 +900,76 @@ def run_e1_e2(df_placsp, df_ted):
     # -- Indices TED --
     ted_valid = df_ted[
         (df_ted['importe_ted'].notna()) & (df_ted['importe_ted'] > 0)
-    ].copy()
-
-    ted_lookup = defaultdict(list)
-    ted_lookup_exp = defaultdict(list)
-
-    print(f"  Construyendo indices TED ({len(ted_valid):,} registros)...")
-    for _, row in ted_valid.iterrows():
-        nif = str(row.get('win_nif_clean', '')).strip()
-        imp = row['importe_ted']
-        yr = row.get('year', np.nan)
-
-        entry = {
-            'importe': imp,
-            'ted_id': str(row.get('ted_notice_id', '')),
-            'n_ofertas': row.get('number_offers', np.nan),
-            'cpv_ted': str(row.get('cpv', '')),
-            'cae_ted': str(row.get('cae_name', '')),
-            'win_size': str(row.get('win_size', '')),
-            'direct_award': str(row.get('direct_award_justification', '')),
-            'sme_part': str(row.get('sme_participation', '')),
-            'buyer_legal_type': str(row.get('buyer_legal_type', '')),
-            'duration_lot': row.get('duration_lot', np.nan),
-            'award_criterion_type': str(row.get('award_criterion_type', '')),
-            'internal_id': str(row.get('internal_id_proc', '')),
-            'consumed': False,
-        }
-
-        if nif and len(nif) >= 5 and pd.notna(yr):
-            ted_lookup[(nif, int(yr))].append(entry)
+    ]
 
-        exp_id = str(row.get('internal_id_proc', '')).strip()
-        if exp_id and len(exp_id) >= 4:
-            ted_lookup_exp[exp_id.upper()].append(entry)
+    n_ted = len(ted_valid)
+
+    def _str_col(name):
+        if name in ted_valid.columns:
+            return ted_valid[name].astype(str).to_numpy()
+        return np.full(n_ted, '', dtype=object)
+
+    # Columnas como arrays (sin materializar una Series por fila). Solo las
+    # claves se pasan a str para todo TED; los metadatos, al construir el match
+    imps = ted_valid['importe_ted'].to_numpy()
+    yrs = _ted_col(ted_valid, 'year')
+    nifs = _str_col('win_nif_clean')
+    internal_ids = _str_col('internal_id_proc')
+    ted_ids = _ted_col(ted_valid, 'ted_notice_id', '')
+    n_ofertas = _ted_col(ted_valid, 'number_offers')
+    cpvs = _ted_col(ted_valid, 'cpv', '')
+    caes = _ted_col(ted_valid, 'cae_name', '')
+    win_sizes = _ted_col(ted_valid, 'win_size', '')
+    direct_awards = _ted_col(ted_valid, 'direct_award_justification', '')
+    sme_parts = _ted_col(ted_valid, 'sme_participation', '')
+    legal_types = _ted_col(ted_valid, 'buyer_legal_type', '')
+    durations = _ted_col(ted_valid, 'duration_lot')
+    criteria = _ted_col(ted_valid, 'award_criterion_type', '')
+
+    # Structure-of-Arrays: se trabaja con posiciones (int64) en estos arrays;
+    # el estado consumed es un unico array booleano compartido
+    ted_importe = imps.astype(float)
+    ted_consumed = np.zeros(n_ted, dtype=bool)
+
+    # Metadatos TED: se proyectan en bloque al final, solo para los matches
+    def ted_entries(pos):
+        return {
+            'importe': imps[pos],
+            'ted_id': ted_ids[pos].astype(str),
+            'n_ofertas': n_ofertas[pos],
+            'cpv_ted': cpvs[pos].astype(str),
+            'cae_ted': caes[pos].astype(str),
+            'win_size': win_sizes[pos].astype(str),
+            'direct_award': direct_awards[pos].astype(str),
+            'sme_part': sme_parts[pos].astype(str),
+            'buyer_legal_type': legal_types[pos].astype(str),
+            'duration_lot': durations[pos],
+            'award_criterion_type': criteria[pos].astype(str),
+            'internal_id': internal_ids[pos],
+        }
 
-    print(f"  TED lookup NIF+ano: {len(ted_lookup):,} claves")
+    print(f"  Construyendo indices TED ({n_ted:,} registros)...")
+
+    # Claves E1: (NIF ganador, año)
+    ted_nif = pd.Series(nifs, dtype=object).str.strip()
+    ted_yr = pd.to_numeric(pd.Series(yrs), errors='coerce')
+    e1_ok = ((ted_nif.str.len() >= 5) & ted_yr.notna()).to_numpy()
+    ted_e1 = pd.DataFrame({
+        '_nif': ted_nif.to_numpy()[e1_ok],
+        '_yr': ted_yr.to_numpy()[e1_ok].astype(np.int64),
+        '_tpos': np.flatnonzero(e1_ok),
+    })
+
+    # Claves E2/E2b: expediente (internal_id_proc)
+    ted_exp = pd.Series(internal_ids, dtype=object).str.strip()
+    e2_ok = (ted_exp.str.len() >= 4).to_numpy()
+    ted_e2 = pd.DataFrame({
+        '_exp': ted_exp[e2_ok].str.upper().to_numpy(),
+        '_tpos': np.flatnonzero(e2_ok),
+    })
+    ted_lookup_exp = _CSRIndex(ted_e2['_exp'].to_numpy(), tidx=ted_e2['_tpos'].to_numpy())
+
+    print(f"  TED lookup NIF+ano: {len(ted_e1.drop_duplicates(['_nif', '_yr'])):,} claves")
     print(f"  TED lookup expediente: {len(ted_lookup_exp):,} claves")
 
     # -- Solo matchear SARA --
@@ -524,74 +982,87 @@ def run_e1_e2(df_placsp, df_ted):
     ]
     print(f"\n  SARA candidatos para matching: {len(sara_valid):,}")
 
-    # -- Matching loop E1 + E2 --
-    matched_idx = []
-    match_data = {}
-    n_match_nif = 0
-    n_match_exp = 0
-
-    total = len(sara_valid)
-    for count, (idx, row) in enumerate(sara_valid.iterrows()):
-        if count % 50_000 == 0 and count > 0:
-            elapsed = time.time() - t0
-            pct = count / total * 100
-            rate = count / max(elapsed, 1)
-            eta = (total - count) / max(rate, 1)
-            print(f"    {count:,}/{total:,} ({pct:.0f}%) | "
-                  f"{len(matched_idx):,} matches | {elapsed:.0f}s | ETA {eta:.0f}s")
-
-        nif = row['_nif']
-        imp = row['_imp_match']
-        yr = int(row['_ano'])
-        t = tol(imp)
+    n_sara = len(sara_valid)
+    sara_index = sara_valid.index.to_numpy()
+    sara_imp = sara_valid['_imp_match'].to_numpy(dtype=float)
+    sara_tol = np.maximum(sara_imp * MATCH_TOL_PCT, MATCH_TOL_ABS)
+    sara_yr = sara_valid['_ano'].to_numpy(dtype=float).astype(np.int64)
+    sara_nif = sara_valid['_nif'].fillna('').astype(str)
+    sara_exp = sara_valid['_expediente'].str.strip().str.upper()
+
+    # -- Pares candidatos (join por clave + filtro de tolerancia) --
+    # Cada par (fila SARA, fila TED) lleva el orden en que el bucle original
+    # los visitaba: año yr, yr+1, yr-1... y dentro de cada clave el orden TED.
+    # Ordenados por (fila SARA, diff, orden), el primer par libre de cada fila
+    # es exactamente el mejor match del recorrido secuencial.
+    e1_sara_ok = (sara_nif.str.len() >= 5).to_numpy()
+    sara_e1 = pd.DataFrame({
+        '_nif': sara_nif.to_numpy()[e1_sara_ok],
+        '_yr': sara_yr[e1_sara_ok],
+        '_spos': np.flatnonzero(e1_sara_ok),
+    })
+    # Categorias NIF compartidas: el join compara codigos enteros, no strings
+    nif_dtype = _shared_categories(ted_e1['_nif'], sara_e1['_nif'])
+    ted_e1['_nif'] = ted_e1['_nif'].astype(nif_dtype)
+    sara_e1['_nif'] = sara_e1['_nif'].astype(nif_dtype)
+
+    def _e1_pairs_for(rank, off):
+        return (sara_e1.assign(_yr=sara_e1['_yr'] + off)
+                       .merge(ted_e1, on=['_nif', '_yr'])
+                       .assign(_rank=rank))
+
+    e2_sara_ok = (sara_exp.str.len() >= 4).to_numpy()
+    sara_e2 = pd.DataFrame({
+        '_exp': sara_exp.to_numpy()[e2_sara_ok],
+        '_spos': np.flatnonzero(e2_sara_ok),
+    })
+    exp_dtype = _shared_categories(ted_e2['_exp'], sara_e2['_exp'])
+
+    def _e2_pairs():
+        return sara_e2.astype({'_exp': exp_dtype}).merge(
+            ted_e2.astype({'_exp': exp_dtype}), on='_exp'
+        ).assign(_rank=0)
+
+    def _sorted_pairs(pairs):
+        spos = pairs['_spos'].to_numpy(dtype=np.int64)
+        tpos = pairs['_tpos'].to_numpy(dtype=np.int64)
+        diff = np.abs(ted_importe[tpos] - sara_imp[spos])
+        keep = diff <= sara_tol[spos]
+        rank = pairs['_rank'].to_numpy(dtype=np.int64)
+        order = np.lexsort((tpos[keep], rank[keep], diff[keep], spos[keep]))
+        spos, tpos = spos[keep][order], tpos[keep][order]
+        diff, rank = diff[keep][order], rank[keep][order]
+        # Punteros CSR: pares de la fila p en [ptr[p], ptr[p+1])
+        ptr = np.searchsorted(spos, np.arange(n_sara + 1))
+        return spos, tpos, diff, rank, ptr
+
+    # Los joins por desplazamiento de año y el de expediente son independientes
+    # (solo leen); el greedy posterior es el unico paso secuencial
+    with ThreadPoolExecutor(max_workers=len(YEAR_OFFSETS) + 1) as ex:
+        f_e1 = [ex.submit(_e1_pairs_for, rank, off) for rank, off in enumerate(YEAR_OFFSETS)]
+        f_e2 = ex.submit(_e2_pairs)
+        e1_pairs = pd.concat([f.result() for f in f_e1], ignore_index=True)
+        f_e1_sorted = ex.submit(_sorted_pairs, e1_pairs)
+        f_e2_sorted = ex.submit(_sorted_pairs, f_e2.result())
+        e1_spos, e1_tpos, e1_diff, e1_rank, e1_ptr = f_e1_sorted.result()
+        e2_spos, e2_tpos, _, _, e2_ptr = f_e2_sorted.result()
+
+    # -- Resolucion greedy E1 + E2 (orden original de filas SARA) --
+    rows_with_cand = np.union1d(e1_spos, e2_spos)
+    print(f"  Filas SARA con candidatos TED: {len(rows_with_cand):,}"
+          f"{' (numba)' if HAS_NUMBA else ''}")
+    # Paso de ventana de cada par E1: yr+k e yr-k comparten paso para el corte
+    e1_step = np.abs(np.asarray(YEAR_OFFSETS, dtype=np.int64))[e1_rank]
+    best, kind = _resolve_greedy(
+        rows_with_cand, e1_ptr, e1_tpos, e1_diff, e1_step, e2_ptr, e2_tpos,
+        ted_consumed, MATCH_EARLY_EXIT_DIFF,
+    )
 
-        best_match = None
-        best_diff = float('inf')
-        best_key = None
-        best_i = None
-        best_lookup = None
-
-        # E1: NIF + importe + año (only if NIF is valid)
-        if nif and len(nif) >= 5:
-            for yr_offset in range(MATCH_YEAR_WINDOW + 1):
-                for yr_try in ([yr + yr_offset, yr - yr_offset] if yr_offset > 0 else [yr]):
-                    key = (nif, yr_try)
-                    entries = ted_lookup.get(key, [])
-                    for i, entry in enumerate(entries):
-                        if entry['consumed']:
-                            continue
-                        diff = abs(entry['importe'] - imp)
-                        if diff <= t and diff < best_diff:
-                            best_match = entry
-                            best_diff = diff
-                            best_key = key
-                            best_i = i
-                            best_lookup = ted_lookup
-
-        # E2: expediente + importe
-        if best_match is None:
-            exp_id = row['_expediente'].strip().upper()
-            if exp_id and len(exp_id) >= 4:
-                entries = ted_lookup_exp.get(exp_id, [])
-                for i, entry in enumerate(entries):
-                    if entry['consumed']:
-                        continue
-                    diff = abs(entry['importe'] - imp)
-                    if diff <= t and diff < best_diff:
-                        best_match = entry
-                        best_diff = diff
-                        best_key = exp_id
-                        best_i = i
-                        best_lookup = ted_lookup_exp
-
-        if best_match is not None:
-            best_lookup[best_key][best_i]['consumed'] = True
-            matched_idx.append(idx)
-            if best_lookup is ted_lookup:
-                n_match_nif += 1
-            else:
-                n_match_exp += 1
-            match_data[idx] = best_match
+    hit = best >= 0
+    matched_idx = sara_index[rows_with_cand[hit]].tolist()
+    match_pos = dict(zip(matched_idx, best[hit].tolist()))  # fila PLACSP -> posicion TED
+    n_match_nif = int((kind == 1).sum())
+    n_match_exp = int((kind == 2).sum())
 
     print(f"\n  E1 (NIF adj + importe): {n_match_nif:,}")
     print(f"  E2 (expediente + importe): {n_match_exp:,}")
@@ -599,10 +1070,11 @@ def run_e1_e2(df_placsp, df_ted):
     # -- E2b: Expediente completo para lotes SARA --
     n_match_exp_lot = 0
     e2b_matched_idx = set()  # Track E2b matches explicitly
+    matched_set = set(matched_idx)  # pertenencia O(1); matched_idx conserva el orden
     sara_lot_not_matched = df_placsp[
         df_placsp['_es_sara'] &
         df_placsp['_sara_por_lotes'] &
-        ~df_placsp.index.isin(matched_idx)
+        ~df_placsp.index.isin(matched_set)
     ]
 
     if len(sara_lot_not_matched) > 0:
@@ -619,21 +1091,19 @@ def run_e1_e2(df_placsp, df_ted):
             if not exp_id or len(exp_id) < 4:
                 continue
             exp_upper = exp_id.strip().upper()
-            entries = ted_lookup_exp.get(exp_upper, [])
-
-            ted_match = None
-            for i, entry in enumerate(entries):
-                if not entry['consumed']:
-                    ted_match = entry
-                    ted_match_i = i
-                    break
+            cand = ted_lookup_exp.positions(exp_upper)
+            if cand is None:
+                continue
+            free = cand[~ted_consumed[cand]]
 
-            if ted_match is not None:
-                ted_lookup_exp[exp_upper][ted_match_i]['consumed'] = True
+            if len(free) > 0:
+                ted_consumed[free[0]] = True
+                ted_pos = int(free[0])
                 for lot_idx in grp['indices']:
-                    if lot_idx not in matched_idx:
+                    if lot_idx not in matched_set:
+                        matched_set.add(lot_idx)
                         matched_idx.append(lot_idx)
-                        match_data[lot_idx] = ted_match
+                        match_pos[lot_idx] = ted_pos
                         e2b_matched_idx.add(lot_idx)
                         n_match_exp_lot += 1
 
@@ -643,12 +1113,13 @@ def run_e1_e2(df_placsp, df_ted):
     print(f"  Tiempo E1+E2+E2b: {elapsed:.0f}s")
     print(f"  Total matched: {len(matched_idx):,}")
 
+    # Una fila por match (indice PLACSP) con los campos TED, en un solo gather
+    pos = np.fromiter(match_pos.values(), dtype=np.int64, count=len(match_pos))
+    match_data = pd.DataFrame(ted_entries(pos), index=list(match_pos))
+
     # Collect consumed TED notice IDs to avoid re-matching in E3-E6
-    consumed_ted_ids = set()
-    for idx, data in match_data.items():
-        tid = data.get('ted_id', '')
-        if tid and tid != 'nan':
-            consumed_ted_ids.add(tid)
+    tids = match_data['ted_id']
+    consumed_ted_ids = set(tids[(tids != '') & (tids != 'nan')])
 
     return matched_idx, match_data, n_match_nif, n_match_exp, n_match_exp_lot, e2b_matched_idx, consumed_ted_ids
 
@@ -657,6 +1128,110 @@ def run_e1_e2(df_placsp, df_ted):
 #  4. MATCHING AVANZADO (E3 + E4 + E5 + E6)
 # ======================================================================
 
+# Los indices se construyen sobre todo ted_valid: las entradas ya consumidas
+# se descartan al buscar (ted_consumed[tidx]), con el mismo resultado que
+# filtrarlas al construir. Asi son independientes y se construyen en paralelo.
+
+def ted_cae_keys(ted_valid):
+    """(NIF organo limpio, nombre organo normalizado) de TED como arrays.
+
+    Usa _cae_nif / _cae_name_norm si run_advanced_matching ya los calculo,
+    para no repetir clean_nifs / normalize_names en cada indice.
+    """
+    if '_cae_nif' in ted_valid.columns and '_cae_name_norm' in ted_valid.columns:
+        return ted_valid['_cae_nif'].to_numpy(), ted_valid['_cae_name_norm'].to_numpy()
+    return (clean_nifs(pd.Series(_ted_col(ted_valid, 'cae_nationalid', ''))).to_numpy(),
+            normalize_names(_ted_col(ted_valid, 'cae_name', '')))
+
+
+def build_cae_index(ted_valid):
+    """Indice E3: (NIF organo TED, ano) -> [(tidx, importe)]."""
+    keys, yrs, tidxs, imps = [], [], [], []
+    for tidx, cae_nif, yr, imp in zip(
+        ted_valid.index,
+        ted_cae_keys(ted_valid)[0],
+        _ted_col(ted_valid, 'year'),
+        ted_valid['importe_ted'].to_numpy(),
+    ):
+        if cae_nif and pd.notna(yr):
+            keys.append(cae_nif)
+            yrs.append(int(yr))
+            tidxs.append(tidx)
+            imps.append(imp)
+    return _CSRIndex(keys, yrs, tidxs, imps)
+
+
+def build_total_index(ted_valid):
+    """Indice E4: (NIF organo | 'name:'+nombre, ano) -> [(tidx, total/estimado/lote)]."""
+    keys, yrs, tidxs, vals = [], [], [], []
+    total_vals = pd.to_numeric(pd.Series(_ted_col(ted_valid, 'total_value')), errors='coerce')
+    est_vals = pd.to_numeric(pd.Series(_ted_col(ted_valid, 'estimated_value_proc')), errors='coerce')
+    for tidx, total_val, est_val, lot_imp, yr, cae_nif, cae_name in zip(
+        ted_valid.index,
+        total_vals.to_numpy(),
+        est_vals.to_numpy(),
+        ted_valid['importe_ted'].to_numpy(),
+        _ted_col(ted_valid, 'year'),
+        *ted_cae_keys(ted_valid),
+    ):
+        cae_name = cae_name[:40]
+
+        if pd.notna(yr):
+            yr = int(yr)
+            for key, ok in [(cae_nif, bool(cae_nif)),
+                            ('name:' + cae_name, bool(cae_name) and len(cae_name) > 5)]:
+                if not ok:
+                    continue
+                for val in [total_val, est_val, lot_imp]:
+                    if pd.notna(val) and val > 0:
+                        keys.append(key)
+                        yrs.append(yr)
+                        tidxs.append(tidx)
+                        vals.append(val)
+    return _CSRIndex(keys, yrs, tidxs, vals)
+
+
+def build_name_index(ted_valid):
+    """Indice E5/E3b: (nombre organo normalizado[:40], ano) -> [(tidx, importe)]."""
+    keys, yrs, tidxs, imps = [], [], [], []
+    for tidx, name, yr, imp in zip(
+        ted_valid.index,
+        ted_cae_keys(ted_valid)[1],
+        _ted_col(ted_valid, 'year'),
+        ted_valid['importe_ted'].to_numpy(),
+    ):
+        name = name[:40]
+        if name and len(name) > 5 and pd.notna(yr):
+            keys.append(name)
+            yrs.append(int(yr))
+            tidxs.append(tidx)
+            imps.append(imp)
+    return _CSRIndex(keys, yrs, tidxs, imps)
+
+
+def build_token_index(ted_valid):
+    """Indice E7: (token significativo del nombre, ano) -> [tidx].
+
+    Solo nombres de mas de 10 caracteres con importe > 0. Devuelve tambien
+    la mascara por posicion de las filas indexadas.
+    """
+    keys, yrs, tidxs = [], [], []
+    indexed = np.zeros(len(ted_valid), dtype=bool)
+    for pos, (tidx, name, yr, imp) in enumerate(zip(
+        ted_valid.index,
+        ted_cae_keys(ted_valid)[1],
+        _ted_col(ted_valid, 'year'),
+        ted_valid['importe_ted'].to_numpy(),
+    )):
+        if name and len(name) > 10 and pd.notna(yr) and pd.notna(imp) and imp > 0:
+            indexed[pos] = True
+            toks = {t for t in name.split() if len(t) > 3 and t not in _STOPWORDS}
+            keys.extend(toks)
+            yrs.extend([int(yr)] * len(toks))
+            tidxs.extend([tidx] * len(toks))
+    return _CSRIndex(keys, yrs, tidxs), indexed
+
+
 def run_advanced_matching(df_sara, df_ted, matched_idx_prev, match_data_prev, consumed_ted_ids):
     """E3-E6: NIF organo, lotes agrupados, nombre organo, propagacion."""
     print(f"\n{'='*70}")
@@ -665,19 +1240,37 @@ def run_advanced_matching(df_sara, df_ted, matched_idx_prev, match_data_prev, co
 
     t0 = time.time()
 
-    # Separar matched vs missing
+    # Separar matched vs missing. Las etapas marcan sus matches en una mascara
+    # bool por posicion de df_sara (sin sets de etiquetas ni isin por etapa)
     matched_set = set(matched_idx_prev)
-    df_missing = df_sara[
-        df_sara['_es_sara'] &
-        ~df_sara.index.isin(matched_set) &
-        ~df_sara['_es_neg_sin_pub']
-    ].copy()
+    is_matched = np.zeros(len(df_sara), dtype=bool)
+    is_matched[df_sara.index.get_indexer(list(matched_set))] = True
+
+    def _mark_matched(labels):
+        is_matched[df_sara.index.get_indexer(list(labels))] = True
+
+    missing_mask = (df_sara['_es_sara'].to_numpy(dtype=bool) & ~is_matched
+                    & ~df_sara['_es_neg_sin_pub'].to_numpy(dtype=bool))
+    missing_pos = np.flatnonzero(missing_mask)  # posicion en df_sara de cada fila missing
+
+    # Las etapas solo leen estas columnas: se trabaja sobre una copia estrecha
+    # y cada etapa la filtra con la mascara. El df_missing completo se
+    # materializa una unica vez al final (df_missing_final).
+    ano_col = '_ano' if '_ano' in df_sara.columns else 'ano'
+    exp_col = '_expediente' if '_expediente' in df_sara.columns else 'expediente'
+    stage_cols = ['organo_contratante', 'nif_organo', '_imp_match', ano_col, exp_col]
+    df_missing = df_sara.loc[missing_mask, stage_cols]
     print(f"  Missing a analizar: {len(df_missing):,}")
+    # Claves normalizadas una sola vez; las etapas siguientes filtran filas
+    df_missing = df_missing.assign(
+        _nif_org_clean=clean_nifs(df_missing['nif_organo']).to_numpy(),
+        _organ_norm=normalize_names(df_missing['organo_contratante']),
+    )
 
     # TED valido — excluir los ya consumed en E1+E2
     ted_valid = df_ted[
         (df_ted['importe_ted'].notna()) & (df_ted['importe_ted'] > 0)
-    ].copy()
+    ]
     if consumed_ted_ids:
         ted_id_col = 'ted_notice_id' if 'ted_notice_id' in ted_valid.columns else None
         if ted_id_col:
@@ -685,100 +1278,82 @@ def run_advanced_matching(df_sara, df_ted, matched_idx_prev, match_data_prev, co
             ted_valid = ted_valid[~ted_valid[ted_id_col].astype(str).isin(consumed_ted_ids)]
             print(f"  TED excluidos (ya matched E1+E2): {n_before - len(ted_valid):,}")
     ted_valid = ted_valid.reset_index(drop=True)
-    ted_consumed = set()
+    cae_nif, cae_name_norm = ted_cae_keys(ted_valid)
+    ted_valid = ted_valid.assign(_cae_nif=cae_nif, _cae_name_norm=cae_name_norm)
+    ted_consumed = np.zeros(len(ted_valid), dtype=bool)  # por posicion (indice 0..n-1)
+
+    # Indices E3 / E4 / E5 / E7 (independientes entre si; solo leen ted_valid)
+    with ThreadPoolExecutor(max_workers=4) as ex:
+        f_cae = ex.submit(build_cae_index, ted_valid)
+        f_total = ex.submit(build_total_index, ted_valid)
+        f_name = ex.submit(build_name_index, ted_valid)
+        f_token = ex.submit(build_token_index, ted_valid)
+        ted_by_cae = f_cae.result()
+        ted_by_total = f_total.result()
+        ted_by_name = f_name.result()
+        ted_token_index, token_indexed = f_token.result()
 
     # ── E3: NIF organo contratante + importe ──
     print(f"\n  --- E3: NIF organo contratante + importe ---")
 
-    ted_by_cae = defaultdict(list)
-    for tidx, row in ted_valid.iterrows():
-        cae_nif = clean_nif(row.get('cae_nationalid', ''))
-        yr = row.get('year', np.nan)
-        imp = row['importe_ted']
-        if cae_nif and pd.notna(yr):
-            ted_by_cae[(cae_nif, int(yr))].append((tidx, imp))
-
     print(f"  Indice TED por buyer NIF: {len(ted_by_cae):,} claves")
 
-    e3_matched = []
-    for idx, row in df_missing.iterrows():
-        nif_org = clean_nif(row.get('nif_organo', ''))
-        imp = row['_imp_match']
-        yr = row['_ano'] if '_ano' in row.index else row['ano']
-
-        if not nif_org or pd.isna(imp) or pd.isna(yr) or imp <= 0:
-            continue
-
-        yr = int(yr)
-        t = tol(imp)
-        best = None
-        best_diff = float('inf')
-
-        for yr_try in [yr, yr-1, yr+1]:
-            for tidx, ted_imp in ted_by_cae.get((nif_org, yr_try), []):
-                if tidx in ted_consumed:
-                    continue
-                diff = abs(ted_imp - imp)
-                if diff <= t and diff < best_diff:
-                    best = tidx
-                    best_diff = diff
-
-        if best is not None:
-            ted_consumed.add(best)
-            e3_matched.append((idx, best, best_diff))
+    e3_nifs = df_missing['_nif_org_clean'].to_numpy()
+    e3_imps = df_missing['_imp_match'].to_numpy(dtype=float)
+    e3_yrs = df_missing[ano_col].to_numpy(dtype=float)
+    e3_best, e3_diff = ted_by_cae.nearest_greedy(
+        e3_nifs, e3_yrs, e3_imps, np.maximum(e3_imps * MATCH_TOL_PCT, MATCH_TOL_ABS),
+        (e3_nifs != '') & (e3_imps > 0) & ~np.isnan(e3_yrs),
+        ted_consumed, ADV_YEAR_OFFSETS,
+    )
+    e3_hit = np.flatnonzero(e3_best >= 0)
+    e3_matched = list(zip(
+        df_missing.index[e3_hit], e3_best[e3_hit].tolist(), e3_diff[e3_hit].tolist()
+    ))
 
     e3_idx = {m[0] for m in e3_matched}
-    df_missing_after_e3 = df_missing[~df_missing.index.isin(e3_idx)]
+    _mark_matched(e3_idx)
+    df_missing_after_e3 = df_missing[~is_matched[missing_pos]]
     print(f"  E3 matches: {len(e3_matched):,}")
     print(f"  Missing restante: {len(df_missing_after_e3):,}")
 
     # ── E4: Lotes agrupados ──
     print(f"\n  --- E4: Lotes agrupados ---")
 
-    ted_by_total = defaultdict(list)
-    for tidx, row in ted_valid.iterrows():
-        if tidx in ted_consumed:
-            continue
-        total_val = pd.to_numeric(row.get('total_value', np.nan), errors='coerce')
-        est_val = pd.to_numeric(row.get('estimated_value_proc', np.nan), errors='coerce')
-        lot_imp = row['importe_ted']
-        yr = row.get('year', np.nan)
-        cae_nif = clean_nif(row.get('cae_nationalid', ''))
-        cae_name = normalize_name(row.get('cae_name', ''))[:40]
-
-        if pd.notna(yr):
-            yr = int(yr)
-            if cae_nif:
-                for val in [total_val, est_val, lot_imp]:
-                    if pd.notna(val) and val > 0:
-                        ted_by_total[(cae_nif, yr)].append((tidx, val))
-            if cae_name and len(cae_name) > 5:
-                for val in [total_val, est_val, lot_imp]:
-                    if pd.notna(val) and val > 0:
-                        ted_by_total[('name:' + cae_name, yr)].append((tidx, val))
-
     print(f"  Indice TED agrupado: {len(ted_by_total):,} claves")
 
-    ano_col = '_ano' if '_ano' in df_missing_after_e3.columns else 'ano'
-    groups = df_missing_after_e3.groupby(['organo_contratante', ano_col]).agg(
-        indices=('_imp_match', lambda x: list(x.index)),
+    # Agregados en C y posiciones por grupo via .indices (sin lambda por grupo)
+    g = df_missing_after_e3.groupby(['organo_contratante', ano_col], observed=True)
+    groups = g.agg(
         n=('_imp_match', 'count'),
         imp_total=('_imp_match', 'sum'),
         nif_org=('nif_organo', 'first'),
-    ).reset_index()
-    groups = groups[groups['n'] >= 2].copy()
+        organ_norm=('_organ_norm', 'first'),
+    )
+    groups = groups[groups['n'] >= 2]
+    group_pos = g.indices
+    missing_labels = df_missing_after_e3.index.to_numpy()
     print(f"  Grupos organo+ano con >=2 contratos: {len(groups):,}")
 
     e4_matched_groups = []
     e4_matched_idx = set()
 
-    for _, grp in groups.iterrows():
-        nif_org = clean_nif(grp['nif_org'])
-        organ_name = normalize_name(grp['organo_contratante'])[:40]
-        yr = int(grp[ano_col])
-        imp_total = grp['imp_total']
-        indices = grp['indices']
-
+    # Codigos de bucket (clave, ano+off) resueltos en bloque para todos los
+    # grupos: el bucle solo indexa arrays. Las claves vacias o nombres de <= 5
+    # caracteres no existen en el indice y quedan en -1.
+    e4_yrs = groups.index.get_level_values(ano_col).to_numpy(dtype=np.int64)
+    e4_nif_keys = clean_nifs(groups['nif_org']).to_numpy()
+    e4_name_keys = ('name:' + groups['organ_norm'].str[:40]).to_numpy()
+    nif_codes = np.stack(
+        [ted_by_total.codes_of(e4_nif_keys, e4_yrs + off) for off in ADV_YEAR_OFFSETS], axis=1
+    ).tolist()
+    name_codes = np.stack(
+        [ted_by_total.codes_of(e4_name_keys, e4_yrs + off) for off in ADV_YEAR_OFFSETS], axis=1
+    ).tolist()
+
+    for imp_total, key, nif_row, name_row in zip(
+        groups['imp_total'].to_numpy(), groups.index, nif_codes, name_codes,
+    ):
         if pd.isna(imp_total) or imp_total <= 0:
             continue
 
@@ -786,31 +1361,25 @@ def run_advanced_matching(df_sara, df_ted, matched_idx_prev, match_data_prev, co
         best = None
         best_diff = float('inf')
 
-        for yr_try in [yr, yr-1, yr+1]:
-            if nif_org:
-                for tidx, ted_val in ted_by_total.get((nif_org, yr_try), []):
-                    if tidx in ted_consumed:
-                        continue
-                    diff = abs(ted_val - imp_total)
-                    if diff <= t and diff < best_diff:
-                        best = tidx
-                        best_diff = diff
-            if best is None and organ_name and len(organ_name) > 5:
-                for tidx, ted_val in ted_by_total.get(('name:' + organ_name, yr_try), []):
-                    if tidx in ted_consumed:
-                        continue
-                    diff = abs(ted_val - imp_total)
-                    if diff <= t and diff < best_diff:
-                        best = tidx
-                        best_diff = diff
+        for nif_code, name_code in zip(nif_row, name_row):
+            tidx, diff = ted_by_total.nearest_code(nif_code, imp_total, t, ted_consumed)
+            if diff < best_diff:
+                best = tidx
+                best_diff = diff
+            if best is None:
+                tidx, diff = ted_by_total.nearest_code(name_code, imp_total, t, ted_consumed)
+                if diff < best_diff:
+                    best = tidx
+                    best_diff = diff
 
         if best is not None:
-            ted_consumed.add(best)
+            ted_consumed[best] = True
+            indices = missing_labels[group_pos[key]].tolist()
             e4_matched_groups.append((indices, best, best_diff, imp_total))
-            for i in indices:
-                e4_matched_idx.add(i)
+            e4_matched_idx.update(indices)
 
-    df_missing_after_e4 = df_missing_after_e3[~df_missing_after_e3.index.isin(e4_matched_idx)]
+    _mark_matched(e4_matched_idx)
+    df_missing_after_e4 = df_missing[~is_matched[missing_pos]]
     print(f"  E4 grupos matched: {len(e4_matched_groups):,}")
     print(f"  E4 registros cubiertos: {len(e4_matched_idx):,}")
     print(f"  Missing restante: {len(df_missing_after_e4):,}")
@@ -818,47 +1387,25 @@ def run_advanced_matching(df_sara, df_ted, matched_idx_prev, match_data_prev, co
     # ── E5: Nombre organo + importe ──
     print(f"\n  --- E5: Nombre organo + importe ---")
 
-    ted_by_name = defaultdict(list)
-    for tidx, row in ted_valid.iterrows():
-        if tidx in ted_consumed:
-            continue
-        name = normalize_name(row.get('cae_name', ''))[:40]
-        yr = row.get('year', np.nan)
-        imp = row['importe_ted']
-        if name and len(name) > 5 and pd.notna(yr):
-            ted_by_name[(name, int(yr))].append((tidx, imp))
-
     print(f"  Indice TED por buyer name: {len(ted_by_name):,} claves")
 
-    e5_matched = []
-    for idx, row in df_missing_after_e4.iterrows():
-        organ = normalize_name(row.get('organo_contratante', ''))[:40]
-        imp = row['_imp_match']
-        yr = row[ano_col]
-
-        if not organ or len(organ) < 6 or pd.isna(imp) or pd.isna(yr) or imp <= 0:
-            continue
-
-        yr = int(yr)
-        t = tol(imp)
-        best = None
-        best_diff = float('inf')
-
-        for yr_try in [yr, yr-1, yr+1]:
-            for tidx, ted_imp in ted_by_name.get((organ, yr_try), []):
-                if tidx in ted_consumed:
-                    continue
-                diff = abs(ted_imp - imp)
-                if diff <= t and diff < best_diff:
-                    best = tidx
-                    best_diff = diff
-
-        if best is not None:
-            ted_consumed.add(best)
-            e5_matched.append((idx, best, best_diff))
+    e5_organs = df_missing_after_e4['_organ_norm'].str[:40].to_numpy()
+    e5_imps = df_missing_after_e4['_imp_match'].to_numpy(dtype=float)
+    e5_yrs = df_missing_after_e4[ano_col].to_numpy(dtype=float)
+    e5_best, e5_diff = ted_by_name.nearest_greedy(
+        e5_organs, e5_yrs, e5_imps, np.maximum(e5_imps * MATCH_TOL_PCT, MATCH_TOL_ABS),
+        (df_missing_after_e4['_organ_norm'].str.len().to_numpy() >= 6)
+        & (e5_imps > 0) & ~np.isnan(e5_yrs),
+        ted_consumed, ADV_YEAR_OFFSETS,
+    )
+    e5_hit = np.flatnonzero(e5_best >= 0)
+    e5_matched = list(zip(
+        df_missing_after_e4.index[e5_hit], e5_best[e5_hit].tolist(), e5_diff[e5_hit].tolist()
+    ))
 
     e5_idx = {m[0] for m in e5_matched}
-    df_missing_after_e5 = df_missing_after_e4[~df_missing_after_e4.index.isin(e5_idx)]
+    _mark_matched(e5_idx)
+    df_missing_after_e5 = df_missing[~is_matched[missing_pos]]
     print(f"  E5 matches: {len(e5_matched):,}")
     print(f"  Missing restante: {len(df_missing_after_e5):,}")
 
@@ -866,19 +1413,9 @@ def run_advanced_matching(df_sara, df_ted, matched_idx_prev, match_data_prev, co
     # Para organos cuyo nombre en PLACSP difiere del de TED (ej. ADIF)
     print(f"\n  --- E3b: Alias nombre organo + importe ---")
 
-    # Build alias lookup: para cada alias TED, indexar por (alias_norm[:40], year)
-    # Reutilizamos ted_by_name construido para E5, pero necesitamos reconstruir
-    # para incluir entradas consumed por E5 que podrian tener alias diferentes
-    ted_by_name_full = defaultdict(list)
-    for tidx, row in ted_valid.iterrows():
-        if tidx in ted_consumed:
-            continue
-        name = normalize_name(row.get('cae_name', ''))
-        yr = row.get('year', np.nan)
-        imp = row['importe_ted']
-        if name and len(name) > 5 and pd.notna(yr):
-            # Index full name and first 40 chars
-            ted_by_name_full[(name[:40], int(yr))].append((tidx, imp))
+    # Alias lookup: indexado por (alias_norm[:40], year). Es el mismo indice
+    # que E5; las entradas consumidas por E5 se descartan al buscar.
+    ted_by_name_full = ted_by_name
 
     # Build reverse alias: PLACSP norm name → list of TED norm name keys to try
     alias_lookup = {}
@@ -886,10 +1423,13 @@ def run_advanced_matching(df_sara, df_ted, matched_idx_prev, match_data_prev, co
         alias_lookup[placsp_name[:40]] = [n[:40] for n in ted_names]
 
     e3b_matched = []
-    for idx, row in df_missing_after_e5.iterrows():
-        organ = normalize_name(row.get('organo_contratante', ''))[:40]
-        imp = row['_imp_match']
-        yr = row[ano_col]
+    for idx, organ, imp, yr in zip(
+        df_missing_after_e5.index,
+        df_missing_after_e5['_organ_norm'].to_numpy(),
+        df_missing_after_e5['_imp_match'].to_numpy(),
+        df_missing_after_e5[ano_col].to_numpy(),
+    ):
+        organ = organ[:40]
 
         if not organ or pd.isna(imp) or pd.isna(yr) or imp <= 0:
             continue
@@ -902,21 +1442,20 @@ def run_advanced_matching(df_sara, df_ted, matched_idx_prev, match_data_prev, co
         best_diff = float('inf')
 
         for alias in alias_lookup[organ]:
-            for yr_try in [yr, yr-1, yr+1]:
-                for tidx, ted_imp in ted_by_name_full.get((alias, yr_try), []):
-                    if tidx in ted_consumed:
-                        continue
-                    diff = abs(ted_imp - imp)
-                    if diff <= t and diff < best_diff:
-                        best = tidx
-                        best_diff = diff
+            for off in ADV_YEAR_OFFSETS:
+                yr_try = yr + off
+                tidx, diff = ted_by_name_full.nearest((alias, yr_try), imp, t, ted_consumed)
+                if diff < best_diff:
+                    best = tidx
+                    best_diff = diff
 
         if best is not None:
-            ted_consumed.add(best)
+            ted_consumed[best] = True
             e3b_matched.append((idx, best, best_diff))
 
     e3b_idx = {m[0] for m in e3b_matched}
-    df_missing_after_e3b = df_missing_after_e5[~df_missing_after_e5.index.isin(e3b_idx)]
+    _mark_matched(e3b_idx)
+    df_missing_after_e3b = df_missing[~is_matched[missing_pos]]
     print(f"  Alias definidos: {len(ORGAN_ALIASES)}")
     print(f"  E3b matches: {len(e3b_matched):,}")
     print(f"  Missing restante: {len(df_missing_after_e3b):,}")
@@ -925,44 +1464,46 @@ def run_advanced_matching(df_sara, df_ted, matched_idx_prev, match_data_prev, co
     # Para organos con nombres parecidos pero no identicos despues de normalizar
     print(f"\n  --- E7: Fuzzy token overlap + importe ---")
 
-    # Build TED name index (full normalized names, not truncated)
-    ted_names_full = defaultdict(list)
-    for tidx, row in ted_valid.iterrows():
-        if tidx in ted_consumed:
-            continue
-        name = normalize_name(row.get('cae_name', ''))
-        yr = row.get('year', np.nan)
-        imp = row['importe_ted']
-        if name and len(name) > 10 and pd.notna(yr) and pd.notna(imp) and imp > 0:
-            ted_names_full[int(yr)].append((tidx, name, imp))
-
-    # Extract unique significant tokens from TED names for fast pre-filtering
-    # Build inverted index: token → set of years that have it
-    ted_token_index = defaultdict(lambda: defaultdict(list))
-    for yr, entries in ted_names_full.items():
-        for tidx, name, imp in entries:
-            toks = {t for t in name.split() if len(t) > 3 and t not in _STOPWORDS}
-            for tok in toks:
-                ted_token_index[tok][yr].append((tidx, name, imp))
-
-    print(f"  TED token index: {len(ted_token_index):,} tokens unicos")
-    print(f"  TED entries por año: {sum(len(v) for v in ted_names_full.values()):,}")
+    ted_names = ted_valid['_cae_name_norm'].to_numpy()
+    ted_imps = ted_valid['importe_ted'].to_numpy(dtype=float)
+    # Indice construido al inicio sobre todo ted_valid; aqui solo cuentan los
+    # TED aun libres (los consumidos se descartan al filtrar candidatos)
+    free_entries = token_indexed & ~ted_consumed
+    token_live = np.zeros(len(ted_token_index), dtype=bool)
+    token_bucket = np.repeat(np.arange(len(ted_token_index)), np.diff(ted_token_index.offsets))
+    token_live[token_bucket[~ted_consumed[ted_token_index.tidx]]] = True
+    n_tokens = (len(np.unique(ted_token_index.uniques.codes[0][token_live]))
+                if len(ted_token_index) else 0)
+    print(f"  TED token index: {n_tokens:,} tokens unicos")
+    print(f"  TED entries por año: {int(free_entries.sum()):,}")
+
+    # Tokens de solapamiento por nombre TED distinto: se calculan una vez,
+    # no en cada comparacion candidato x organo
+    ted_overlap_toks = {}
+
+    def _ted_ov_toks(tidx):
+        name = ted_names[tidx]
+        toks = ted_overlap_toks.get(name)
+        if toks is None:
+            toks = ted_overlap_toks[name] = overlap_tokens(name)
+        return toks
 
     e7_matched = []
     e7_checked = 0
     MIN_OVERLAP_RATIO = 0.6
     MIN_OVERLAP_TOKENS = 3
 
-    for idx, row in df_missing_after_e3b.iterrows():
-        organ_full = normalize_name(row.get('organo_contratante', ''))
-        imp = row['_imp_match']
-        yr = row[ano_col]
+    for idx, organ_full, imp, yr in zip(
+        df_missing_after_e3b.index,
+        df_missing_after_e3b['_organ_norm'].to_numpy(),
+        df_missing_after_e3b['_imp_match'].to_numpy(),
+        df_missing_after_e3b[ano_col].to_numpy(),
+    ):
 
         if not organ_full or len(organ_full) < 12 or pd.isna(imp) or pd.isna(yr) or imp <= 0:
             continue
 
         yr = int(yr)
-        t = tol(imp)
         organ_toks = {tok for tok in organ_full.split() if len(tok) > 3 and tok not in _STOPWORDS}
 
         if len(organ_toks) < MIN_OVERLAP_TOKENS:
@@ -970,35 +1511,36 @@ def run_advanced_matching(df_sara, df_ted, matched_idx_prev, match_data_prev, co
 
         e7_checked += 1
 
-        # Use inverted index: find TED entries that share at least one significant token
-        candidate_tids = set()
-        for tok in organ_toks:
-            for yr_try in [yr, yr-1, yr+1]:
-                for entry in ted_token_index[tok].get(yr_try, []):
-                    candidate_tids.add(entry)
-
-        best = None
-        best_diff = float('inf')
-        best_ratio = 0.0
-
-        for tidx, ted_name, ted_imp in candidate_tids:
-            if tidx in ted_consumed:
-                continue
-            diff = abs(ted_imp - imp)
-            if diff > t:
-                continue
-            ratio, n_common = token_overlap(organ_full, ted_name, MIN_OVERLAP_TOKENS)
-            if ratio >= MIN_OVERLAP_RATIO and diff < best_diff:
-                best = tidx
-                best_diff = diff
-                best_ratio = ratio
-
-        if best is not None:
-            ted_consumed.add(best)
-            e7_matched.append((idx, best, best_diff))
+        # Candidatos: union de las listas de posiciones de cada (token, año)
+        lists = [
+            pos for tok in organ_toks for off in ADV_YEAR_OFFSETS
+            if (pos := ted_token_index.positions((tok, yr + off))) is not None
+        ]
+        if not lists:
+            continue
+        cands = np.unique(np.concatenate(lists)) if len(lists) > 1 else lists[0]
+        cands = cands[~ted_consumed[cands]]
+        diffs = np.abs(ted_imps[cands] - imp)
+        in_tol = diffs <= tol(imp)
+        if not in_tol.any():
+            continue
+        cands, diffs = cands[in_tol], diffs[in_tol]
+
+        # Solapamiento solo sobre los candidatos dentro de tolerancia, de menor
+        # a mayor diferencia: el primero que supera el umbral es el mejor
+        # (empates -> menor posicion TED, orden estable)
+        organ_ov_toks = overlap_tokens(organ_full)
+        for j in np.argsort(diffs, kind='stable').tolist():
+            tidx = int(cands[j])
+            ratio, _ = token_overlap_sets(organ_ov_toks, _ted_ov_toks(tidx), MIN_OVERLAP_TOKENS)
+            if ratio >= MIN_OVERLAP_RATIO:
+                ted_consumed[tidx] = True
+                e7_matched.append((idx, tidx, float(diffs[j])))
+                break
 
     e7_idx = {m[0] for m in e7_matched}
-    df_missing_after_e7 = df_missing_after_e3b[~df_missing_after_e3b.index.isin(e7_idx)]
+    _mark_matched(e7_idx)
+    df_missing_after_e7 = df_missing[~is_matched[missing_pos]]
     print(f"  Candidatos analizados: {e7_checked:,}")
     print(f"  E7 matches: {len(e7_matched):,}")
     print(f"  Missing restante: {len(df_missing_after_e7):,}")
@@ -1006,65 +1548,44 @@ def run_advanced_matching(df_sara, df_ted, matched_idx_prev, match_data_prev, co
     # ── E6: Propagacion por expediente ──
     print(f"\n  --- E6: Propagacion por expediente ---")
 
-    all_matched_idx_pre = matched_set | e3_idx | e4_matched_idx | e5_idx | e3b_idx | e7_idx
-    exp_col = '_expediente' if '_expediente' in df_sara.columns else 'expediente'
-
-    matched_expedientes = set(
-        df_sara.loc[
-            df_sara.index.isin(all_matched_idx_pre) & (df_sara[exp_col].str.len() > 3),
-            exp_col
-        ]
-    )
+    # Filas SARA ya matched con expediente significativo (len > 3), una sola vez
+    matched_with_exp = is_matched & (df_sara[exp_col].str.len() > 3).to_numpy()
+    matched_expedientes = set(df_sara.loc[matched_with_exp, exp_col])
 
+    # matched_expedientes solo contiene expedientes de len > 3: no hace falta
+    # volver a medir la columna de los missing
     e6_candidates = df_missing_after_e7[
-        df_missing_after_e7[exp_col].isin(matched_expedientes) &
-        (df_missing_after_e7[exp_col].str.len() > 3)
+        df_missing_after_e7[exp_col].isin(matched_expedientes)
     ]
 
     e6_matched_idx = set(e6_candidates.index)
 
-    # Copiar ted_id del primer lote matched del mismo expediente
-    e6_ted_ids = {}
-
     # Build lookup: sara_idx -> ted_id from ALL prior strategies
     all_ted_ids = {}
     # From E1+E2+E2b
-    for sidx, mdata in match_data_prev.items():
-        tid = mdata.get('ted_id', '')
+    for sidx, tid in match_data_prev['ted_id'].items():
         if tid and tid != 'nan':
             all_ted_ids[sidx] = tid
-    # From E3/E4/E5
-    for s_idx_e3, t_idx_e3, _ in e3_matched:
-        all_ted_ids[s_idx_e3] = str(ted_valid.loc[t_idx_e3, 'ted_notice_id'])
-    for indices_e4, t_idx_e4, _, _ in e4_matched_groups:
-        tid_e4 = str(ted_valid.loc[t_idx_e4, 'ted_notice_id'])
-        for s_idx_e4 in indices_e4:
-            all_ted_ids[s_idx_e4] = tid_e4
-    for s_idx_e5, t_idx_e5, _ in e5_matched:
-        all_ted_ids[s_idx_e5] = str(ted_valid.loc[t_idx_e5, 'ted_notice_id'])
-    for s_idx_e3b, t_idx_e3b, _ in e3b_matched:
-        all_ted_ids[s_idx_e3b] = str(ted_valid.loc[t_idx_e3b, 'ted_notice_id'])
-    for s_idx_e7, t_idx_e7, _ in e7_matched:
-        all_ted_ids[s_idx_e7] = str(ted_valid.loc[t_idx_e7, 'ted_notice_id'])
-
-    # Build lookup: expediente -> ted_id (from matched rows)
-    exp_to_tid = {}
-    matched_sara = df_sara.loc[
-        df_sara.index.isin(all_matched_idx_pre) & (df_sara[exp_col].str.len() > 3),
-        [exp_col]
-    ]
-    for sidx, row in matched_sara.iterrows():
-        exp = row[exp_col]
-        if exp not in exp_to_tid and sidx in all_ted_ids:
-            exp_to_tid[exp] = all_ted_ids[sidx]
+    # From E3/E4/E5/E3b/E7 (posiciones TED -> ted_notice_id)
+    ted_ids_arr = ted_valid['ted_notice_id'].astype(str).to_numpy()
+    for s_idx_e4, t_idx_e4, _, _ in e4_matched_groups:
+        all_ted_ids.update(dict.fromkeys(s_idx_e4, ted_ids_arr[t_idx_e4]))
+    for pairs in (e3_matched, e5_matched, e3b_matched, e7_matched):
+        all_ted_ids.update((s_idx, ted_ids_arr[t_idx]) for s_idx, t_idx, _ in pairs)
+
+    # Build lookup: expediente -> ted_id (primera fila matched de cada expediente)
+    tid_s = pd.Series(all_ted_ids, dtype=object)
+    matched_sara = df_sara.loc[matched_with_exp & df_sara.index.isin(tid_s.index), exp_col]
+    exp_tid = pd.DataFrame({'exp': matched_sara.to_numpy(),
+                            'tid': tid_s.reindex(matched_sara.index).to_numpy()})
+    exp_tid = exp_tid.drop_duplicates('exp', keep='first')
+    exp_to_tid = dict(zip(exp_tid['exp'], exp_tid['tid']))
 
-    if len(e6_matched_idx) > 0:
-        for idx in e6_matched_idx:
-            exp = df_missing_after_e7.loc[idx, exp_col]
-            if exp in exp_to_tid:
-                e6_ted_ids[idx] = exp_to_tid[exp]
+    # Copiar ted_id del primer lote matched del mismo expediente
+    e6_ted_ids = e6_candidates[exp_col].map(exp_to_tid).dropna().to_dict()
 
-    df_missing_final = df_missing_after_e7[~df_missing_after_e7.index.isin(e6_matched_idx)]
+    _mark_matched(e6_matched_idx)
+    df_missing_final = df_sara[missing_mask & ~is_matched].copy()
 
     print(f"  Expedientes con match previo: {len(matched_expedientes):,}")
     print(f"  E6 lotes propagados: {len(e6_matched_idx):,}")
@@ -1087,11 +1608,6 @@ def run_advanced_matching(df_sara, df_ted, matched_idx_prev, match_data_prev, co
         'e6_matched_idx': e6_matched_idx,
         'e6_ted_ids': e6_ted_ids,
         'df_missing_final': df_missing_final,
-        'df_missing_after_e3': df_missing_after_e3,
-        'df_missing_after_e4': df_missing_after_e4,
-        'df_missing_after_e5': df_missing_after_e5,
-        'df_missing_after_e3b': df_missing_after_e3b,
-        'df_missing_after_e7': df_missing_after_e7,
         'ted_valid': ted_valid,
     }
 
@@ -1110,42 +1626,59 @@ def apply_results_and_report(df_placsp, matched_idx, match_data,
     ted_valid = adv['ted_valid']
 
     # -- Marcar E1/E2/E2b --
-    df_placsp['_ted_validated'] = False
-    df_placsp['_match_strategy'] = ''
-
-    # Enrich fields
-    enrich_defaults = {
+    # Columnas de resultado + enrich fields, insertadas en un solo bloque
+    result_defaults = {
+        '_ted_validated': False, '_match_strategy': '',
         '_ted_id': '', '_ted_cpv': '', '_ted_win_size': '',
         '_ted_direct_award': '', '_ted_sme_part': '',
         '_ted_buyer_legal_type': '', '_ted_award_criterion': '',
         '_ted_internal_id': '',
+        '_ted_n_ofertas': np.nan, '_ted_duration': np.nan,
+    }
+    side = pd.DataFrame(result_defaults, index=df_placsp.index)
+    df_placsp = pd.concat(
+        [df_placsp.drop(columns=list(result_defaults), errors='ignore'), side],
+        axis=1, copy=False,
+    )
+
+    # Campos de match_data (E1/E2/E2b) -> columnas _ted_*
+    match_data_cols = {
+        'ted_id': '_ted_id',
+        'n_ofertas': '_ted_n_ofertas',
+        'cpv_ted': '_ted_cpv',
+        'win_size': '_ted_win_size',
+        'direct_award': '_ted_direct_award',
+        'sme_part': '_ted_sme_part',
+        'buyer_legal_type': '_ted_buyer_legal_type',
+        'duration_lot': '_ted_duration',
+        'award_criterion_type': '_ted_award_criterion',
+        'internal_id': '_ted_internal_id',
     }
-    for col, default in enrich_defaults.items():
-        df_placsp[col] = default
-    df_placsp['_ted_n_ofertas'] = np.nan
-    df_placsp['_ted_duration'] = np.nan
+    numeric_cols = ('_ted_n_ofertas', '_ted_duration')
+
+    # Estrategia por posicion: se rellena por bloques y se asigna una sola vez
+    # al final; _ted_validated sale de ella (estrategia no vacia)
+    match_strategy = np.full(len(df_placsp), '', dtype=object)
+
+    def _set_strategy(idx, value):
+        match_strategy[df_placsp.index.get_indexer(idx)] = value
 
-    for idx in matched_idx:
-        df_placsp.loc[idx, '_ted_validated'] = True
+    if matched_idx:
         # Asignar estrategia correcta
-        if idx in e2b_matched_idx:
-            df_placsp.loc[idx, '_match_strategy'] = 'E2b_exp_lotes'
-        else:
-            df_placsp.loc[idx, '_match_strategy'] = 'E1_E2'
-        if idx in match_data:
-            m = match_data[idx]
-            df_placsp.loc[idx, '_ted_id'] = m.get('ted_id', '')
-            df_placsp.loc[idx, '_ted_n_ofertas'] = pd.to_numeric(m.get('n_ofertas', np.nan), errors='coerce')
-            df_placsp.loc[idx, '_ted_cpv'] = m.get('cpv_ted', '')
-            df_placsp.loc[idx, '_ted_win_size'] = m.get('win_size', '')
-            df_placsp.loc[idx, '_ted_direct_award'] = m.get('direct_award', '')
-            df_placsp.loc[idx, '_ted_sme_part'] = m.get('sme_part', '')
-            df_placsp.loc[idx, '_ted_buyer_legal_type'] = m.get('buyer_legal_type', '')
-            df_placsp.loc[idx, '_ted_duration'] = pd.to_numeric(m.get('duration_lot', np.nan), errors='coerce')
-            df_placsp.loc[idx, '_ted_award_criterion'] = m.get('award_criterion_type', '')
-            df_placsp.loc[idx, '_ted_internal_id'] = m.get('internal_id', '')
-
-    # -- Marcar E3 --
+        _set_strategy(matched_idx, np.where(
+            pd.Index(matched_idx).isin(list(e2b_matched_idx)), 'E2b_exp_lotes', 'E1_E2'
+        ))
+
+        match_df = match_data
+        for src_col, dest_col in match_data_cols.items():
+            if src_col not in match_df.columns:
+                continue
+            vals = match_df[src_col]
+            if dest_col in numeric_cols:
+                vals = pd.to_numeric(vals, errors='coerce')
+            df_placsp.loc[match_df.index, dest_col] = vals.to_numpy()
+
+    # -- Marcar E3 / E4 / E5 / E3b / E7 --
     ted_enrich_cols = {
         '_ted_n_ofertas': 'number_offers',
         '_ted_cpv': 'cpv',
@@ -1158,53 +1691,40 @@ def apply_results_and_report(df_placsp, matched_idx, match_data,
         '_ted_internal_id': 'internal_id_proc',
     }
 
-    def _enrich_from_ted_valid(df_placsp, s_idx, t_idx, ted_valid, ted_enrich_cols):
-        """Enrich PLACSP row with TED fields from ted_valid DataFrame."""
-        df_placsp.loc[s_idx, '_ted_id'] = str(ted_valid.loc[t_idx, 'ted_notice_id'])
+    def _enrich_from_ted_valid(df_placsp, s_idx, t_idx, strategy):
+        """Marca las filas PLACSP s_idx y copia los campos TED de ted_valid[t_idx]."""
+        if not s_idx:
+            return
+        _set_strategy(s_idx, strategy)
+        src = ted_valid.loc[t_idx]
+        df_placsp.loc[s_idx, '_ted_id'] = src['ted_notice_id'].astype(str).to_numpy()
         for dest_col, src_col in ted_enrich_cols.items():
             if src_col in ted_valid.columns:
-                val = ted_valid.loc[t_idx, src_col]
-                if dest_col in ('_ted_n_ofertas', '_ted_duration'):
-                    df_placsp.loc[s_idx, dest_col] = pd.to_numeric(val, errors='coerce')
+                vals = src[src_col]
+                if dest_col in numeric_cols:
+                    df_placsp.loc[s_idx, dest_col] = pd.to_numeric(vals, errors='coerce').to_numpy()
                 else:
-                    df_placsp.loc[s_idx, dest_col] = str(val) if pd.notna(val) else ''
-
-    for s_idx, t_idx, _ in adv['e3_matched']:
-        df_placsp.loc[s_idx, '_match_strategy'] = 'E3_nif_org'
-        df_placsp.loc[s_idx, '_ted_validated'] = True
-        _enrich_from_ted_valid(df_placsp, s_idx, t_idx, ted_valid, ted_enrich_cols)
-
-    # -- Marcar E4 --
-    for indices, t_idx, _, _ in adv['e4_matched_groups']:
-        for s_idx in indices:
-            df_placsp.loc[s_idx, '_match_strategy'] = 'E4_lotes'
-            df_placsp.loc[s_idx, '_ted_validated'] = True
-            _enrich_from_ted_valid(df_placsp, s_idx, t_idx, ted_valid, ted_enrich_cols)
-
-    # -- Marcar E5 --
-    for s_idx, t_idx, _ in adv['e5_matched']:
-        df_placsp.loc[s_idx, '_match_strategy'] = 'E5_nombre'
-        df_placsp.loc[s_idx, '_ted_validated'] = True
-        _enrich_from_ted_valid(df_placsp, s_idx, t_idx, ted_valid, ted_enrich_cols)
-
-    # -- Marcar E3b --
-    for s_idx, t_idx, _ in adv['e3b_matched']:
-        df_placsp.loc[s_idx, '_match_strategy'] = 'E3b_alias'
-        df_placsp.loc[s_idx, '_ted_validated'] = True
-        _enrich_from_ted_valid(df_placsp, s_idx, t_idx, ted_valid, ted_enrich_cols)
-
-    # -- Marcar E7 --
-    for s_idx, t_idx, _ in adv['e7_matched']:
-        df_placsp.loc[s_idx, '_match_strategy'] = 'E7_fuzzy'
-        df_placsp.loc[s_idx, '_ted_validated'] = True
-        _enrich_from_ted_valid(df_placsp, s_idx, t_idx, ted_valid, ted_enrich_cols)
+                    df_placsp.loc[s_idx, dest_col] = np.where(vals.notna(), vals.astype(str), '')
+
+    for key, strategy in [('e3_matched', 'E3_nif_org'), ('e5_matched', 'E5_nombre'),
+                          ('e3b_matched', 'E3b_alias'), ('e7_matched', 'E7_fuzzy')]:
+        pairs = adv[key]
+        _enrich_from_ted_valid(df_placsp, [m[0] for m in pairs], [m[1] for m in pairs], strategy)
+
+    e4_s_idx = [s_idx for indices, _, _, _ in adv['e4_matched_groups'] for s_idx in indices]
+    e4_t_idx = [t_idx for indices, t_idx, _, _ in adv['e4_matched_groups'] for _ in indices]
+    _enrich_from_ted_valid(df_placsp, e4_s_idx, e4_t_idx, 'E4_lotes')
 
     # -- Marcar E6 --
-    for s_idx in adv['e6_matched_idx']:
-        df_placsp.loc[s_idx, '_match_strategy'] = 'E6_propagacion'
-        df_placsp.loc[s_idx, '_ted_validated'] = True
-        if s_idx in adv['e6_ted_ids']:
-            df_placsp.loc[s_idx, '_ted_id'] = adv['e6_ted_ids'][s_idx]
+    e6_idx = list(adv['e6_matched_idx'])
+    if e6_idx:
+        _set_strategy(e6_idx, 'E6_propagacion')
+    e6_ids = adv['e6_ted_ids']
+    if e6_ids:
+        df_placsp.loc[list(e6_ids.keys()), '_ted_id'] = list(e6_ids.values())
+
+    df_placsp['_match_strategy'] = match_strategy
+    df_placsp['_ted_validated'] = match_strategy != ''
 
     # -- Missing flags --
     df_placsp['_ted_missing'] = (
@@ -1253,26 +1773,32 @@ def apply_results_and_report(df_placsp, matched_idx, match_data,
 
     print(f"\n  {'Ano':>6} {'SARA':>8} {'Match':>8} {'%':>6} {'Missing':>8}")
     print(f"  {'-'*42}")
-    for yr in sorted(df_placsp[df_placsp['_es_sara']][ano_col].dropna().unique()):
+    # Una sola pasada agrupada sobre las filas SARA (por ano y por tipo)
+    df_sara_rep = df_placsp[df_placsp['_es_sara']]
+    tc_col = '_tipo_contrato' if '_tipo_contrato' in df_placsp.columns else 'tipo_contrato'
+    rep_aggs = dict(
+        n=('_ted_validated', 'size'),
+        match=('_ted_validated', 'sum'),
+        miss=('_ted_missing', 'sum'),
+    )
+
+    yr_stats = df_sara_rep.groupby(ano_col).agg(**rep_aggs)
+    for yr, r in zip(yr_stats.index, yr_stats.itertuples(index=False)):
         yr = int(yr)
         if yr < 2010 or yr > 2026:
             continue
-        yr_sara = df_placsp[(df_placsp['_es_sara']) & (df_placsp[ano_col] == yr)]
-        yr_match = yr_sara['_ted_validated'].sum()
-        yr_miss = yr_sara['_ted_missing'].sum()
-        pct = yr_match / max(len(yr_sara), 1) * 100
-        print(f"  {yr:>6} {len(yr_sara):>8,} {yr_match:>8,} {pct:>5.1f}% {yr_miss:>8,}")
+        pct = r.match / max(r.n, 1) * 100
+        print(f"  {yr:>6} {r.n:>8,} {r.match:>8,} {pct:>5.1f}% {r.miss:>8,}")
 
     # -- Por tipo contrato --
     print(f"\n  Matching por tipo contrato:")
-    tc_col = '_tipo_contrato' if '_tipo_contrato' in df_placsp.columns else 'tipo_contrato'
-    for tc in ['Obras', 'Servicios', 'Suministros']:
-        tc_sara = df_placsp[(df_placsp['_es_sara']) & (df_placsp[tc_col] == tc)]
-        tc_match = tc_sara['_ted_validated'].sum()
-        tc_miss = tc_sara['_ted_missing'].sum()
-        pct = tc_match / max(len(tc_sara), 1) * 100
-        print(f"    {tc:<15}: {len(tc_sara):>8,} SARA | "
-              f"{tc_match:>6,} match ({pct:.0f}%) | {tc_miss:>6,} miss")
+    tc_stats = df_sara_rep.groupby(tc_col, observed=True).agg(**rep_aggs)
+    tc_stats.index = tc_stats.index.astype(object)
+    tc_stats = tc_stats.reindex(['Obras', 'Servicios', 'Suministros'], fill_value=0)
+    for tc, r in zip(tc_stats.index, tc_stats.itertuples(index=False)):
+        pct = r.match / max(r.n, 1) * 100
+        print(f"    {tc:<15}: {r.n:>8,} SARA | "
+              f"{r.match:>6,} match ({pct:.0f}%) | {r.miss:>6,} miss")
 
     # -- Missing alta confianza --
     all_matched_organs = set(df_placsp[df_placsp['_ted_validated']]['organo_contratante'].dropna().unique())
@@ -1292,19 +1818,19 @@ def apply_results_and_report(df_placsp, matched_idx, match_data,
 
     # Distribucion importes missing
     print(f"\n  Distribucion importes missing:")
-    for lo, hi, label in [
-        (0, 221_000, "<221K (zona gris / lotes individuales)"),
-        (221_000, 500_000, "221K-500K"),
-        (500_000, 1_000_000, "500K-1M"),
-        (1_000_000, 5_000_000, "1M-5M"),
-        (5_000_000, float('inf'), ">=5M"),
-    ]:
-        n = ((df_missing_final['_imp_match'] >= lo) & (df_missing_final['_imp_match'] < hi)).sum()
+    imp_bins = pd.cut(
+        df_missing_final['_imp_match'],
+        bins=[0, 221_000, 500_000, 1_000_000, 5_000_000, float('inf')],
+        labels=["<221K (zona gris / lotes individuales)", "221K-500K",
+                "500K-1M", "1M-5M", ">=5M"],
+        right=False,
+    )
+    for label, n in imp_bins.value_counts(sort=False).items():
         print(f"    {label:<40}: {n:>8,}")
 
     if len(hc) > 0:
         print(f"\n  Top 15 organos - MISSING ALTA CONFIANZA:")
-        top_hc = hc.groupby('organo_contratante').agg(
+        top_hc = hc.groupby('organo_contratante', observed=True).agg(
             n=('_imp_match', 'count'),
             imp=('_imp_match', 'sum'),
         ).sort_values('n', ascending=False).head(15)
@@ -1335,46 +1861,214 @@ def apply_results_and_report(df_placsp, matched_idx, match_data,
 #  6. GUARDAR
 # ======================================================================
 
-def save_outputs(df_placsp, df_missing_final, hc):
-    """Guarda parquets de resultados."""
+# Filas por row group: estadisticas min/max utiles para filtrar por _ano/_tipo_contrato
+OUTPUT_ROW_GROUP_SIZE = 64_000
+OUTPUT_SORT_COLS = ['_ano', '_tipo_contrato']
+OUTPUT_SAVE_COLS = [
+    'expediente', 'organo_contratante', 'nif_organo', 'dependencia',
+    'nif_adjudicatario', 'adjudicatario', 'importe_adjudicacion',
+    'importe_sin_iva', 'ano', 'estado', 'conjunto', 'tipo_contrato',
+    'procedimiento', 'cpv_principal', 'fecha_adjudicacion',
+    '_es_sara', '_umbral_sara', '_imp_sara', '_imp_match',
+    '_sara_por_lotes', '_is_age', '_is_sector',
+    '_es_neg_sin_pub', '_tipo_contrato', '_procedimiento',
+    '_ted_validated', '_ted_missing', '_ted_missing_incl_neg',
+    '_match_strategy',
+    '_ted_id', '_ted_n_ofertas', '_ted_cpv', '_ted_win_size',
+    '_ted_direct_award', '_ted_sme_part', '_ted_buyer_legal_type',
+    '_ted_duration', '_ted_award_criterion', '_ted_internal_id',
+]
+# Columnas que rellena el matching; el resto de OUTPUT_SAVE_COLS no cambia
+# despues de load_placsp
+OUTPUT_RESULT_PREFIXES = ('_ted_', '_match_strategy')
+# Copia Arrow IPC (Feather v2, lz4) junto a los parquets que se releen en los
+# diagnosticos; el parquet sigue siendo el artefacto publicado
+OUTPUT_FEATHER_SIBLINGS = True
+# Hilos para convertir bloques pandas -> arrays Arrow (una columna por hilo)
+OUTPUT_NTHREADS = os.cpu_count() or 1
+# Filas que el writer codifica de cada vez por columna (por defecto 1024)
+OUTPUT_WRITE_BATCH_SIZE = 8192
+
+
+def output_casts(df):
+    """Downcasts sin perdida para la salida: {columna: dtype numpy}.
+
+    ano a int16 solo si ya es entero y cabe; _ted_n_ofertas (recuento con
+    NaN) a float32 solo si todos sus valores son enteros exactos en float32.
+    Los flags ya son bool desde la carga.
+    """
+    casts = {}
+    if 'ano' in df.columns and pd.api.types.is_integer_dtype(df['ano']):
+        v = df['ano'].to_numpy()
+        if len(v) == 0 or (v.min() >= np.iinfo(np.int16).min and v.max() <= np.iinfo(np.int16).max):
+            casts['ano'] = np.int16
+    if '_ted_n_ofertas' in df.columns and pd.api.types.is_float_dtype(df['_ted_n_ofertas']):
+        v = df['_ted_n_ofertas'].to_numpy()
+        ok = v[~np.isnan(v)]
+        if np.array_equal(ok, np.round(ok)) and (len(ok) == 0 or np.abs(ok).max() < 2 ** 24):
+            casts['_ted_n_ofertas'] = np.float32
+    return casts
+
+
+def downcast_for_output(df):
+    """Aplica output_casts sobre un DataFrame."""
+    casts = output_casts(df)
+    return df.astype(casts) if casts else df
+
+
+def to_output_table(df, columns):
+    """Tabla Arrow con solo `columns` de df (sin copia previa en pandas) y downcasts.
+
+    Los casts se hacen en Arrow; se ajusta tambien el numpy_type de los
+    metadatos pandas para que al leer se recupere el dtype reducido.
+
+    Las columnas category (organos, tipo, procedimiento) son internas del
+    matching: se escriben como texto plano, como antes, para que los
+    consumidores no hereden la lista entera de categorias (un groupby con
+    observed=False saca todas las combinaciones).
+    """
+    table = pa.Table.from_pandas(df, columns=columns, preserve_index=False,
+                                 nthreads=OUTPUT_NTHREADS)
+    casts = {c: d for c, d in output_casts(df).items() if c in table.column_names}
+    decoded = {f.name: f.type.value_type for f in table.schema
+               if pa.types.is_dictionary(f.type) and pa.types.is_string(f.type.value_type)}
+    if not casts and not decoded:
+        return table
+    for col, dtype in casts.items():
+        table = table.set_column(
+            table.schema.get_field_index(col), col,
+            table.column(col).cast(pa.from_numpy_dtype(dtype)),
+        )
+    for col, value_type in decoded.items():
+        table = table.set_column(
+            table.schema.get_field_index(col), col, table.column(col).cast(value_type),
+        )
+    meta = table.schema.pandas_metadata
+    for entry in meta['columns']:
+        if entry['name'] in casts:
+            entry['numpy_type'] = np.dtype(casts[entry['name']]).name
+        elif entry['name'] in decoded:
+            entry.update(pandas_type='unicode', numpy_type='object', metadata=None)
+    return table.replace_schema_metadata({b'pandas': json.dumps(meta).encode()})
+
+
+def output_order(df):
+    """Posiciones de df ordenadas (estable) por ano/tipo, o None si no hay claves.
+
+    Ordenar la salida deja rangos compactos de ano/tipo en cada row group.
+    """
+    sort_cols = [c for c in OUTPUT_SORT_COLS if c in df.columns]
+    if not sort_cols:
+        return None
+    return df[sort_cols].reset_index(drop=True).sort_values(sort_cols, kind='stable').index.to_numpy()
+
+
+def combine_output_tables(tables, columns):
+    """Une por columnas tablas de to_output_table (mismas filas) en el orden columns."""
+    arrays, fields, meta_cols = {}, {}, {}
+    meta = tables[0].schema.pandas_metadata
+    for table in tables:
+        for entry in table.schema.pandas_metadata['columns']:
+            meta_cols[entry['name']] = entry
+        for name in table.column_names:
+            arrays[name] = table.column(name)
+            fields[name] = table.schema.field(name)
+    meta['columns'] = [meta_cols[c] for c in columns]
+    schema = pa.schema([fields[c] for c in columns], metadata={b'pandas': json.dumps(meta).encode()})
+    return pa.Table.from_arrays([arrays[c] for c in columns], schema=schema)
+
+
+def prepare_static_output(df_placsp):
+    """Parte de la salida que no depende del matching: orden de salida y
+    columnas PLACSP guardadas ya en Arrow. MAIN la calcula en segundo plano
+    mientras corre el matching avanzado."""
+    present = frozenset(df_placsp.columns)
+    cols = [c for c in OUTPUT_SAVE_COLS
+            if c in present and not c.startswith(OUTPUT_RESULT_PREFIXES)]
+    return output_order(df_placsp), to_output_table(df_placsp, cols)
+
+
+def write_output_parquet(table, path):
+    """Escribe un parquet de salida con row groups acotados y diccionario.
+
+    Acepta una tabla Arrow (to_output_table) o un DataFrame, y escribe con
+    ParquetWriter sin pasar por el envoltorio de DataFrame.to_parquet. La
+    tabla se escribe por slices (sin copia) de un row group cada uno; slices
+    y no to_batches, que cortaria tambien en cada frontera de chunk.
+    """
+    if isinstance(table, pd.DataFrame):
+        table = pa.Table.from_pandas(table, preserve_index=False, nthreads=OUTPUT_NTHREADS)
+    with pq.ParquetWriter(path, table.schema, compression='zstd', use_dictionary=True,
+                          write_batch_size=OUTPUT_WRITE_BATCH_SIZE,
+                          data_page_size=1 << 20) as writer:
+        for start in range(0, table.num_rows, OUTPUT_ROW_GROUP_SIZE):
+            writer.write_table(table.slice(start, OUTPUT_ROW_GROUP_SIZE),
+                               row_group_size=OUTPUT_ROW_GROUP_SIZE)
+
+
+def save_outputs(df_placsp, df_missing_final, hc, static=None):
+    """Guarda parquets de resultados.
+
+    static es el resultado de prepare_static_output(df_placsp) si ya se
+    calculo; si no, se calcula aqui.
+    """
     OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
 
-    save_cols = [
-        'expediente', 'organo_contratante', 'nif_organo', 'dependencia',
-        'nif_adjudicatario', 'adjudicatario', 'importe_adjudicacion',
-        'importe_sin_iva', 'ano', 'estado', 'conjunto', 'tipo_contrato',
-        'procedimiento', 'cpv_principal', 'fecha_adjudicacion',
-        '_es_sara', '_umbral_sara', '_imp_sara', '_imp_match',
-        '_sara_por_lotes', '_is_age', '_is_sector',
-        '_es_neg_sin_pub', '_tipo_contrato', '_procedimiento',
-        '_ted_validated', '_ted_missing', '_ted_missing_incl_neg',
-        '_match_strategy',
-        '_ted_id', '_ted_n_ofertas', '_ted_cpv', '_ted_win_size',
-        '_ted_direct_award', '_ted_sme_part', '_ted_buyer_legal_type',
-        '_ted_duration', '_ted_award_criterion', '_ted_internal_id',
+    # Pertenencia contra frozensets (no Index.__contains__ columna a columna)
+    placsp_cols = frozenset(df_placsp.columns)
+    cols_exist = [c for c in OUTPUT_SAVE_COLS if c in placsp_cols]
+
+    def _ordered(df):
+        order = output_order(df)
+        return np.arange(len(df)) if order is None else order
+
+    # Las columnas guardadas pasan a Arrow una sola vez por frame (las fijas de
+    # PLACSP vienen de prepare_static_output); el orden de salida y los
+    # filtros SARA/matched se aplican como take sobre la tabla
+    order, static_table = static if static is not None else prepare_static_output(df_placsp)
+    if order is None:
+        order = np.arange(len(df_placsp))
+    m_sara = df_placsp['_es_sara'].to_numpy(dtype=bool)[order]
+    m_val = df_placsp['_ted_validated'].to_numpy(dtype=bool)[order]
+    static_cols = frozenset(static_table.column_names)
+    result_cols = [c for c in cols_exist if c not in static_cols]
+    placsp_table = combine_output_tables(
+        [static_table, to_output_table(df_placsp, result_cols)], cols_exist
+    )
+    missing_cols = frozenset(df_missing_final.columns)
+    miss_cols = [c for c in cols_exist if c in missing_cols]
+    outputs = [
+        ("SARA completo", placsp_table.take(order[m_sara]), OUTPUT_DIR / "crossval_sara.parquet"),
+        ("Matched", placsp_table.take(order[m_val]), OUTPUT_DIR / "crossval_matched.parquet"),
+        ("Missing", to_output_table(df_missing_final, miss_cols).take(_ordered(df_missing_final)),
+         OUTPUT_DIR / "crossval_missing.parquet"),
     ]
-    cols_exist = [c for c in save_cols if c in df_placsp.columns]
-
-    # SARA completo
-    sara_df = df_placsp[df_placsp['_es_sara']][cols_exist]
-    sara_df.to_parquet(OUTPUT_DIR / "crossval_sara.parquet", index=False)
-    print(f"\n  SARA completo: {OUTPUT_DIR / 'crossval_sara.parquet'} ({len(sara_df):,})")
-
-    # Matched
-    matched = df_placsp[df_placsp['_ted_validated']][cols_exist]
-    matched.to_parquet(OUTPUT_DIR / "crossval_matched.parquet", index=False)
-    print(f"  Matched: {OUTPUT_DIR / 'crossval_matched.parquet'} ({len(matched):,})")
-
-    # Missing
-    miss_cols = [c for c in cols_exist if c in df_missing_final.columns]
-    df_missing_final[miss_cols].to_parquet(OUTPUT_DIR / "crossval_missing.parquet", index=False)
-    print(f"  Missing: {OUTPUT_DIR / 'crossval_missing.parquet'} ({len(df_missing_final):,})")
-
-    # Missing alta confianza
-    if len(hc) > 0:
-        hc_cols = [c for c in miss_cols if c in hc.columns]
-        hc[hc_cols].to_parquet(OUTPUT_DIR / "missing_alta_confianza.parquet", index=False)
-        print(f"  Missing HC: {OUTPUT_DIR / 'missing_alta_confianza.parquet'} ({len(hc):,})")
+    # Missing alta confianza (filas de df_missing_final: mismas columnas)
+    if not hc.empty:
+        hc_cols = miss_cols if hc.columns.equals(df_missing_final.columns) else [
+            c for c in miss_cols if c in frozenset(hc.columns)
+        ]
+        outputs.append(("Missing HC", to_output_table(hc, hc_cols).take(_ordered(hc)),
+                        OUTPUT_DIR / "missing_alta_confianza.parquet"))
+
+    # Las escrituras van en paralelo (el writer de Arrow libera el GIL al
+    # codificar y comprimir). Los .feather se escriben cuando ya estan todos
+    # los parquets: read_crossval solo usa la copia si no es mas antigua
+    with ThreadPoolExecutor(max_workers=len(outputs)) as ex:
+        for f in [ex.submit(write_output_parquet, table, path) for _, table, path in outputs]:
+            f.result()
+        if OUTPUT_FEATHER_SIBLINGS:
+            futures = [
+                ex.submit(pf.write_feather, table, path.with_suffix('.feather'), compression='lz4')
+                for label, table, path in outputs if label != "Missing HC"
+            ]
+            for f in futures:
+                f.result()
+
+    # Resumen en una sola escritura; los recuentos salen de las tablas Arrow
+    print('\n' + '\n'.join(
+        f"  {label}: {path} ({table.num_rows:,})" for label, table, path in outputs
+    ))
 
 
 # ======================================================================
@@ -1391,16 +2085,21 @@ if __name__ == "__main__":
     # 2. E1 + E2 + E2b
     matched_idx, match_data, n_e1, n_e2, n_e2b, e2b_matched_idx, consumed_ted_ids = run_e1_e2(df_placsp, df_ted)
 
-    # 3. E3 + E4 + E5 + E6
-    adv = run_advanced_matching(df_placsp, df_ted, matched_idx, match_data, consumed_ted_ids)
+    # La parte fija de la salida (orden + columnas PLACSP en Arrow) se prepara
+    # en segundo plano mientras corren el matching avanzado y el resumen
+    with ThreadPoolExecutor(max_workers=1) as bg:
+        f_static = bg.submit(prepare_static_output, df_placsp)
 
-    # 4. Aplicar resultados + resumen
-    df_placsp, df_missing_final, hc = apply_results_and_report(
-        df_placsp, matched_idx, match_data, n_e1, n_e2, n_e2b, e2b_matched_idx, adv
-    )
+        # 3. E3 + E4 + E5 + E6
+        adv = run_advanced_matching(df_placsp, df_ted, matched_idx, match_data, consumed_ted_ids)
+
+        # 4. Aplicar resultados + resumen
+        df_placsp, df_missing_final, hc = apply_results_and_report(
+            df_placsp, matched_idx, match_data, n_e1, n_e2, n_e2b, e2b_matched_idx, adv
+        )
 
     # 5. Guardar
-    save_outputs(df_placsp, df_missing_final, hc)
+    save_outputs(df_placsp, df_missing_final, hc, static=f_static.result())
 
     elapsed = time.time() - t_start
     print(f"\n  Pipeline completo en {elapsed:.0f}s")
@@ -28,24 +28,55 @@
 
 import os
 import sys
+from sys import intern
+import csv
 import time
 import json
 import math
+import re
 import logging
+import gzip
 import hashlib
+import threading
 from pathlib import Path
 from datetime import datetime
-from collections import defaultdict
+from itertools import chain, compress, islice, repeat, zip_longest
+from concurrent.futures import ThreadPoolExecutor
 
 import pandas as pd
 import numpy as np
 
 try:
     import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
     HAS_REQUESTS = True
 except ImportError:
     HAS_REQUESTS = False
 
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+    import pyarrow.compute as pc
+    import pyarrow.dataset as pds
+    import pyarrow.fs as pafs
+    import pyarrow.parquet as pq
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+try:
+    from numba import njit
+    HAS_NUMBA = True
+except ImportError:
+    HAS_NUMBA = False
+
 # ═══════════════════════════════════════════════════════════════════════════
 #  CONFIGURACIÓN
 # ═══════════════════════════════════════════════════════════════════════════
@@ -65,6 +96,9 @@ class TEDConfig:
     # Formato nuevo: "TED%202020/TED%20-%20Contract%20award%20notices%20{year}.csv"
     CSV_BASE_URL = "https://data.europa.eu/euodp/repository/ec/dg-grow/mapps"
     CSV_YEARS_AVAILABLE = range(2006, 2024)  # CSV llega hasta ~2023
+    CSV_DOWNLOAD_WORKERS = 4  # Años CSV descargados a la vez (limitado por red)
+    # Limpiezas de columna independientes (NIFs, fechas) en paralelo al normalizar
+    NORMALIZE_WORKERS = min(4, os.cpu_count() or 1)
     
     # ── TED Search API v3 (2024+, eForms) ──
     # Endpoint correcto (verificado feb 2026):
@@ -73,6 +107,12 @@ class TEDConfig:
     TED_API_SEARCH = "https://api.ted.europa.eu/v3/notices/search"
     TED_API_PAGE_SIZE = 100  # Máximo por página
     TED_API_RATE_LIMIT = 1.0  # Segundos entre requests (0.5 causa 429)
+    TED_API_PERIOD_WORKERS = 4  # Trimestres descargados a la vez (mismo ritmo global)
+    # Caché en disco de las páginas JSON (gzip), por hash del cuerpo de la
+    # request: re-ejecutar (p. ej. al tocar el parser) no vuelve a descargar.
+    # Solo periodos ya cerrados: los abiertos siguen recibiendo notices
+    API_PAGE_CACHE = True
+    API_PAGE_CACHE_DIR = DATA_DIR / "raw_api"
     
     # ── Campos eForms para la API ──
     # Descubiertos via error-mining del endpoint (feb 2026)
@@ -177,6 +217,18 @@ class TEDConfig:
     MATCH_TOLERANCE_PCT = 0.10  # ±10% del importe
     MATCH_TOLERANCE_ABS = 5_000  # O ±5000€
     MATCH_YEAR_WINDOW = 1  # ±1 año para matching temporal
+    
+    # ── Parquet ──
+    PARQUET_COMPRESSION = "zstd"
+    PARQUET_COMPRESSION_LEVEL = 3
+    # Row groups acotados: las filas llegan agrupadas por año (CSV y API se
+    # añaden año a año), así las estadísticas min/max de `year` permiten
+    # leer solo los años pedidos con filters=[('year', 'in', [...])]
+    PARQUET_ROW_GROUP_SIZE = 100_000
+    # El parquet TED es local (DATA_DIR): se lee por memory map, decodificando
+    # desde la page cache sin copiarlo antes a buffers Arrow.
+    # TED_PARQUET_MEMORY_MAP=0 vuelve a la lectura con buffer (p. ej. en red)
+    PARQUET_MEMORY_MAP = os.environ.get("TED_PARQUET_MEMORY_MAP", "1") != "0"
 
 
 # ═══════════════════════════════════════════════════════════════════════════
@@ -232,12 +284,15 @@ def download_ted_spain(
     
     if csv_years:
         log.info(f"📥 Descargando CSV bulk para {csv_years[0]}-{csv_years[-1]}...")
-        for year in csv_years:
-            df_year = _download_csv_year(year, force_redownload)
-            if df_year is not None and len(df_year) > 0:
-                all_dfs.append(df_year)
-            else:
-                csv_failed_years.append(year)
+        # Descargas en paralelo (E/S de red; pyarrow parsea sin el GIL);
+        # map conserva el orden de años
+        with ThreadPoolExecutor(max_workers=TEDConfig.CSV_DOWNLOAD_WORKERS) as ex:
+            results = ex.map(lambda y: _download_csv_year(y, force_redownload), csv_years)
+            for year, df_year in zip(csv_years, results):
+                if df_year is not None and len(df_year) > 0:
+                    all_dfs.append(df_year)
+                else:
+                    csv_failed_years.append(year)
     
     # Años que no tienen CSV + años que fallaron en CSV → API
     api_years = sorted(set(api_years + csv_failed_years))
@@ -287,18 +342,20 @@ def download_ted_spain(
     for i, df_part in enumerate(all_dfs):
         rename = {k: v for k, v in csv_to_api.items() if k in df_part.columns}
         if rename:
-            all_dfs[i] = df_part.rename(columns=rename)
+            all_dfs[i] = df_part.rename(columns=rename, copy=False)
             if 'source' not in all_dfs[i].columns:
                 all_dfs[i]['source'] = 'csv_bulk'
     
     # ── Combinar y normalizar ──
     df = pd.concat(all_dfs, ignore_index=True)
+    # Las partes por año ya están copiadas en df: se liberan antes de normalizar
+    all_dfs.clear()
     log.info(f"Total registros brutos: {len(df):,}")
     
     df = _normalize_ted_data(df)
     
     # Guardar
-    df.to_parquet(output_path, index=False)
+    _write_ted_parquet(df, output_path)
     log.info(f"✅ Guardado: {output_path} ({len(df):,} registros)")
     
     _print_ted_summary(df)
@@ -306,6 +363,142 @@ def download_ted_spain(
     return df
 
 
+def _write_ted_parquet(df, path):
+    """
+    Guarda un DataFrame TED en parquet con ZSTD y diccionario.
+    
+    Casi todas las columnas son texto de baja cardinalidad (notice_type,
+    cpv, currency, buyer_legal_type, source...): el diccionario se aplica a
+    todas y Arrow pasa a PLAIN en las que el diccionario crece demasiado.
+    """
+    if not HAS_PYARROW:
+        df.to_parquet(path, index=False)
+        return
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    pq.write_table(
+        table, path,
+        row_group_size=TEDConfig.PARQUET_ROW_GROUP_SIZE,
+        compression=TEDConfig.PARQUET_COMPRESSION,
+        compression_level=TEDConfig.PARQUET_COMPRESSION_LEVEL,
+        use_dictionary=True,
+        data_page_size=1 << 20,
+        write_statistics=True,
+    )
+
+
+# Columnas que usa `validate`: las de cross_validate_ted (claves, importe y
+# enriquecimiento) y las del CSV de missing; el resto no se decodifica
+_TED_CROSSVAL_COLS = (
+    'importe_ted', 'win_nif_clean', 'year', 'internal_id_proc', 'ted_notice_id',
+    'number_offers', 'cpv', 'win_size', 'direct_award_justification',
+    'sme_participation', 'buyer_legal_type', 'duration_lot', 'award_criterion_type',
+)
+_PIPELINE_CROSSVAL_COLS = (
+    '_nif', '_imp_adj', '_año', '_fecha_adj', '_expediente', '_es_menor',
+    '_es_emergencia', '_ofertas', '_organ', '_adj', '_cpv',
+)
+
+
+def _read_columns(path, columns):
+    """
+    Lee de un parquet/CSV solo las `columns` que existan en el fichero.
+    
+    En parquet la proyección se hace con el esquema del footer y pre_buffer
+    agrupa las lecturas de los column chunks elegidos en rangos contiguos;
+    to_pandas con split_blocks/self_destruct deja cada columna en su propio
+    bloque (sin consolidar) y libera la tabla Arrow según se convierte.
+    """
+    wanted = set(columns)
+    if not str(path).endswith('.parquet'):
+        return pd.read_csv(path, usecols=lambda c: c in wanted)
+    if not HAS_PYARROW:
+        df = pd.read_parquet(path)
+        return df[[c for c in df.columns if c in wanted]]
+    names = pq.read_schema(path).names
+    table = pq.read_table(path, columns=[c for c in columns if c in names],
+                          pre_buffer=True, use_pandas_metadata=True)
+    return table.to_pandas(split_blocks=True, self_destruct=True)
+
+
+def _read_ted_for_pipeline(path, df_pipeline):
+    """
+    Lee del parquet TED solo las filas que df_pipeline puede cruzar: importe
+    > 0 y NIF ganador o expediente presentes en el pipeline, con las mismas
+    normalizaciones que cross_validate_ted (str → strip → upper; nulos de
+    internal_id_proc como 'None').
+    
+    El filtro va al scan de pyarrow.dataset: las estadísticas de cada row
+    group descartan los que no pueden cumplirlo y el resto se filtra en Arrow
+    antes de pasar a pandas. Las filas que quedan fuera nunca podrían ser
+    candidatas, así que los matches no cambian.
+    """
+    if not HAS_PYARROW:
+        return _read_columns(path, _TED_CROSSVAL_COLS)
+    # Con memory map no hace falta pre_buffer: los rangos ya están mapeados
+    memory_map = TEDConfig.PARQUET_MEMORY_MAP
+    dataset = pds.dataset(
+        str(Path(path).resolve()),
+        format=pds.ParquetFileFormat(
+            default_fragment_scan_options=pds.ParquetFragmentScanOptions(pre_buffer=not memory_map)),
+        filesystem=pafs.LocalFileSystem(use_mmap=memory_map),
+    )
+    schema = dataset.schema
+    if 'importe_ted' not in schema.names:
+        return _read_columns(path, _TED_CROSSVAL_COLS)
+    
+    def _pipe_keys(col):
+        return pa.array(df_pipeline[col].astype(str).str.strip().str.upper().unique(),
+                        type=pa.string())
+    
+    # Una fila TED es candidata si casa por NIF ganador o por expediente; las
+    # estrategias sin columna en TED o en el pipeline no dan matches
+    can_match = []
+    for ted_col, pipe_col in (('win_nif_clean', '_nif'), ('internal_id_proc', '_expediente')):
+        if ted_col not in schema.names or pipe_col not in df_pipeline.columns:
+            continue
+        if not pa.types.is_string(schema.field(ted_col).type):
+            # str() de una clave no-string no se replica en Arrow: sin filtro
+            can_match = []
+            break
+        if ted_col == 'win_nif_clean':
+            can_match.append(pc.field(ted_col).isin(_pipe_keys(pipe_col)))
+        else:
+            exp = pc.field(ted_col)
+            exp_key = pc.utf8_upper(pc.utf8_trim(pc.coalesce(exp, pc.scalar('None')),
+                                                 characters=_PY_SPACE))
+            # Filas no ASCII: upper de Arrow y de Python pueden diferir, se conservan
+            can_match.append(exp_key.isin(_pipe_keys(pipe_col)) | ~pc.string_is_ascii(exp))
+    row_filter = pc.field('importe_ted') > 0
+    if can_match:
+        any_key = can_match[0]
+        for key_match in can_match[1:]:
+            any_key = any_key | key_match
+        row_filter = row_filter & any_key
+    
+    columns = [c for c in _TED_CROSSVAL_COLS if c in schema.names]
+    table = dataset.to_table(columns=columns, filter=row_filter)
+    log.info(f"  TED: {table.num_rows:,} registros cruzables con el pipeline")
+    return table.to_pandas(split_blocks=True, self_destruct=True)
+
+
+def _write_csv(df, path):
+    """
+    Escribe un DataFrame a CSV con el writer C++ de Arrow (~8× to_csv).
+    
+    Los timestamps se pasan a segundos para que salgan como
+    'YYYY-MM-DD HH:MM:SS' y no con nanosegundos.
+    """
+    if not HAS_PYARROW:
+        df.to_csv(path, index=False)
+        return
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    for i, field in enumerate(table.schema):
+        if pa.types.is_timestamp(field.type):
+            table = table.set_column(i, field.name, pc.cast(table[i], pa.timestamp('s', field.type.tz),
+                                                            safe=False))
+    pacsv.write_csv(table, path)
+
+
 def _download_csv_year(year, force=False):
     """Descarga CSV de CAN para un año y filtra por España."""
     cache_path = TEDConfig.DATA_DIR / f"ted_can_{year}_ES.parquet"
@@ -324,25 +517,16 @@ def _download_csv_year(year, force=False):
     for url in urls:
         try:
             log.info(f"  {year}: probando {url.split('/')[-1]}...")
-            chunks = []
-            for chunk in pd.read_csv(
-                url, 
-                encoding='utf-8',
-                low_memory=False,
-                chunksize=50_000,
-                dtype=str,
-                on_bad_lines='skip',
-            ):
-                if 'ISO_COUNTRY_CODE' not in chunk.columns:
-                    log.warning(f"  {year}: columna ISO_COUNTRY_CODE no encontrada")
-                    break
-                es_mask = chunk['ISO_COUNTRY_CODE'] == TEDConfig.COUNTRY_CODE
-                if es_mask.any():
-                    keep_cols = [c for c in TEDConfig.CSV_COLUMNS_KEEP if c in chunk.columns]
-                    chunks.append(chunk.loc[es_mask, keep_cols])
+            if HAS_PYARROW:
+                resp = requests.get(url, stream=True, timeout=60)
+                resp.raise_for_status()
+                resp.raw.decode_content = True
+                with resp:
+                    df = _read_csv_es(resp.raw, year)
+            else:
+                df = _read_csv_es_pandas(url, year)
             
-            if chunks:
-                df = pd.concat(chunks, ignore_index=True)
+            if df is not None:
                 log.info(f"  {year}: {len(df):,} registros España de CSV bulk")
             break
         except Exception as e:
@@ -352,15 +536,111 @@ def _download_csv_year(year, force=False):
     if df is None:
         log.warning(f"  {year}: no se pudo descargar CSV")
     elif len(df) > 0:
-        df.to_parquet(cache_path, index=False)
+        _write_ted_parquet(df, cache_path)
     
     return df
 
 
+def _read_csv_es(stream, year, block_size=8 << 20):
+    """
+    Lee en streaming un CSV bulk de CAN (objeto binario tipo fichero) y
+    devuelve solo las filas de España con las columnas CSV_COLUMNS_KEEP.
+    
+    pyarrow parsea por bloques en C++ y solo convierte las columnas pedidas;
+    el filtro ISO_COUNTRY_CODE se aplica a cada RecordBatch antes de pasar
+    a pandas. Devuelve None si no hay columna de país o filas de España.
+    
+    newlines_in_values: el chunker parte por saltos de línea y parsea todas
+    las columnas (no solo include_columns); sin él, un valor entrecomillado
+    con salto de línea que cruza un bloque desincroniza el parser.
+    """
+    # La cabecera se lee aparte: include_columns falla con columnas ausentes
+    header = stream.readline().decode('utf-8-sig')
+    columns = next(csv.reader([header]), [])
+    if 'ISO_COUNTRY_CODE' not in columns:
+        log.warning(f"  {year}: columna ISO_COUNTRY_CODE no encontrada")
+        return None
+    keep_cols = [c for c in TEDConfig.CSV_COLUMNS_KEEP if c in columns]
+    
+    reader = pacsv.open_csv(
+        pa.input_stream(stream),
+        read_options=pacsv.ReadOptions(column_names=columns, block_size=block_size),
+        parse_options=pacsv.ParseOptions(newlines_in_values=True,
+                                         invalid_row_handler=lambda row: 'skip'),
+        convert_options=pacsv.ConvertOptions(
+            include_columns=keep_cols,
+            column_types={c: pa.string() for c in keep_cols},
+            strings_can_be_null=True,
+        ),
+    )
+    batches = []
+    for batch in reader:
+        es = batch.filter(pc.equal(batch.column('ISO_COUNTRY_CODE'), TEDConfig.COUNTRY_CODE))
+        if es.num_rows:
+            batches.append(es)
+    
+    if not batches:
+        return None
+    return pa.Table.from_batches(batches, schema=reader.schema).to_pandas()
+
+
+def _read_csv_es_pandas(url, year):
+    """Versión pandas de _read_csv_es (sin pyarrow): read_csv por chunks."""
+    chunks = []
+    for chunk in pd.read_csv(
+        url, 
+        encoding='utf-8',
+        low_memory=False,
+        chunksize=50_000,
+        dtype=str,
+        on_bad_lines='skip',
+    ):
+        if 'ISO_COUNTRY_CODE' not in chunk.columns:
+            log.warning(f"  {year}: columna ISO_COUNTRY_CODE no encontrada")
+            break
+        es_mask = chunk['ISO_COUNTRY_CODE'] == TEDConfig.COUNTRY_CODE
+        if es_mask.any():
+            keep_cols = [c for c in TEDConfig.CSV_COLUMNS_KEEP if c in chunk.columns]
+            chunks.append(chunk.loc[es_mask, keep_cols])
+    
+    if not chunks:
+        return None
+    return pd.concat(chunks, ignore_index=True)
+
+
 # ═══════════════════════════════════════════════════════════════════════════
 #  TED SEARCH API v3 — eForms (2024+)
 # ═══════════════════════════════════════════════════════════════════════════
 
+class _RateLimiter:
+    """
+    Ritmo mínimo entre inicios de request, compartido entre hilos.
+    
+    Se espacia el inicio de cada POST (no se duerme tras la respuesta): la
+    latencia de una request queda dentro del intervalo y, con varios
+    periodos en paralelo, el ritmo global sigue siendo 1 request/intervalo.
+    """
+    
+    def __init__(self, interval):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._next = 0.0
+    
+    def wait(self):
+        """Bloquea hasta el siguiente hueco libre y lo reserva."""
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+    
+    def defer(self, seconds):
+        """Retrasa todas las requests pendientes (p. ej. tras un HTTP 429)."""
+        with self._lock:
+            self._next = max(self._next, time.monotonic() + seconds)
+
+
 def _download_api_year(year, force=False):
     """
     Descarga CAN de España para un año vía TED Search API v3.
@@ -379,12 +659,19 @@ def _download_api_year(year, force=False):
         (f"{year}0101", f"{year}1231", f"{year}"),
     ]
     
-    all_records = []
+    limiter = _RateLimiter(TEDConfig.TED_API_RATE_LIMIT)
+    all_columns = _new_api_columns()
+    # Claves (ted_notice_id, lot_index) ya añadidas: deduplica al acumular
+    # (trimestres y páginas pueden solapar), conservando la primera
+    seen = set()
+    dupes = 0
     needs_split = False
     
     for date_from, date_to, period_label in periods:
-        records, hit_limit = _download_api_period(year, date_from, date_to, period_label)
-        all_records.extend(records)
+        columns, hit_limit = _download_api_period(
+            year, date_from, date_to, period_label, limiter, force
+        )
+        dupes += _extend_api_columns(all_columns, columns, seen)
         
         if hit_limit:
             needs_split = True
@@ -393,44 +680,138 @@ def _download_api_year(year, force=False):
     # Si la query anual excede el límite, dividir en trimestres
     if needs_split:
         log.info(f"  {year}: límite paginación alcanzado, dividiendo en trimestres...")
-        all_records = []
+        all_columns = _new_api_columns()
+        seen = set()
+        dupes = 0
         quarters = [
             (f"{year}0101", f"{year}0331", f"{year}-Q1"),
             (f"{year}0401", f"{year}0630", f"{year}-Q2"),
             (f"{year}0701", f"{year}0930", f"{year}-Q3"),
             (f"{year}1001", f"{year}1231", f"{year}-Q4"),
         ]
-        for date_from, date_to, period_label in quarters:
-            records, _ = _download_api_period(year, date_from, date_to, period_label)
-            all_records.extend(records)
+        # Los trimestres van en paralelo con el limiter compartido; map
+        # conserva el orden Q1..Q4 para quedarse con la primera aparición
+        with ThreadPoolExecutor(max_workers=TEDConfig.TED_API_PERIOD_WORKERS) as ex:
+            results = ex.map(
+                lambda q: _download_api_period(year, *q, limiter=limiter, force=force), quarters
+            )
+            for columns, _ in results:
+                dupes += _extend_api_columns(all_columns, columns, seen)
     
-    if not all_records:
+    if not all_columns['ted_notice_id']:
         log.warning(f"  {year}: sin resultados de API")
         return None
     
-    df = pd.DataFrame(all_records)
+    if dupes > 0:
+        log.info(f"  {year}: eliminados {dupes:,} duplicados")
     
-    # Deduplicar por ted_notice_id + lot_index (trimestres pueden solapar)
-    if 'ted_notice_id' in df.columns:
-        before = len(df)
-        df = df.drop_duplicates(subset=['ted_notice_id', 'lot_index'], keep='first')
-        dupes = before - len(df)
-        if dupes > 0:
-            log.info(f"  {year}: eliminados {dupes:,} duplicados")
+    df = pd.DataFrame(all_columns)
     
     log.info(f"  {year}: {len(df):,} registros de API")
     
     if len(df) > 0:
-        df.to_parquet(cache_path, index=False)
+        _write_ted_parquet(df, cache_path)
     
     return df
 
 
-def _download_api_period(year, date_from, date_to, period_label):
+def _extend_api_columns(columns, other, seen=None):
+    """
+    Añade a `columns` los registros de `other` (mismos nombres de columna).
+    
+    Con `seen` (set de (ted_notice_id, lot_index)) se omiten los registros
+    ya vistos y se registran los nuevos. Devuelve cuántos se omitieron.
+    """
+    if seen is not None:
+        keep = []
+        for key in zip(other['ted_notice_id'], other['lot_index']):
+            keep.append(key not in seen)
+            seen.add(key)
+        n_dupes = len(keep) - sum(keep)
+        if n_dupes:
+            other = {col: list(compress(values, keep)) for col, values in other.items()}
+    else:
+        n_dupes = 0
+    for col, values in other.items():
+        columns[col].extend(values)
+    return n_dupes
+
+
+# orjson (si está) parsea las páginas de 1-5 MB varias veces más rápido
+_json_loads = orjson.loads if HAS_ORJSON else json.loads
+
+
+def _api_page_cache_file(body):
+    """Fichero de caché de una página de la API (hash del cuerpo de la request)."""
+    digest = hashlib.blake2b(body, digest_size=8).hexdigest()
+    return TEDConfig.API_PAGE_CACHE_DIR / f"{digest}.json.gz"
+
+
+def _api_period_closed(date_to):
+    """True si el periodo (date_to 'YYYYMMDD') ya terminó: sus páginas no cambian."""
+    return datetime.strptime(date_to, '%Y%m%d').date() < datetime.now().date()
+
+
+def _read_api_page_cache(path):
+    """Respuesta JSON cacheada, o None si el fichero no se puede leer (se borra)."""
+    try:
+        return _json_loads(gzip.decompress(path.read_bytes()))
+    except (OSError, EOFError, ValueError) as e:
+        log.debug(f"  Caché API inválida {path.name}: {e}")
+        path.unlink(missing_ok=True)
+        return None
+
+
+def _write_api_page_cache(path, content):
+    """Guarda el cuerpo de una respuesta (gzip); escritura atómica vía .tmp."""
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix('.tmp')
+        tmp.write_bytes(gzip.compress(content, compresslevel=6))
+        tmp.replace(path)
+    except OSError as e:
+        log.debug(f"  No se pudo cachear {path.name}: {e}")
+
+
+def _new_api_session():
+    """
+    Sesión HTTP para la TED Search API: conexiones keep-alive en pool y
+    reintentos con backoff en urllib3 para cortes de conexión y 502/503.
+    
+    429 y 400 no se reintentan aquí: el 429 pausa todas las descargas vía
+    _RateLimiter y el 400 indica límite de paginación (se gestionan en
+    _download_api_period).
+    """
+    session = requests.Session()
+    retry = Retry(
+        total=3,
+        backoff_factor=1,
+        status_forcelist=(502, 503),
+        allowed_methods=frozenset({"POST"}),
+        raise_on_status=False,
+    )
+    session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=2, max_retries=retry))
+    session.headers.update({
+        "Accept": "application/json",
+        "Content-Type": "application/json",
+    })
+    return session
+
+
+def _download_api_period(year, date_from, date_to, period_label, limiter=None, force=False):
     """
     Descarga un periodo específico de la API.
-    Returns: (records_list, hit_pagination_limit)
+    
+    limiter (_RateLimiter) marca el ritmo de las requests; se comparte
+    entre periodos que se descargan a la vez. La sesión HTTP reutiliza la
+    conexión (sin repetir DNS/TLS en cada página). Las páginas ya guardadas
+    en API_PAGE_CACHE_DIR se leen de disco salvo con force; un periodo aún
+    abierto (date_to hoy o después) ni lee ni escribe la caché.
+    Returns: (columns_dict, hit_pagination_limit)
     """
+    if limiter is None:
+        limiter = _RateLimiter(TEDConfig.TED_API_RATE_LIMIT)
+    
     query = (
         f"notice-type IN (can-standard, can-social, can-modif, can-desg) "
         f"AND buyer-country=ESP "
@@ -438,7 +819,7 @@ def _download_api_period(year, date_from, date_to, period_label):
         f"AND publication-date<={date_to}"
     )
     
-    records = []
+    columns = _new_api_columns()
     page = 1
     total_count = None
     total_pages = None
@@ -446,62 +827,69 @@ def _download_api_period(year, date_from, date_to, period_label):
     max_errors = 3
     hit_limit = False
     
+    session = _new_api_session()
+    use_cache = TEDConfig.API_PAGE_CACHE and _api_period_closed(date_to)
+    
+    # Cuerpo JSON serializado una vez por periodo: entre páginas solo
+    # cambia "page", que se inserta entre las dos mitades ya codificadas
+    body_head = (json.dumps({"query": query, "fields": TEDConfig.API_FIELDS})[:-1]
+                 + ', "page": ').encode()
+    body_tail = (', ' + json.dumps({
+        "limit": TEDConfig.TED_API_PAGE_SIZE,
+        "scope": "ALL",
+        "checkQuerySyntax": False,
+        "paginationMode": "PAGE_NUMBER",
+    })[1:]).encode()
+    
     while True:
         try:
-            body = {
-                "query": query,
-                "fields": TEDConfig.API_FIELDS,
-                "page": page,
-                "limit": TEDConfig.TED_API_PAGE_SIZE,
-                "scope": "ALL",
-                "checkQuerySyntax": False,
-                "paginationMode": "PAGE_NUMBER",
-            }
-            
-            log.debug(f"  POST {period_label} page={page}")
-            resp = requests.post(
-                TEDConfig.TED_API_SEARCH,
-                json=body,
-                timeout=60,
-                headers={
-                    "Accept": "application/json",
-                    "Content-Type": "application/json",
-                }
-            )
+            body = body_head + str(page).encode() + body_tail
             
-            if resp.status_code == 429:
-                log.warning(f"  Rate limited, esperando 15s...")
-                time.sleep(15)
-                continue
-            
-            if resp.status_code == 400:
-                # Probable límite de paginación
-                if page > 100:
-                    log.warning(f"  {period_label}: HTTP 400 en página {page} "
-                               f"(límite paginación, {len(records):,} registros obtenidos)")
-                    hit_limit = True
-                    break
-                consecutive_errors += 1
-                log.warning(f"  {period_label} page {page}: HTTP 400")
-                if consecutive_errors >= max_errors:
-                    hit_limit = (page > 50)  # Probable límite si pasamos de 50
-                    break
-                time.sleep(2)
-                continue
-            
-            if resp.status_code in (404, 405, 500, 502, 503):
-                consecutive_errors += 1
-                log.warning(f"  {period_label} page {page}: HTTP {resp.status_code}")
-                if consecutive_errors >= max_errors:
-                    break
-                time.sleep(2)
-                continue
+            cache_file = _api_page_cache_file(body) if use_cache else None
+            data = None
+            if cache_file is not None and not force and cache_file.exists():
+                data = _read_api_page_cache(cache_file)
             
-            resp.raise_for_status()
-            data = resp.json()
+            if data is None:
+                limiter.wait()
+                log.debug(f"  POST {period_label} page={page}")
+                resp = session.post(TEDConfig.TED_API_SEARCH, data=body, timeout=60)
+                
+                if resp.status_code == 429:
+                    log.warning(f"  Rate limited, esperando 15s...")
+                    limiter.defer(15)
+                    continue
+                
+                if resp.status_code == 400:
+                    # Probable límite de paginación
+                    if page > 100:
+                        log.warning(f"  {period_label}: HTTP 400 en página {page} "
+                                   f"(límite paginación, {len(columns['ted_notice_id']):,} registros obtenidos)")
+                        hit_limit = True
+                        break
+                    consecutive_errors += 1
+                    log.warning(f"  {period_label} page {page}: HTTP 400")
+                    if consecutive_errors >= max_errors:
+                        hit_limit = (page > 50)  # Probable límite si pasamos de 50
+                        break
+                    time.sleep(2)
+                    continue
+                
+                if resp.status_code in (404, 405, 500, 502, 503):
+                    consecutive_errors += 1
+                    log.warning(f"  {period_label} page {page}: HTTP {resp.status_code}")
+                    if consecutive_errors >= max_errors:
+                        break
+                    time.sleep(2)
+                    continue
+                
+                resp.raise_for_status()
+                data = _json_loads(resp.content)
+                if cache_file is not None:
+                    _write_api_page_cache(cache_file, resp.content)
             consecutive_errors = 0
             
-        except requests.exceptions.RequestException as e:
+        except (requests.exceptions.RequestException, ValueError) as e:
             consecutive_errors += 1
             log.warning(f"  {period_label} page {page}: {e}")
             if consecutive_errors >= max_errors:
@@ -527,9 +915,7 @@ def _download_api_period(year, date_from, date_to, period_label):
         if not notices:
             break
         
-        for notice in notices:
-            parsed = _parse_api_notice(notice)
-            records.extend(parsed)
+        _parse_api_page(notices, columns)
         
         # Paginación
         if total_pages is not None and page >= total_pages:
@@ -539,17 +925,58 @@ def _download_api_period(year, date_from, date_to, period_label):
             break
         
         page += 1
-        time.sleep(TEDConfig.TED_API_RATE_LIMIT)
         
         if page % 20 == 0:
-            log.info(f"    {period_label} pág {page}: {len(records):,} registros...")
+            log.info(f"    {period_label} pág {page}: {len(columns['ted_notice_id']):,} registros...")
     
-    return records, hit_limit
+    session.close()
+    return columns, hit_limit
+
+
+# Columnas de los registros de la API, en el orden en que se guardan
+API_RECORD_COLUMNS = [
+    "ted_notice_id", "year", "iso_country", "notice_type",
+    # Comprador
+    "cae_name", "cae_nationalid", "cae_town", "buyer_legal_type",
+    "buyer_contracting_entity", "buyer_profile",
+    # Ganador
+    "win_name", "win_nationalid", "win_country", "win_size",
+    # Importe
+    "value_euro", "currency", "total_value", "total_value_cur", "estimated_value_proc",
+    # Clasificación
+    "cpv",
+    # Ofertas
+    "number_offers",
+    # Fechas
+    "dt_award", "dt_dispatch",
+    # IDs / Linking
+    "procedure_id", "internal_id_proc", "internal_id_lot", "lot_id",
+    "modification_prev_notice",
+    # Procedimiento
+    "direct_award_justification", "direct_award_justification_text",
+    "non_award_justification", "sme_participation",
+    # Contrato
+    "duration_lot", "subcontracting_value",
+    # Criterios
+    "award_criterion_type", "award_criterion_weight",
+    # Framework
+    "framework_est_value", "framework_max_lot",
+    # Meta
+    "source", "lot_index",
+]
+
 
+def _new_api_columns():
+    """Dict columna -> lista vacía para acumular registros de la API."""
+    return {c: [] for c in API_RECORD_COLUMNS}
 
-def _parse_api_notice(notice):
+
+def _parse_api_page(notices, columns=None):
     """
-    Parsea un resultado de la TED Search API v3 (eForms) a lista de dicts.
+    Parsea una página de resultados de la TED Search API v3 (eForms) por
+    columnas: añade a `columns` (dict columna -> lista) un registro por
+    lot/award de cada notice. Devuelve el dict, que se pasa tal cual a
+    pd.DataFrame.
     
     La API devuelve listas para multi-lot notices:
       - winner-name: {'spa': ['EMPRESA A', 'EMPRESA B']}
@@ -557,200 +984,228 @@ def _parse_api_notice(notice):
       - tender-value: ['100000', '200000']
     
     Genera un registro por lot/winner. Para notices con un solo winner,
-    genera un único registro.
+    genera un único registro. Una notice que no se puede parsear se omite
+    entera (no deja columnas desalineadas).
+    """
+    if columns is None:
+        columns = _new_api_columns()
+    for notice in notices:
+        parsed = _parse_api_notice_columns(notice)
+        if parsed is not None:
+            _extend_api_columns(columns, parsed)
+    return columns
+
+
+# Tipos de notice sin adjudicación: un solo registro aunque haya varios lots
+_SINGLE_RECORD_TYPES = frozenset({"cn-standard", "cn-social", "pin-buyer", "pin-standard"})
+
+# Campos de un solo valor (primer elemento): (campo API, columna, default, intern)
+_API_SCALAR_FIELDS = (
+    ("buyer-country", "iso_country", "ES", True),
+    ("buyer-legal-type", "buyer_legal_type", "", True),
+    ("buyer-contracting-entity", "buyer_contracting_entity", "", False),
+    ("buyer-profile", "buyer_profile", "", False),
+    ("tender-value-cur", "currency", "EUR", True),
+    ("total-value", "total_value", "", False),
+    ("total-value-cur", "total_value_cur", "EUR", True),
+    ("estimated-value-proc", "estimated_value_proc", "", False),
+    ("procedure-identifier", "procedure_id", "", False),
+    ("internal-identifier-proc", "internal_id_proc", "", False),
+    ("modification-previous-notice-identifier", "modification_prev_notice", "", False),
+    ("direct-award-justification-proc", "direct_award_justification", "", False),
+    ("non-award-justification", "non_award_justification", "", False),
+    ("sme-part", "sme_participation", "", False),
+    ("subcontracting-value", "subcontracting_value", "", False),
+    ("framework-estimated-value", "framework_est_value", "", False),
+    ("framework-maximum-value-lot", "framework_max_lot", "", False),
+)
+
+# Campos por lot: (campo API, columna, índice de relleno si falta el del lot)
+_API_LOT_FIELDS = (
+    ("winner-identifier", "win_nationalid", -1),
+    ("winner-country", "win_country", None),
+    ("winner-size", "win_size", 0),
+    ("received-submissions-type-val", "number_offers", 0),
+    ("winner-decision-date", "dt_award", 0),
+    ("internal-identifier-lot", "internal_id_lot", None),
+    ("duration-period-value-lot", "duration_lot", None),
+    ("award-criterion-type-lot", "award_criterion_type", None),
+    ("award-criterion-number-weight-lot", "award_criterion_weight", None),
+)
+
+
+def _parse_api_notice_columns(notice):
+    """
+    Valores de una notice por columna (listas de n_records elementos), o
+    None si la notice no se puede parsear.
     
-    Returns:
-        Lista de dicts (uno por lot/award)
+    Los campos simples salen de _API_SCALAR_FIELDS / _API_LOT_FIELDS; aquí
+    solo quedan los que combinan varios campos o necesitan tratamiento propio.
     """
     try:
-        pub_number = notice.get("publication-number", "")
-        notice_type = notice.get("notice-type", "")
+        get = notice.get
+        pub_number = get("publication-number", "")
+        notice_type = _intern(get("notice-type", ""))
         
-        # ── Comprador ──
-        buyer_name = _extract_multilang_name(notice.get("buyer-name", {}))
+        # _first_of_list / _as_list en línea: se ejecutan ~25 veces por notice
+        scalars = {}
+        for key, col, default, interned in _API_SCALAR_FIELDS:
+            value = get(key)
+            if value.__class__ is list:
+                value = str(value[0]) if value else default
+            elif value is None or value == "":
+                value = default
+            else:
+                value = str(value)
+            scalars[col] = intern(value) if interned else value
+        lot_lists = {}
+        for key, col, _ in _API_LOT_FIELDS:
+            value = get(key)
+            if value.__class__ is not list:
+                value = _EMPTY if value is None or value == "" else [value]
+            lot_lists[col] = value
         
-        buyer_ids = _as_list(notice.get("buyer-identifier", []))
+        # ── Comprador ──
+        buyer_name = _extract_multilang_name(get("buyer-name", {}))
         # NIF español: 9 chars tipo A12345678 o P0400000F
-        buyer_nif = _find_spanish_nif(buyer_ids)
-        
-        buyer_country = _first_of_list(notice.get("buyer-country", []), "ES")
-        buyer_city = _extract_multilang_name(notice.get("buyer-city", {})) \
-            if isinstance(notice.get("buyer-city"), dict) else str(notice.get("buyer-city", ""))
+        buyer_nif = _find_spanish_nif(_as_list(get("buyer-identifier")))
+        buyer_city = _extract_multilang_name(get("buyer-city", {})) \
+            if isinstance(get("buyer-city"), dict) else str(get("buyer-city", ""))
         
         # ── CPV ──
-        cpv_raw = _as_list(notice.get("classification-cpv", []))
-        cpv = str(cpv_raw[0]) if cpv_raw else ""
+        cpv_raw = _as_list(get("classification-cpv"))
+        cpv = intern(str(cpv_raw[0])) if cpv_raw else ""
         
         # ── Ganadores ──
-        winner_names = _extract_multilang_list(notice.get("winner-name", {}))
-        winner_ids = _as_list(notice.get("winner-identifier", []))
-        winner_countries = _as_list(notice.get("winner-country", []))
-        winner_dates = _as_list(notice.get("winner-decision-date", []))
+        winner_names = _extract_multilang_list(get("winner-name", {}))
+        winner_ids = lot_lists["win_nationalid"]
         
         # ── Importes (prioridad: tender-value > result-value > estimated) ──
-        tender_values = _as_list(notice.get("tender-value", []))
-        result_values = _as_list(
-            notice.get("result-value-lot", notice.get("result-value-notice", []))
-        )
-        estimated_values = _as_list(notice.get("estimated-value-lot", []))
-        
-        tender_cur = _first_of_list(notice.get("tender-value-cur", []), "EUR")
-        
-        # ── Ofertas recibidas ──
-        offers_raw = _as_list(notice.get("received-submissions-type-val", []))
+        tender_values = _as_list(get("tender-value"))
+        result_values = _as_list(get("result-value-lot", get("result-value-notice", [])))
+        estimated_values = _as_list(get("estimated-value-lot"))
         
         # ── Año de publicación (del publication-number: XXXXXX-YYYY) ──
         pub_year = pub_number.split("-")[-1] if "-" in pub_number else ""
         
-        # ── Campos extra (scalar o primer valor) ──
-        procedure_id = _first_of_list(notice.get("procedure-identifier", []))
-        internal_id_proc = _first_of_list(notice.get("internal-identifier-proc", []))
-        internal_id_lot_list = _as_list(notice.get("internal-identifier-lot", []))
-        
-        total_value = _first_of_list(notice.get("total-value", []))
-        total_value_cur = _first_of_list(notice.get("total-value-cur", []), "EUR")
-        estimated_value_proc = _first_of_list(notice.get("estimated-value-proc", []))
-        
-        winner_sizes = _as_list(notice.get("winner-size", []))
-        
-        buyer_legal_type = _first_of_list(notice.get("buyer-legal-type", []))
-        buyer_contracting_entity = _first_of_list(notice.get("buyer-contracting-entity", []))
-        buyer_profile = _first_of_list(notice.get("buyer-profile", []))
-        
-        direct_award_just = _first_of_list(notice.get("direct-award-justification-proc", []))
-        direct_award_text = _extract_multilang_name(notice.get("direct-award-justification-text-proc", {}))
-        non_award_just = _first_of_list(notice.get("non-award-justification", []))
-        sme_part = _first_of_list(notice.get("sme-part", []))
-        
-        duration_lot_list = _as_list(notice.get("duration-period-value-lot", []))
-        subcontracting_value = _first_of_list(notice.get("subcontracting-value", []))
-        
-        award_criterion_type_list = _as_list(notice.get("award-criterion-type-lot", []))
-        award_criterion_weight_list = _as_list(notice.get("award-criterion-number-weight-lot", []))
+        direct_award_text = _extract_multilang_name(get("direct-award-justification-text-proc", {}))
         
-        modification_prev = _first_of_list(notice.get("modification-previous-notice-identifier", []))
-        
-        lot_ids = _as_list(notice.get("identifier-lot", []))
-        result_lot_ids = _as_list(notice.get("result-lot-identifier", []))
-        
-        framework_est_value = _first_of_list(notice.get("framework-estimated-value", []))
-        framework_max_lot = _first_of_list(notice.get("framework-maximum-value-lot", []))
+        lot_ids = _as_list(get("identifier-lot"))
+        result_lot_ids = _as_list(get("result-lot-identifier"))
         
         # ── Determinar número de registros ──
         # Para CAN multi-lot: un registro por winner/value
         # Para non-award notices: un solo registro
-        if notice_type in ("cn-standard", "cn-social", "pin-buyer", "pin-standard"):
+        # (la mayoría son de un solo lot: sin max() en ese caso)
+        n_ids, n_names, n_values = len(winner_ids), len(winner_names), len(tender_values)
+        if (n_ids <= 1 and n_names <= 1 and n_values <= 1) or notice_type in _SINGLE_RECORD_TYPES:
             n_records = 1
         else:
-            n_records = max(len(winner_ids), len(winner_names), len(tender_values), 1)
-        
-        records = []
-        for i in range(n_records):
-            value = _safe_index(tender_values, i) \
-                 or _safe_index(result_values, i) \
-                 or _safe_index(estimated_values, i) \
-                 or _safe_index(tender_values, 0) \
-                 or ""
-            
-            record = {
-                "ted_notice_id": pub_number,
-                "year": pub_year,
-                "iso_country": buyer_country,
-                "notice_type": notice_type,
-                # Comprador
-                "cae_name": buyer_name,
-                "cae_nationalid": buyer_nif,
-                "cae_town": buyer_city,
-                "buyer_legal_type": buyer_legal_type,
-                "buyer_contracting_entity": buyer_contracting_entity,
-                "buyer_profile": buyer_profile,
-                # Ganador
-                "win_name": _safe_index(winner_names, i) or _safe_index(winner_names, -1) or "",
-                "win_nationalid": _safe_index(winner_ids, i) or _safe_index(winner_ids, -1) or "",
-                "win_country": _safe_index(winner_countries, i) or "",
-                "win_size": _safe_index(winner_sizes, i) or _safe_index(winner_sizes, 0) or "",
-                # Importe
-                "value_euro": value,
-                "currency": tender_cur,
-                "total_value": total_value,
-                "total_value_cur": total_value_cur,
-                "estimated_value_proc": estimated_value_proc,
-                # Clasificación
-                "cpv": cpv,
-                # Ofertas
-                "number_offers": _safe_index(offers_raw, i) or _safe_index(offers_raw, 0) or "",
-                # Fechas
-                "dt_award": _safe_index(winner_dates, i) or _safe_index(winner_dates, 0) or "",
-                "dt_dispatch": "",
-                # IDs / Linking
-                "procedure_id": procedure_id,
-                "internal_id_proc": internal_id_proc,
-                "internal_id_lot": _safe_index(internal_id_lot_list, i) or "",
-                "lot_id": _safe_index(lot_ids, i) or _safe_index(result_lot_ids, i) or "",
-                "modification_prev_notice": modification_prev,
-                # Procedimiento
-                "direct_award_justification": direct_award_just,
-                "direct_award_justification_text": direct_award_text,
-                "non_award_justification": non_award_just,
-                "sme_participation": sme_part,
-                # Contrato
-                "duration_lot": _safe_index(duration_lot_list, i) or "",
-                "subcontracting_value": subcontracting_value,
-                # Criterios
-                "award_criterion_type": _safe_index(award_criterion_type_list, i) or "",
-                "award_criterion_weight": _safe_index(award_criterion_weight_list, i) or "",
-                # Framework
-                "framework_est_value": framework_est_value,
-                "framework_max_lot": framework_max_lot,
-                # Meta
-                "source": "api_v3",
-                "lot_index": i if n_records > 1 else 0,
-            }
-            records.append(record)
-        
-        return records
+            n_records = max(n_ids, n_names, n_values)
     
     except Exception as e:
         log.debug(f"  Error parsing notice: {e}")
-        return []
+        return None
+    
+    n = n_records
+    t0 = tender_values[0] if tender_values else None
+    
+    columns = {col: [value] * n for col, value in scalars.items()}
+    for _, col, fallback in _API_LOT_FIELDS:
+        columns[col] = _per_lot(lot_lists[col], n, fallback)
+    columns.update({
+        "ted_notice_id": [pub_number] * n,
+        "year": [pub_year] * n,
+        "notice_type": [notice_type] * n,
+        "cae_name": [buyer_name] * n,
+        "cae_nationalid": [buyer_nif] * n,
+        "cae_town": [buyer_city] * n,
+        "cpv": [cpv] * n,
+        "dt_dispatch": [""] * n,
+        "direct_award_justification_text": [direct_award_text] * n,
+        "source": ["api_v3"] * n,
+        "win_name": _per_lot(winner_names, n, -1),
+        "value_euro": [
+            tv or rv or ev or t0 or ""
+            for tv, rv, ev in _lot_rows(n, tender_values, result_values, estimated_values)
+        ],
+        "lot_id": [lid or rlid or "" for lid, rlid in _lot_rows(n, lot_ids, result_lot_ids)],
+        "lot_index": list(range(n)),
+    })
+    return columns
 
 
 # ── Helpers para parseo eForms ──
 
+# Valor vacío compartido de _as_list (tupla: nadie puede modificarlo)
+_EMPTY = ()
+
+
 def _as_list(val):
-    """Asegura que val sea una lista."""
-    if isinstance(val, list):
+    """
+    Asegura que val sea una secuencia: la lista tal cual, [val] para un
+    escalar y _EMPTY para None/"". La API solo devuelve list, dict, str o
+    None, así que basta comparar la clase exacta.
+    """
+    if val.__class__ is list:
         return val
     if val is None or val == "":
-        return []
+        return _EMPTY
     return [val]
 
 
+def _per_lot(values, n, fallback=None):
+    """
+    n valores por lot: values[i], o values[fallback] si falta o está vacío,
+    o "" si tampoco hay.
+    """
+    if not values:
+        return [""] * n
+    fill = (values[fallback] if fallback is not None else None) or ""
+    head = [v or fill for v in values[:n]]
+    if len(head) < n:
+        head.extend([fill] * (n - len(head)))
+    return head
+
+
+def _lot_rows(n, *lists):
+    """Tuplas por lot de varias listas paralelas (None donde falta), n filas."""
+    rows = zip_longest(*lists)
+    longest = max(map(len, lists))
+    if longest < n:
+        rows = chain(rows, repeat((None,) * len(lists), n - longest))
+    return islice(rows, n)
+
+
+def _intern(val):
+    """sys.intern para str; otros valores se devuelven tal cual."""
+    return intern(val) if val.__class__ is str else val
+
+
 def _first_of_list(val, default=""):
     """Primer elemento de lista o default."""
     lst = _as_list(val)
     return str(lst[0]) if lst else default
 
 
-def _safe_index(lst, i, default=None):
-    """Acceso seguro a lista por índice."""
-    if not lst:
-        return default
-    try:
-        return lst[i]
-    except (IndexError, TypeError):
-        return default
+# Prioridad de idiomas en los campos multiidioma de eForms
+_LANG_PRIORITY = ('spa', 'SPA', 'eng', 'ENG')
 
 
 def _extract_multilang_name(name_dict):
     """Extrae nombre de dict multiidioma {'spa': ['Nombre'], 'eng': ['Name']}."""
-    if not isinstance(name_dict, dict):
+    if name_dict.__class__ is not dict:
         return str(name_dict) if name_dict else ""
     
-    for lang in ('spa', 'SPA', 'eng', 'ENG'):
-        names = name_dict.get(lang, [])
+    # Caso habitual en notices ES: {'spa': [...]}
+    names = name_dict.get('spa')
+    if names:
+        return names[0] if names.__class__ is list else str(names)
+    
+    for lang in _LANG_PRIORITY:
+        names = name_dict.get(lang)
         if names:
-            return names[0] if isinstance(names, list) else str(names)
+            return names[0] if names.__class__ is list else str(names)
     
     # Fallback: primer valor disponible
     for names in name_dict.values():
@@ -761,15 +1216,19 @@ def _extract_multilang_name(name_dict):
 
 def _extract_multilang_list(name_dict):
     """Extrae lista de nombres de dict multiidioma."""
-    if not isinstance(name_dict, dict):
-        if isinstance(name_dict, list):
+    if name_dict.__class__ is not dict:
+        if name_dict.__class__ is list:
             return name_dict
         return [str(name_dict)] if name_dict else []
     
-    for lang in ('spa', 'SPA', 'eng', 'ENG'):
-        names = name_dict.get(lang, [])
+    names = name_dict.get('spa')
+    if names:
+        return names if names.__class__ is list else [str(names)]
+    
+    for lang in _LANG_PRIORITY:
+        names = name_dict.get(lang)
         if names:
-            return names if isinstance(names, list) else [str(names)]
+            return names if names.__class__ is list else [str(names)]
     
     for names in name_dict.values():
         if names:
@@ -799,6 +1258,145 @@ def _find_spanish_nif(id_list):
 #  NORMALIZACIÓN
 # ═══════════════════════════════════════════════════════════════════════════
 
+_LIST_DICT = frozenset((list, dict))
+
+# Columnas de la API v3 cuyo valor por lot sale tal cual del JSON (puede ser
+# una lista o un dict anidado). El resto de columnas API se convierten a str
+# en el parser, y las de CSV bulk/SPARQL son siempre texto
+_API_NESTED_COLS = frozenset(
+    [col for _, col, _ in _API_LOT_FIELDS] + ['win_name', 'value_euro', 'lot_id']
+)
+
+# Regex de normalización, compiladas una vez por proceso
+_RE_ES_PREFIX = re.compile(r'^ES[-\s]*')
+_RE_ES_PREFIX_NIF = re.compile(r'^ES[-\s]*(?=[A-Z0-9])')
+_RE_TZ_SUFFIX = re.compile(r'\+\d{2}:\d{2}$')
+_RE_YEAR_SUFFIX = re.compile(r'-(\d{4})$')
+# --years del CLI: rango 'AAAA-AAAA' (si no, lista separada por comas)
+_RE_YEAR_RANGE = re.compile(r'\s*(\d+)\s*-\s*(\d+)\s*')
+
+# Espacios de str.strip() / \s de re (Unicode), explícitos para Arrow: su
+# utf8_trim_whitespace y el \s de RE2 no cubren exactamente el mismo conjunto
+_PY_SPACE = ('\t\n\x0b\x0c\r\x1c\x1d\x1e\x1f \x85\xa0\u1680\u2000\u2001\u2002\u2003'
+             '\u2004\u2005\u2006\u2007\u2008\u2009\u200a\u2028\u2029\u202f\u205f\u3000')
+_RE2_ES_PREFIX = f'^ES[-{_PY_SPACE}]*'
+_RE2_ES_PREFIX_NIF = f'^ES[-{_PY_SPACE}]*([A-Z0-9])'
+
+
+def _clean_nif_py(s, before_nif=False):
+    """Versión pandas de _clean_nif_column."""
+    s = s.fillna('').astype(str).str.strip().str.upper()
+    return s.str.replace(_RE_ES_PREFIX_NIF if before_nif else _RE_ES_PREFIX, '', regex=True)
+
+
+def _clean_nif_column(s, before_nif=False):
+    """
+    NIF limpio: fillna('') → str → strip → upper → sin prefijo país (ES,
+    ES-, 'ES '). Con before_nif el prefijo solo se quita si va seguido de
+    un carácter de NIF [A-Z0-9].
+    
+    Con pyarrow la cadena entera es un solo pipeline Arrow (trim, upper y
+    regex RE2; sin lookahead: se captura ese carácter y se reinserta). Las
+    filas no ASCII se rehacen en Python (str.upper puede expandir, p. ej.
+    ß → SS) y si la columna trae valores no-str se usa la versión pandas.
+    """
+    if not HAS_PYARROW:
+        return _clean_nif_py(s, before_nif)
+    try:
+        arr = pa.array(s.to_numpy(), type=pa.string(), from_pandas=True)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        return _clean_nif_py(s, before_nif)
+    arr = pc.fill_null(arr, '')
+    out = pc.utf8_upper(pc.utf8_trim(arr, characters=_PY_SPACE))
+    if before_nif:
+        out = pc.replace_substring_regex(out, _RE2_ES_PREFIX_NIF, r'\1')
+    else:
+        out = pc.replace_substring_regex(out, _RE2_ES_PREFIX, '')
+    out = pd.Series(out.to_numpy(zero_copy_only=False), index=s.index, dtype=object)
+    non_ascii = ~pc.string_is_ascii(arr).to_numpy(zero_copy_only=False)
+    if non_ascii.any():
+        out[non_ascii] = _clean_nif_py(s[non_ascii], before_nif)
+    return out
+
+
+def _flatten_ted_value(x):
+    """Primer valor de una lista o de un dict multilang de la API v3."""
+    if isinstance(x, list):
+        return x[0] if len(x) > 0 else None
+    if isinstance(x, dict):
+        # Multilang dict: {'spa': ['val']}
+        for v in x.values():
+            if isinstance(v, list) and v:
+                return v[0]
+            if v:
+                return v
+        return str(x)
+    return x
+
+
+# Recuentos y años: se reducen solo si el cast no pierde nada (los importes
+# se quedan en float64: float32 no conserva céntimos por encima de ~130K€)
+_TED_COUNT_COLS = ['year', 'number_offers', 'number_awards', 'lots_number', 'duration_lot']
+
+
+def _ted_numeric_casts(df):
+    """Downcasts sin pérdida de recuentos/años TED: {columna: dtype numpy}.
+    
+    Enteros a int16/int32 si caben; floats (recuentos con NaN) a float32 solo
+    si todos sus valores son enteros exactos en float32.
+    """
+    casts = {}
+    for col in _TED_COUNT_COLS:
+        if col not in df.columns:
+            continue
+        dtype = df[col].dtype
+        if dtype.kind in 'iu' and dtype.itemsize > 2:
+            v = df[col].to_numpy()
+            for small in (np.int16, np.int32):
+                info = np.iinfo(small)
+                if np.dtype(small).itemsize < dtype.itemsize and (
+                        len(v) == 0 or (v.min() >= info.min and v.max() <= info.max)):
+                    casts[col] = small
+                    break
+        elif dtype == np.float64:
+            v = df[col].to_numpy()
+            ok = v[~np.isnan(v)]
+            if np.array_equal(ok, np.round(ok)) and (len(ok) == 0 or np.abs(ok).max() < 2 ** 24):
+                casts[col] = np.float32
+    return casts
+
+
+_NIF_PLACEHOLDERS = frozenset({'', 'NONE', 'NAN', 'N/A'})
+
+
+def _clean_win_nif(s):
+    """NIF del ganador limpio y sin prefijo país; vacíos y placeholders -> ''."""
+    s = _clean_nif_column(s, before_nif=True)
+    # Quitar strings vacías, "NONE", "NAN", etc. y los demasiado cortos (una pasada)
+    bad = s.isin(_NIF_PLACEHOLDERS) | (s.str.len() < 5)
+    return s.where(~bad, '')
+
+
+def _parse_ted_dates(s):
+    """
+    Fechas TED (con o sin sufijo de zona horaria) a datetime; inválidas -> NaT.
+    
+    Casi todas son ISO 8601 (YYYY-MM-DD[THH:MM:SS]): primero el parser ISO en
+    C y solo lo que falle pasa por format='mixed' (~3× en ISO, y el mixed es
+    el que resuelve el resto, p. ej. dd/mm/yy del CSV antiguo).
+    """
+    if s.dtype == object:
+        s = s.astype(str).str.replace(_RE_TZ_SUFFIX, '', regex=True)
+    out = pd.to_datetime(s, errors='coerce', format='ISO8601')
+    if isinstance(out.dtype, pd.DatetimeTZDtype):
+        # Offsets que no quita _RE_TZ_SUFFIX (p. ej. 'Z'): columna entera como antes
+        return pd.to_datetime(s, errors='coerce', format='mixed')
+    retry = (out.isna() & s.notna()).to_numpy()
+    if retry.any():
+        out[retry] = pd.to_datetime(s[retry], errors='coerce', format='mixed')
+    return out
+
+
 def _normalize_ted_data(df):
     """Normaliza campos del DataFrame TED a formato uniforme."""
     
@@ -836,11 +1434,13 @@ def _normalize_ted_data(df):
     df = df.rename(columns=rename_map)
     
     # ── Aplanar columnas que puedan contener listas (API v3 devuelve listas) ──
-    # Primero deduplicar columnas (CSV + API pueden crear duplicados)
-    df = df.loc[:, ~df.columns.duplicated()]
+    # Primero deduplicar columnas (CSV + API pueden crear duplicados); el
+    # .loc copia el frame entero, así que solo si de verdad hay duplicadas
+    if df.columns.has_duplicates:
+        df = df.loc[:, ~df.columns.duplicated()]
     
-    # Con 500K+ filas, solo checar columnas object
-    for col in df.columns:
+    # Con 500K+ filas, solo checar columnas object que pueden traer listas
+    for col in [c for c in df.columns if c in _API_NESTED_COLS]:
         if df[col].dtype != object:
             continue
         # Check a larger sample for lists/dicts
@@ -857,19 +1457,11 @@ def _normalize_ted_data(df):
                 break
         
         if has_complex:
-            def _flatten(x):
-                if isinstance(x, list):
-                    return x[0] if len(x) > 0 else None
-                if isinstance(x, dict):
-                    # Multilang dict: {'spa': ['val']}
-                    for v in x.values():
-                        if isinstance(v, list) and v:
-                            return v[0]
-                        if v:
-                            return v
-                    return str(x)
-                return x
-            df[col] = df[col].apply(_flatten)
+            # Solo las listas/dicts pasan por _flatten_ted_value; el resto se copia tal cual
+            df[col] = pd.Series([
+                _flatten_ted_value(x) if x.__class__ in _LIST_DICT else x
+                for x in df[col].to_numpy()
+            ], index=df.index, dtype=object).infer_objects()
     
     # ── Tipos numéricos ──
     numeric_cols = [
@@ -879,12 +1471,15 @@ def _normalize_ted_data(df):
     ]
     for col in numeric_cols:
         if col in df.columns:
+            # Columnas ya numéricas (int/float de NumPy): nada que limpiar
+            if df[col].dtype.kind in 'iuf':
+                continue
             # Force to string first, clean, then convert
-            df[col] = df[col].apply(lambda x: 
+            df[col] = pd.to_numeric(pd.Series([
                 str(x[0]) if isinstance(x, list) and x else
                 (str(x) if x is not None and not isinstance(x, float) else x)
-            )
-            df[col] = pd.to_numeric(df[col], errors='coerce')
+                for x in df[col].to_numpy()
+            ], index=df.index, dtype=object), errors='coerce')
     
     # ── Mejor estimación del importe ──
     # Prioridad: award_value > value_euro (tender-value) > total_value > estimated
@@ -905,33 +1500,35 @@ def _normalize_ted_data(df):
         mask = df['importe_ted'].isna() & df['estimated_value_proc'].notna()
         df.loc[mask, 'importe_ted'] = df.loc[mask, 'estimated_value_proc']
     
-    # ── Limpiar NIF del ganador ──
-    nif_col = 'win_nationalid' if 'win_nationalid' in df.columns else None
-    if nif_col:
-        df['win_nif_clean'] = df[nif_col].fillna('').astype(str).str.strip().str.upper()
-        # Quitar prefijo país (ES, ES-, ESA, etc.) solo si va seguido del NIF
-        df['win_nif_clean'] = df['win_nif_clean'].str.replace(r'^ES[-\s]*(?=[A-Z0-9])', '', regex=True)
-        # Quitar strings vacías, "NONE", "NAN", etc.
-        df.loc[df['win_nif_clean'].isin(['', 'NONE', 'NAN', 'N/A']), 'win_nif_clean'] = ''
-        df.loc[df['win_nif_clean'].str.len() < 5, 'win_nif_clean'] = ''
+    # ── Limpiezas por columna: NIF ganador, NIF órgano y fechas ──
+    # Cada tarea lee una columna origen distinta y devuelve una Series nueva
+    # sin tocar df; se asignan al terminar todas. Con ese invariante pueden ir
+    # en hilos (pyarrow.compute suelta el GIL en la limpieza de NIFs)
+    jobs = {}
+    if 'win_nationalid' in df.columns:
+        jobs['win_nif_clean'] = (_clean_win_nif, df['win_nationalid'])
+    if 'cae_nationalid' in df.columns:
+        jobs['cae_nif_clean'] = (_clean_nif_column, df['cae_nationalid'])
+    for col in ['dt_dispatch', 'dt_award']:
+        if col in df.columns:
+            jobs[col] = (_parse_ted_dates, df[col])
+    
+    workers = min(TEDConfig.NORMALIZE_WORKERS, len(jobs))
+    if workers > 1:
+        with ThreadPoolExecutor(max_workers=workers) as ex:
+            futures = {col: ex.submit(fn, src) for col, (fn, src) in jobs.items()}
+            results = {col: fut.result() for col, fut in futures.items()}
     else:
+        results = {col: fn(src) for col, (fn, src) in jobs.items()}
+    for col, values in results.items():
+        df[col] = values
+    
+    if 'win_nif_clean' not in results:
         df['win_nif_clean'] = ''
     
     n_nif = (df['win_nif_clean'] != '').sum()
     log.info(f"  NIFs ganador limpios: {n_nif:,} ({n_nif/len(df)*100:.1f}%)")
     
-    # ── Limpiar NIF del órgano ──
-    if 'cae_nationalid' in df.columns:
-        df['cae_nif_clean'] = df['cae_nationalid'].fillna('').astype(str).str.strip().str.upper()
-        df['cae_nif_clean'] = df['cae_nif_clean'].str.replace(r'^ES[-\s]*', '', regex=True)
-    
-    # ── Fechas ──
-    for col in ['dt_dispatch', 'dt_award']:
-        if col in df.columns:
-            if df[col].dtype == object:
-                df[col] = df[col].astype(str).str.replace(r'\+\d{2}:\d{2}$', '', regex=True)
-            df[col] = pd.to_datetime(df[col], errors='coerce', format='mixed')
-    
     # ── Año ──
     if 'year' in df.columns:
         df['year'] = pd.to_numeric(df['year'], errors='coerce')
@@ -946,7 +1543,7 @@ def _normalize_ted_data(df):
     if 'year' in df.columns and 'ted_notice_id' in df.columns:
         mask = df['year'].isna()
         if mask.any():
-            extracted = df.loc[mask, 'ted_notice_id'].astype(str).str.extract(r'-(\d{4})$')
+            extracted = df.loc[mask, 'ted_notice_id'].astype(str).str.extract(_RE_YEAR_SUFFIX)
             if len(extracted.columns) > 0:
                 df.loc[mask, 'year'] = pd.to_numeric(extracted[0], errors='coerce')
     
@@ -958,14 +1555,23 @@ def _normalize_ted_data(df):
             log.info(f"  Eliminados {n_cancelled:,} notices cancelados")
     
     # ── CPV limpio (primeros 2 dígitos) ──
+    # Se recorta sobre los CPV distintos y se difunde por código (nulos -> '');
+    # sale como categórica: ~50 divisiones CPV, códigos int8 en vez de objetos
     if 'cpv' in df.columns:
-        df['cpv_2'] = df['cpv'].fillna('').astype(str).str[:2]
+        codes, uniques = pd.factorize(df['cpv'])
+        cpv_2 = pd.Series(uniques, dtype=object).astype(str).str[:2].to_numpy(dtype=object)
+        div_codes, divisions = pd.factorize(np.append(cpv_2, ''))
+        df['cpv_2'] = pd.Categorical.from_codes(div_codes[codes], categories=divisions)
     
     # ── Tipo contrato legible ──
     type_map = {'W': 'obras', 'U': 'suministros', 'S': 'servicios'}
     if 'type_of_contract' in df.columns:
         df['tipo_contrato'] = df['type_of_contract'].map(type_map).fillna('otros')
     
+    casts = _ted_numeric_casts(df)
+    if casts:
+        df = df.astype(casts)
+    
     log.info(f"  Datos TED normalizados: {len(df):,} registros")
     
     return df
@@ -1142,6 +1748,58 @@ def download_ted_spain_sparql(years=None):
 #  PARTE 2: CROSS-VALIDATION TED ↔ PIPELINE
 # ═══════════════════════════════════════════════════════════════════════════
 
+def _key_range_pairs(keys, vals, q_keys, q_lo, q_hi):
+    """Pares (consulta, entrada) con la misma clave y valor en [q_lo, q_hi].
+    
+    Ordena las entradas por (clave, valor) y localiza el rango de cada consulta
+    con searchsorted sobre claves compuestas enteras clave * m + rango del valor
+    (exactas, sin redondeo), sin generar el producto completo de cada clave.
+    Claves de consulta < 0 = sin clave. Devuelve (posición consulta, posición
+    entrada) como arrays int64.
+    """
+    order = np.lexsort((vals, keys))
+    keys, vals = keys[order], vals[order]
+    all_vals = np.sort(vals)
+    m = len(vals) + 1
+    left = keys * m + np.searchsorted(all_vals, vals, side='left')
+    right = keys * m + np.searchsorted(all_vals, vals, side='right')
+    start = np.searchsorted(left, q_keys * m + np.searchsorted(all_vals, q_lo, side='left'), side='left')
+    end = np.searchsorted(right, q_keys * m + np.searchsorted(all_vals, q_hi, side='right'), side='right')
+    counts = np.where(q_keys >= 0, np.maximum(end - start, 0), 0)
+    qpos = np.repeat(np.arange(len(q_keys)), counts)
+    # Posición dentro del orden: inicio del rango + desplazamiento en el bloque
+    first = np.repeat(start - (np.cumsum(counts) - counts), counts)
+    return qpos, order[first + np.arange(len(qpos))]
+
+
+def _resolve_ted_matches(rows, e1_ptr, e1_tpos, e2_ptr, e2_tpos, consumed):
+    """Greedy sobre pares candidatos en formato CSR (ya ordenados por diff).
+    
+    Recorre las filas del pipeline en orden y toma el primer TED libre de sus
+    pares NIF+año; si no hay, el primero libre de sus pares por expediente.
+    Marca el TED como consumido. Devuelve la posición TED por fila o -1.
+    """
+    best = np.full(len(rows), -1, dtype=np.int64)
+    for k in range(len(rows)):
+        p = rows[k]
+        for j in range(e1_ptr[p], e1_ptr[p + 1]):
+            if not consumed[e1_tpos[j]]:
+                best[k] = e1_tpos[j]
+                break
+        if best[k] < 0:
+            for j in range(e2_ptr[p], e2_ptr[p + 1]):
+                if not consumed[e2_tpos[j]]:
+                    best[k] = e2_tpos[j]
+                    break
+        if best[k] >= 0:
+            consumed[best[k]] = True
+    return best
+
+
+if HAS_NUMBA:
+    _resolve_ted_matches = njit(cache=True)(_resolve_ted_matches)
+
+
 def cross_validate_ted(df_pipeline, df_ted, src, R=None):
     """
     Cruza datos del pipeline (PLACSP/PSCP) contra TED para:
@@ -1179,43 +1837,44 @@ def cross_validate_ted(df_pipeline, df_ted, src, R=None):
         (df_ted['importe_ted'] > 0)
     ].copy()
     
-    # Construir índice primario: (nif_limpio, año) → lista de importes
-    ted_lookup = defaultdict(list)
-    # Índice secundario: internal_id_proc (nº expediente) → lista
-    ted_lookup_exp = defaultdict(list)
-    
-    for _, row in ted_valid.iterrows():
-        nif = row.get('win_nif_clean', '')
-        imp = row['importe_ted']
-        yr = row.get('year', np.nan)
-        
-        entry = {
-            'importe': imp,
-            'ted_id': row.get('ted_notice_id', ''),
-            'n_ofertas': row.get('number_offers', np.nan),
-            'cpv_ted': row.get('cpv', ''),
-            'cae_ted': row.get('cae_name', ''),
-            'win_size': row.get('win_size', ''),
-            'direct_award': row.get('direct_award_justification', ''),
-            'sme_part': row.get('sme_participation', ''),
-            'buyer_legal_type': row.get('buyer_legal_type', ''),
-            'duration_lot': row.get('duration_lot', np.nan),
-            'award_criterion_type': row.get('award_criterion_type', ''),
-            'internal_id': row.get('internal_id_proc', ''),
-            'consumed': False,
-        }
-        
-        if nif and len(nif) >= 5 and pd.notna(yr):
-            yr = int(yr)
-            ted_lookup[(nif, yr)].append(entry)
-        
-        # Índice por nº expediente (matching directo sin NIF+importe)
-        exp_id = str(row.get('internal_id_proc', '')).strip()
-        if exp_id and len(exp_id) >= 4:
-            ted_lookup_exp[exp_id.upper()].append(entry)
-    
-    _log(f"  TED lookup: {len(ted_lookup):,} claves (nif, año)")
-    _log(f"  TED lookup expediente: {len(ted_lookup_exp):,} claves")
+    n_ted = len(ted_valid)
+    ted_importe = ted_valid['importe_ted'].to_numpy(dtype=float)
+    ted_consumed = np.zeros(n_ted, dtype=bool)
+    
+    def _ted_str(col):
+        if col in ted_valid.columns:
+            return ted_valid[col]
+        return pd.Series('', index=ted_valid.index, dtype=object)
+    
+    # Claves primarias: (nif_limpio, año) → posiciones en ted_valid
+    ted_nif = _ted_str('win_nif_clean')
+    ted_yr = pd.to_numeric(ted_valid['year'], errors='coerce') if 'year' in ted_valid.columns \
+        else pd.Series(np.nan, index=ted_valid.index)
+    e1_ok = (ted_nif.map(lambda x: isinstance(x, str)) & (ted_nif.str.len() >= 5)
+             & ted_yr.notna()).to_numpy(dtype=bool)
+    ted_e1 = pd.DataFrame({
+        '_nif': ted_nif.to_numpy()[e1_ok],
+        '_yr': ted_yr.to_numpy()[e1_ok].astype(np.int64),
+        '_tpos': np.flatnonzero(e1_ok),
+    })
+    # Claves secundarias: internal_id_proc (nº expediente) → posiciones
+    ted_exp = _ted_str('internal_id_proc').astype(str).str.strip()
+    e2_ok = (ted_exp.str.len() >= 4).to_numpy()
+    ted_e2 = pd.DataFrame({
+        '_exp': ted_exp.str.upper().to_numpy()[e2_ok],
+        '_tpos': np.flatnonzero(e2_ok),
+    })
+    
+    # Claves enteras: (nif, año) = código NIF * n_años + (año - año_min) y
+    # expediente = su código; el pipeline se codifica contra los mismos únicos
+    nif_codes, nif_uniques = pd.factorize(ted_e1['_nif'])
+    yr_min = int(ted_e1['_yr'].min()) if len(ted_e1) else 0
+    n_years = int(ted_e1['_yr'].max()) - yr_min + 1 if len(ted_e1) else 1
+    ted_key = nif_codes.astype(np.int64) * n_years + (ted_e1['_yr'].to_numpy() - yr_min)
+    exp_codes, exp_uniques = pd.factorize(ted_e2['_exp'])
+    
+    _log(f"  TED lookup: {len(np.unique(ted_key)):,} claves (nif, año)")
+    _log(f"  TED lookup expediente: {len(exp_uniques):,} claves")
     _log(f"  TED registros con importe: {len(ted_valid):,}")
     
     # ── 2. Match pipeline → TED ──
@@ -1225,118 +1884,114 @@ def cross_validate_ted(df_pipeline, df_ted, src, R=None):
         (df_pipeline['_imp_adj'] > 0)
     ]
     
-    matched_idx = []
-    match_data = {}
-    
-    for idx, row in pipeline_valid.iterrows():
-        nif = str(row['_nif']).strip().upper()
-        imp = row['_imp_adj']
-        yr = row.get('_año', np.nan)
-        
-        if pd.isna(yr):
-            fecha = row.get('_fecha_adj', pd.NaT)
-            if pd.notna(fecha):
-                yr = fecha.year
-            else:
-                continue
-        
-        yr = int(yr)
-        tol = max(imp * TEDConfig.MATCH_TOLERANCE_PCT, TEDConfig.MATCH_TOLERANCE_ABS)
-        
-        best_match = None
-        best_diff = float('inf')
-        best_key = None
-        best_match_idx = None
-        best_lookup = None  # Track which lookup dict
-        
-        # ── Estrategia 1: Match por NIF + importe + año ──
-        for yr_offset in range(TEDConfig.MATCH_YEAR_WINDOW + 1):
-            for yr_try in [yr + yr_offset, yr - yr_offset] if yr_offset > 0 else [yr]:
-                key = (nif, yr_try)
-                entries = ted_lookup.get(key, [])
-                
-                for i, entry in enumerate(entries):
-                    if entry['consumed']:
-                        continue
-                    diff = abs(entry['importe'] - imp)
-                    if diff <= tol and diff < best_diff:
-                        best_match = entry
-                        best_diff = diff
-                        best_key = key
-                        best_match_idx = i
-                        best_lookup = ted_lookup
-        
-        # ── Estrategia 2: Match por nº expediente (si disponible) ──
-        if best_match is None and '_expediente' in row.index:
-            exp_id = str(row.get('_expediente', '')).strip().upper()
-            if exp_id and len(exp_id) >= 4:
-                entries = ted_lookup_exp.get(exp_id, [])
-                for i, entry in enumerate(entries):
-                    if entry['consumed']:
-                        continue
-                    diff = abs(entry['importe'] - imp)
-                    if diff <= tol and diff < best_diff:
-                        best_match = entry
-                        best_diff = diff
-                        best_key = exp_id
-                        best_match_idx = i
-                        best_lookup = ted_lookup_exp
-        
-        if best_match is not None:
-            best_lookup[best_key][best_match_idx]['consumed'] = True
-            matched_idx.append(idx)
-            match_data[idx] = {
-                'ted_id': best_match['ted_id'],
-                'ted_importe': best_match['importe'],
-                'ted_n_ofertas': best_match['n_ofertas'],
-                'ted_cpv': best_match['cpv_ted'],
-                'ted_cae': best_match['cae_ted'],
-                'match_diff_euros': best_diff,
-                # Campos nuevos v6.0
-                'ted_win_size': best_match.get('win_size', ''),
-                'ted_direct_award': best_match.get('direct_award', ''),
-                'ted_sme_part': best_match.get('sme_part', ''),
-                'ted_buyer_legal_type': best_match.get('buyer_legal_type', ''),
-                'ted_duration': best_match.get('duration_lot', np.nan),
-                'ted_award_criterion': best_match.get('award_criterion_type', ''),
-                'ted_internal_id': best_match.get('internal_id', ''),
-            }
+    n_pipe = len(pipeline_valid)
+    pipe_imp = pipeline_valid['_imp_adj'].to_numpy(dtype=float)
+    pipe_tol = np.maximum(pipe_imp * TEDConfig.MATCH_TOLERANCE_PCT, TEDConfig.MATCH_TOLERANCE_ABS)
+    pipe_yr = pd.Series(np.nan, index=pipeline_valid.index)
+    if '_año' in pipeline_valid.columns:
+        pipe_yr = pd.to_numeric(pipeline_valid['_año'], errors='coerce').astype(float)
+    if '_fecha_adj' in pipeline_valid.columns:
+        pipe_yr = pipe_yr.fillna(pd.to_datetime(pipeline_valid['_fecha_adj'], errors='coerce').dt.year)
+    yr_ok = pipe_yr.notna().to_numpy()
+    e1_spos_all = np.flatnonzero(yr_ok)
+    e1_yr = pipe_yr.to_numpy()[yr_ok].astype(np.int64)
+    
+    # Las filas del pipeline con NIF o año fuera de TED quedan sin clave (-1)
+    e1_code = pd.Index(nif_uniques).get_indexer(
+        pipeline_valid['_nif'].astype(str).str.strip().str.upper().to_numpy()[yr_ok])
+    # Ventana de importe con holgura; el filtro exacto diff <= tol va después
+    slack = pipe_tol * (1 + 1e-9) + 1e-9
+    
+    # Pares candidatos por clave + rango de importe. Cada par lleva el orden en
+    # que el recorrido por años los visitaría (yr, yr+1, yr-1, ...); dentro de
+    # una clave manda el orden de ted_valid (_tpos)
+    year_offsets = [0]
+    for off in range(1, TEDConfig.MATCH_YEAR_WINDOW + 1):
+        year_offsets += [off, -off]
+    # Todas las consultas de la ventana de años en una sola búsqueda (TED se
+    # ordena una vez): consulta q = rank * n_q + fila
+    n_q = len(e1_spos_all)
+    yr_off = (e1_yr[None, :] + np.array(year_offsets)[:, None] - yr_min).ravel()
+    code = np.tile(e1_code.astype(np.int64), len(year_offsets))
+    q_key = np.where((code >= 0) & (yr_off >= 0) & (yr_off < n_years), code * n_years + yr_off, -1)
+    q_imp = np.tile(pipe_imp[e1_spos_all], len(year_offsets))
+    q_slack = np.tile(slack[e1_spos_all], len(year_offsets))
+    qpos, tpos = _key_range_pairs(
+        ted_key, ted_importe[ted_e1['_tpos'].to_numpy()], q_key, q_imp - q_slack, q_imp + q_slack,
+    )
+    e1_pairs = [e1_spos_all[qpos % max(n_q, 1)], ted_e1['_tpos'].to_numpy()[tpos], qpos // max(n_q, 1)]
+    if '_expediente' in pipeline_valid.columns:
+        pipe_exp = pipeline_valid['_expediente'].astype(str).str.strip().str.upper()
+        exp_ok = (pipe_exp.str.len() >= 4).to_numpy() & yr_ok
+        pipe_code = pd.Index(exp_uniques).get_indexer(pipe_exp.to_numpy()[exp_ok])
+        known = pipe_code >= 0
+        pipe_e2 = pd.DataFrame({'_code': pipe_code[known], '_spos': np.flatnonzero(exp_ok)[known]})
+        e2 = pipe_e2.merge(pd.DataFrame({'_code': exp_codes, '_tpos': ted_e2['_tpos'].to_numpy()}), on='_code')
+        e2_pairs = [e2['_spos'].to_numpy(dtype=np.int64), e2['_tpos'].to_numpy(dtype=np.int64),
+                    np.zeros(len(e2), dtype=np.int64)]
+    else:
+        e2_pairs = [np.empty(0, dtype=np.int64)] * 3
+    
+    def _sorted_pairs(spos, tpos, rank):
+        diff = np.abs(ted_importe[tpos] - pipe_imp[spos])
+        keep = diff <= pipe_tol[spos]
+        spos, tpos, rank, diff = spos[keep], tpos[keep], rank[keep], diff[keep]
+        # Orden (fila, diff, año visitado, orden TED): el primer par libre de
+        # cada fila es el mejor match del recorrido secuencial
+        order = np.lexsort((tpos, rank, diff, spos))
+        spos, tpos = spos[order], tpos[order]
+        # Punteros CSR: pares de la fila p en [ptr[p], ptr[p+1])
+        return spos, tpos, np.searchsorted(spos, np.arange(n_pipe + 1))
+    
+    e1_spos, e1_tpos, e1_ptr = _sorted_pairs(*e1_pairs)
+    e2_spos, e2_tpos, e2_ptr = _sorted_pairs(*e2_pairs)
+    
+    # Resolución greedy en el orden original del pipeline: cada TED se consume
+    # una sola vez (estrategia 1 NIF+importe+año, si no, estrategia 2 expediente)
+    rows = np.union1d(e1_spos, e2_spos)
+    best = _resolve_ted_matches(rows, e1_ptr, e1_tpos, e2_ptr, e2_tpos, ted_consumed)
+    hit = best >= 0
+    match_spos, match_tpos = rows[hit], best[hit]
+    matched_idx = pipeline_valid.index[match_spos].tolist()
+    
+    # Metadatos TED: un gather por columna, solo en las posiciones con match
+    def _ted_take(col, default=''):
+        if col in ted_valid.columns:
+            return ted_valid[col].to_numpy()[match_tpos]
+        return np.full(len(match_tpos), default, dtype=object)
     
     # ── 3. Aplicar resultados ──
     df_pipeline['_ted_validated'] = False
     df_pipeline.loc[matched_idx, '_ted_validated'] = True
     
-    # Columnas de enriquecimiento
+    # Columnas de enriquecimiento: (valores por match, default, numérica)
     enrich_cols = {
-        '_ted_n_ofertas': np.nan,
-        '_ted_cpv': '',
-        '_ted_id': '',
-        '_ted_win_size': '',
-        '_ted_direct_award': '',
-        '_ted_sme_part': '',
-        '_ted_buyer_legal_type': '',
-        '_ted_duration': np.nan,
-        '_ted_award_criterion': '',
-        '_ted_internal_id': '',
+        '_ted_n_ofertas': (_ted_take('number_offers', np.nan), np.nan, True),
+        '_ted_cpv': (_ted_take('cpv'), '', False),
+        '_ted_id': (_ted_take('ted_notice_id'), '', False),
+        '_ted_win_size': (_ted_take('win_size'), '', False),
+        '_ted_direct_award': (_ted_take('direct_award_justification'), '', False),
+        '_ted_sme_part': (_ted_take('sme_participation'), '', False),
+        '_ted_buyer_legal_type': (_ted_take('buyer_legal_type'), '', False),
+        '_ted_duration': (_ted_take('duration_lot', np.nan), np.nan, True),
+        '_ted_award_criterion': (_ted_take('award_criterion_type'), '', False),
+        '_ted_internal_id': (_ted_take('internal_id_proc'), '', False),
     }
-    for col, default in enrich_cols.items():
-        df_pipeline[col] = default
     
-    for idx, data in match_data.items():
-        df_pipeline.loc[idx, '_ted_n_ofertas'] = pd.to_numeric(
-            data['ted_n_ofertas'], errors='coerce'
-        )
-        df_pipeline.loc[idx, '_ted_cpv'] = str(data['ted_cpv'])
-        df_pipeline.loc[idx, '_ted_id'] = str(data['ted_id'])
-        df_pipeline.loc[idx, '_ted_win_size'] = str(data.get('ted_win_size', ''))
-        df_pipeline.loc[idx, '_ted_direct_award'] = str(data.get('ted_direct_award', ''))
-        df_pipeline.loc[idx, '_ted_sme_part'] = str(data.get('ted_sme_part', ''))
-        df_pipeline.loc[idx, '_ted_buyer_legal_type'] = str(data.get('ted_buyer_legal_type', ''))
-        df_pipeline.loc[idx, '_ted_duration'] = pd.to_numeric(
-            data.get('ted_duration', np.nan), errors='coerce'
-        )
-        df_pipeline.loc[idx, '_ted_award_criterion'] = str(data.get('ted_award_criterion', ''))
-        df_pipeline.loc[idx, '_ted_internal_id'] = str(data.get('ted_internal_id', ''))
+    # Una escritura por columna: filas del pipeline con match → posición en
+    # matched_idx (con etiquetas repetidas gana el último match, como con .loc)
+    matched_labels = pd.Index(matched_idx)
+    last = ~matched_labels.duplicated(keep='last')
+    hit_rows = df_pipeline.index.isin(matched_labels)
+    take = np.flatnonzero(last)[matched_labels[last].get_indexer(df_pipeline.index[hit_rows])]
+    for col, (values, default, numeric) in enrich_cols.items():
+        df_pipeline[col] = default
+        values = values[take]
+        if numeric:
+            values = pd.to_numeric(values, errors='coerce')
+        else:
+            values = np.array([str(x) for x in values], dtype=object)
+        df_pipeline.loc[hit_rows, col] = values
     
     n_matched = len(matched_idx)
     _log(f"  ✅ Contratos validados por TED: {n_matched:,}")
@@ -1503,8 +2158,9 @@ def main():
     
     args = parser.parse_args()
     
-    if '-' in args.years:
-        y_start, y_end = args.years.split('-')
+    year_range = _RE_YEAR_RANGE.fullmatch(args.years)
+    if year_range:
+        y_start, y_end = year_range.groups()
         years = list(range(int(y_start), int(y_end) + 1))
     else:
         years = [int(y) for y in args.years.split(',')]
@@ -1519,7 +2175,7 @@ def main():
             if df_ted is not None:
                 df_ted = _normalize_ted_data(df_ted)
                 output_path = TEDConfig.DATA_DIR / "ted_es_can_sparql.parquet"
-                df_ted.to_parquet(output_path, index=False)
+                _write_ted_parquet(df_ted, output_path)
                 _print_ted_summary(df_ted)
         else:
             df_ted = download_ted_spain(years=years, force_redownload=args.force)
@@ -1535,12 +2191,8 @@ def main():
                 print("❌ Primero ejecuta 'download' para obtener datos TED")
                 return
             
-            df_ted = pd.read_parquet(ted_path)
-            
-            if args.pipeline_file.endswith('.parquet'):
-                df_pipeline = pd.read_parquet(args.pipeline_file)
-            else:
-                df_pipeline = pd.read_csv(args.pipeline_file)
+            df_pipeline = _read_columns(args.pipeline_file, _PIPELINE_CROSSVAL_COLS)
+            df_ted = _read_ted_for_pipeline(ted_path, df_pipeline)
             
             df_result, df_missing = cross_validate_ted(df_pipeline, df_ted, 'NAC')
             
@@ -1552,7 +2204,7 @@ def main():
                     'exceso_sobre_umbral'
                 ]
                 cols_export = [c for c in cols_export if c in df_missing.columns]
-                df_missing[cols_export].to_csv(output_missing, index=False)
+                _write_csv(df_missing[cols_export], output_missing)
                 print(f"\n✅ Missing in TED: {output_missing} ({len(df_missing):,} registros)")
             
             print(f"\n📊 Pipeline enriquecido: {df_result['_ted_validated'].sum():,} validados, "
@@ -0,0 +1,233 @@
+"""Cross-validation PLACSP <-> TED: helpers vectorizados frente a la version escalar."""
+
+import importlib.util
+import sys
+from pathlib import Path
+
+import pandas as pd
+
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+MODULE_PATH = REPO_ROOT / "ted" / "run_ted_crossvalidation.py"
+SPEC = importlib.util.spec_from_file_location("run_ted_crossvalidation", MODULE_PATH)
+crossval = importlib.util.module_from_spec(SPEC)
+# Registrado en sys.modules: numba (njit(cache=True)) reimporta el módulo por
+# nombre al cargar los kernels de su caché en disco
+sys.modules[SPEC.name] = crossval
+SPEC.loader.exec_module(crossval)
+
+
+DEPENDENCIAS = [
+    "ADMINISTRACION GENERAL DEL ESTADO > Ministerio de Defensa",
+    "Sector Publico > AENA S.M.E.",
+    "Canal de Isabel II",
+    "Entidades Locales > Ayuntamiento de Madrid",
+    "ICO DIRECCION",
+    "Unico ayuntamiento",
+    "",
+    None,
+]
+
+
+class TestClassifyBuyers:
+    def test_matches_scalar_version(self):
+        is_age, is_sector = crossval.classify_buyers(pd.Series(DEPENDENCIAS, dtype=object))
+        expected = [crossval.classify_buyer(d) for d in DEPENDENCIAS]
+        assert list(zip(is_age.tolist(), is_sector.tolist())) == expected
+
+    def test_sector_excludes_age(self):
+        is_age, is_sector = crossval.classify_buyers(pd.Series(["AENA Aeropuertos"]))
+        assert bool(is_sector.iloc[0]) is True
+        assert bool(is_age.iloc[0]) is False
+
+
+class TestGetSaraThresholds:
+    def test_matches_scalar_version(self):
+        tipos = ["Obras", "Servicios", "Suministros", "Privado", "Concesion de Obras", "", "nan"]
+        rows = [
+            (ano, tipo, is_age, is_sector)
+            for ano in [2009, 2010, 2017, 2024, 2027, 2030, None]
+            for tipo in tipos
+            for is_age, is_sector in [(False, False), (True, False), (False, True)]
+        ]
+        df = pd.DataFrame(rows, columns=["_ano", "_tipo_contrato", "_is_age", "_is_sector"])
+        df["_ano"] = df["_ano"].astype(float)
+
+        umbral = crossval.get_sara_thresholds(
+            df["_ano"], df["_tipo_contrato"], df["_is_age"], df["_is_sector"]
+        )
+
+        expected = [
+            crossval.get_sara_threshold(
+                int(ano) if pd.notna(ano) else 2024, tipo, is_age, is_sector
+            )
+            for ano, tipo, is_age, is_sector in df.itertuples(index=False)
+        ]
+        for got, exp in zip(umbral.tolist(), expected):
+            if exp is None:
+                assert pd.isna(got)
+            else:
+                assert got == exp
+
+
+class TestCleanNifs:
+    def test_matches_scalar_version(self):
+        nifs = ["ES-B12345678", "es b12345678", " A28000000 ", "ESB1", "B123", "", None, float("nan"), "ESTE1234"]
+        got = crossval.clean_nifs(pd.Series(nifs, dtype=object)).tolist()
+        assert got == [crossval.clean_nif(n) for n in nifs]
+
+
+class TestNormalizeNames:
+    def test_matches_scalar_version(self):
+        names = ["Ayto. de Cádiz (Ñ)", "ayto. de cádiz (ñ)", "  A.D.I.F.  ", "Junta/Consejería", "", None, float("nan")]
+        got = crossval.normalize_names(pd.Series(names, dtype=object)).tolist()
+        assert got == [crossval.normalize_name(n) for n in names]
+
+
+class TestCSRIndexNearest:
+    def test_matches_sequential_scan(self):
+        import numpy as np
+
+        keys = ["A"] * 50 + ["B"] * 3
+        vals = [float((i * 37) % 101) * 1000 for i in range(53)]
+        index = crossval._CSRIndex(keys, [2020] * 53, list(range(53)), vals)
+        consumed = np.zeros(53, dtype=bool)
+        consumed[[3, 10, 11]] = True
+        for key in [("A", 2020), ("B", 2020), ("C", 2020)]:
+            for center, radius in [(50_000, 5_000), (0, 1_000), (100_000, 0), (37_500, 500)]:
+                best, best_diff = None, float("inf")
+                for tidx, val in index.get(key):
+                    diff = abs(val - center)
+                    if not consumed[tidx] and diff <= radius and diff < best_diff:
+                        best, best_diff = tidx, diff
+                assert index.nearest(key, center, radius, consumed) == (best, best_diff)
+
+    def test_greedy_kernel_matches_row_loop(self):
+        import numpy as np
+
+        rng = np.random.default_rng(1)
+        n_ted = 200
+        keys = rng.choice(["A", "B", "C"], n_ted).tolist()
+        years = rng.integers(2019, 2022, n_ted).tolist()
+        vals = (rng.integers(0, 40, n_ted) * 1000.0).tolist()
+        index = crossval._CSRIndex(keys, years, list(range(n_ted)), vals)
+
+        q_keys = rng.choice(["A", "B", "D"], 60).astype(object)
+        q_years = rng.integers(2018, 2023, 60).astype(float)
+        centers = rng.integers(0, 40, 60) * 1000.0 + 300
+        radii = np.full(60, 1500.0)
+        valid = rng.random(60) > 0.1
+        offsets = (0, -1, 1)
+
+        expected_consumed = np.zeros(n_ted, dtype=bool)
+        expected = []
+        for i in range(60):
+            best, best_diff = -1, float("inf")
+            if valid[i]:
+                for off in offsets:
+                    tidx, diff = index.nearest(
+                        (q_keys[i], int(q_years[i]) + off), centers[i], radii[i], expected_consumed
+                    )
+                    if diff < best_diff:
+                        best, best_diff = tidx, diff
+            if best >= 0:
+                expected_consumed[best] = True
+            expected.append((best, best_diff))
+
+        consumed = np.zeros(n_ted, dtype=bool)
+        yrs = np.where(valid, q_years, 0).astype(np.int64)
+        codes = np.stack([index.codes_of(q_keys, yrs + off) for off in offsets], axis=1)
+        codes[~valid] = -1
+        best, best_diff = crossval._nearest_greedy(
+            codes, centers, radii, index.offsets, index.tidx, index.vals,
+            index.sorted_pos, index.sorted_vals, consumed,
+        )
+        assert list(zip(best.tolist(), best_diff.tolist())) == expected
+        assert (consumed == expected_consumed).all()
+
+
+class TestResolveGreedy:
+    def test_early_exit_matches_sequential_year_scan(self):
+        import numpy as np
+
+        rng = np.random.default_rng(0)
+        n_sara, n_ted, early = 40, 30, 50.0
+        offsets = crossval.YEAR_OFFSETS  # (0, 1, -1): rank -> desplazamiento de año
+        spos = rng.integers(0, n_sara, 400)
+        tpos = rng.integers(0, n_ted, 400)
+        rank = rng.integers(0, len(offsets), 400)
+        diff = rng.integers(0, 200, 400).astype(float)
+        pairs = {(s, t, r): d for s, t, r, d in zip(spos, tpos, rank, diff)}
+        spos, tpos, rank, diff = map(np.array, zip(*[(s, t, r, d) for (s, t, r), d in pairs.items()]))
+        order = np.lexsort((tpos, rank, diff, spos))
+        spos, tpos, rank, diff = spos[order], tpos[order], rank[order], diff[order]
+        ptr = np.searchsorted(spos, np.arange(n_sara + 1))
+        empty_ptr = np.zeros(n_sara + 1, dtype=np.int64)
+        rows = np.unique(spos)
+        step = np.abs(np.array(offsets))[rank]
+
+        got, kind = crossval._resolve_greedy(
+            rows, ptr, tpos, diff, step, empty_ptr, np.empty(0, dtype=np.int64),
+            np.zeros(n_ted, dtype=bool), early,
+        )
+
+        # Recorrido secuencial: por yr_offset k se miran yr+k e yr-k y solo
+        # despues se corta si ya hay un match por debajo de early
+        consumed = set()
+        expected = []
+        for p in rows:
+            best, best_diff = -1, float("inf")
+            for k in range(max(abs(o) for o in offsets) + 1):
+                for r in [r for r, o in enumerate(offsets) if abs(o) == k]:
+                    cands = sorted((t, d) for (s, t, rr), d in pairs.items() if s == p and rr == r)
+                    for t, d in cands:
+                        if t not in consumed and d < best_diff:
+                            best, best_diff = t, d
+                if best_diff < early:
+                    break
+            if best >= 0:
+                consumed.add(best)
+            expected.append(best)
+        assert got.tolist() == expected
+
+    def test_exact_previous_year_beats_near_exact_next_year(self):
+        import numpy as np
+
+        # Fila 0: yr+1 con diff 10 (rank 1) e yr-1 con diff 0 (rank 2)
+        ptr = np.array([0, 2])
+        tpos = np.array([1, 0])
+        diff = np.array([0.0, 10.0])
+        step = np.array([1, 1])
+        got, _ = crossval._resolve_greedy(
+            np.array([0]), ptr, tpos, diff, step, np.zeros(2, dtype=np.int64),
+            np.empty(0, dtype=np.int64), np.zeros(2, dtype=bool), 50.0,
+        )
+        assert got.tolist() == [1]
+
+
+class TestDowncastForOutput:
+    def test_casts_only_lossless_columns(self):
+        df = pd.DataFrame({"ano": [2019, 2024], "_ted_n_ofertas": [3.0, float("nan")]})
+        out = crossval.downcast_for_output(df)
+        assert str(out["ano"].dtype) == "int16"
+        assert str(out["_ted_n_ofertas"].dtype) == "float32"
+        assert out["ano"].tolist() == [2019, 2024]
+
+    def test_keeps_fractional_and_out_of_range_values(self):
+        df = pd.DataFrame({"ano": [2019, 70_000], "_ted_n_ofertas": [2.5, 1.0]})
+        out = crossval.downcast_for_output(df)
+        assert str(out["ano"].dtype) == "int64"
+        assert str(out["_ted_n_ofertas"].dtype) == "float64"
+
+
+class TestToOutputTable:
+    def test_categoricals_are_written_as_plain_strings(self, tmp_path):
+        organs = pd.Categorical(["Ayto A", None, "Ayto A"], categories=[f"Org {i}" for i in range(50)] + ["Ayto A"])
+        df = pd.DataFrame({"organo_contratante": organs, "ano": [2019, 2020, 2020]})
+        path = tmp_path / "out.parquet"
+        crossval.write_output_parquet(crossval.to_output_table(df, ["organo_contratante", "ano"]), path)
+        out = pd.read_parquet(path)
+        assert out["organo_contratante"].dtype == object
+        assert out["organo_contratante"].tolist() == ["Ayto A", None, "Ayto A"]
+        assert str(out["ano"].dtype) == "int16"
+        assert len(out.groupby(["organo_contratante", "ano"]).size()) == 2
@@ -0,0 +1,202 @@
+"""Módulo TED: parseo de la API v3, limpieza de NIF y cross-validation."""
+
+import importlib.util
+import sys
+from pathlib import Path
+
+import pandas as pd
+
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+MODULE_PATH = REPO_ROOT / "ted" / "ted_module.py"
+SPEC = importlib.util.spec_from_file_location("ted_module", MODULE_PATH)
+ted = importlib.util.module_from_spec(SPEC)
+# Registrado en sys.modules: numba (njit(cache=True)) reimporta el módulo por
+# nombre al cargar los kernels de su caché en disco
+sys.modules[SPEC.name] = ted
+SPEC.loader.exec_module(ted)
+
+
+NOTICES = [
+    # CAN multi-lot: un registro por ganador
+    {
+        "publication-number": "123456-2023",
+        "notice-type": "can-standard",
+        "buyer-country": ["ESP"],
+        "buyer-name": {"spa": ["Ayuntamiento X"]},
+        "winner-name": {"spa": ["EMPRESA A", "EMPRESA B"]},
+        "winner-identifier": ["A12345678", "B87654321"],
+        "tender-value": ["100000", "200000"],
+    },
+    # Un solo lot con escalares en vez de listas
+    {
+        "publication-number": "654321-2022",
+        "notice-type": "can-standard",
+        "buyer-country": "ESP",
+        "winner-name": {"spa": "EMPRESA C"},
+        "winner-identifier": "C11111111",
+        "tender-value": "5000",
+    },
+    # Sin adjudicación: un solo registro aunque haya varios lots
+    {
+        "publication-number": "1-2021",
+        "notice-type": "cn-standard",
+        "winner-name": {"spa": ["X", "Y"]},
+        "tender-value": ["1", "2"],
+    },
+]
+
+
+class TestParseApiPage:
+    def test_one_record_per_lot(self):
+        df = pd.DataFrame(ted._parse_api_page(NOTICES))
+        assert df["ted_notice_id"].tolist() == ["123456-2023", "123456-2023", "654321-2022", "1-2021"]
+        assert df["win_name"].tolist() == ["EMPRESA A", "EMPRESA B", "EMPRESA C", "X"]
+        assert df["win_nationalid"].tolist() == ["A12345678", "B87654321", "C11111111", ""]
+        assert df["value_euro"].tolist() == ["100000", "200000", "5000", "1"]
+        assert df["lot_index"].tolist() == [0, 1, 0, 0]
+        assert df["year"].tolist() == ["2023", "2023", "2022", "2021"]
+
+    def test_list_and_scalar_fields_are_flattened(self):
+        df = pd.DataFrame(ted._parse_api_page(NOTICES))
+        assert df["iso_country"].tolist() == ["ESP", "ESP", "ESP", "ES"]
+        assert df["cae_name"].tolist() == ["Ayuntamiento X", "Ayuntamiento X", "", ""]
+
+    def test_columns_stay_aligned(self):
+        columns = ted._parse_api_page(NOTICES[:1])
+        columns = ted._parse_api_page(NOTICES[1:], columns)
+        assert {len(v) for v in columns.values()} == {4}
+
+
+class TestCleanWinNif:
+    NIFS = [
+        "ES-A12345678", "es a12345678", "ESB87654321", " b87654321 ",
+        "ES", "none", "N/A", None, "123",
+        "ñ1234567x", "ß12345678", "ES-ñ1234567",
+    ]
+
+    def test_strips_es_prefix_and_placeholders(self):
+        out = ted._clean_win_nif(pd.Series(self.NIFS, dtype=object))
+        assert out.tolist()[:9] == ["A12345678", "A12345678", "B87654321", "B87654321",
+                                    "", "", "", "", ""]
+
+    def test_non_ascii_matches_pandas_version(self):
+        s = pd.Series(self.NIFS, dtype=object)
+        out = ted._clean_win_nif(s)
+        assert out.tolist()[9:] == ["Ñ1234567X", "SS12345678", "ES-Ñ1234567"]
+        assert (ted._clean_nif_column(s, before_nif=True).tolist()
+                == ted._clean_nif_py(s, before_nif=True).tolist())
+
+
+def _ted(**cols):
+    n = len(cols["importe_ted"])
+    base = {"win_nif_clean": ["A12345678"] * n, "internal_id_proc": [""] * n}
+    return pd.DataFrame({**base, **cols})
+
+
+def _pipeline(**cols):
+    n = len(cols["_imp_adj"])
+    base = {"_nif": ["A12345678"] * n, "_año": [2022] * n, "_es_menor": [False] * n}
+    return pd.DataFrame({**base, **cols})
+
+
+class TestCrossValidateTed:
+    def test_year_window_tie_breaking(self):
+        # Mismo diff: primero yr, luego yr+1, luego yr-1; un diff menor
+        # gana aunque su año se visite más tarde
+        df_ted = _ted(
+            ted_notice_id=["T-2021", "T-2023", "T-2022", "T-2022-cerca"],
+            importe_ted=[100_000.0, 100_000.0, 100_000.0, 100_500.0],
+            year=[2021, 2023, 2022, 2022],
+        )
+        out, _ = ted.cross_validate_ted(_pipeline(_imp_adj=[100_000.0] * 3), df_ted, "NAC")
+        assert out["_ted_id"].tolist() == ["T-2022", "T-2023", "T-2021"]
+
+    def test_shared_ted_row_is_consumed_once(self):
+        # El mismo TED casa con la fila 0 por expediente y con la 1 por NIF:
+        # se lo queda la primera fila y la segunda queda sin match
+        df_ted = _ted(
+            ted_notice_id=["T0"], importe_ted=[200_000.0], year=[2022],
+            internal_id_proc=["EXP-0001"],
+        )
+        df_pipe = _pipeline(
+            _nif=["B87654321", "A12345678"], _imp_adj=[200_000.0, 200_000.0],
+            _expediente=["exp-0001 ", ""],
+        )
+        out, _ = ted.cross_validate_ted(df_pipe.copy(), df_ted, "NAC")
+        assert out["_ted_validated"].tolist() == [True, False]
+        assert out["_ted_id"].tolist() == ["T0", ""]
+
+        out, _ = ted.cross_validate_ted(df_pipe.iloc[::-1].reset_index(drop=True), df_ted, "NAC")
+        assert out["_ted_validated"].tolist() == [True, False]
+        assert out["_nif"].tolist() == ["A12345678", "B87654321"]
+
+
+class TestReadCsvEs:
+    def test_multiline_values_across_blocks_match_pandas(self, tmp_path):
+        import io
+
+        # DESCRIPTION no está en CSV_COLUMNS_KEEP pero el chunker la parsea igual
+        lines = ["ID_NOTICE_CAN,ISO_COUNTRY_CODE,DESCRIPTION,WIN_NAME"]
+        for i in range(200):
+            country = "ES" if i % 3 else "FR"
+            lines.append(f'{i},{country},"Obra {i}\nsegunda línea\r\ntercera",EMPRESA {i}')
+        data = ("\n".join(lines) + "\n").encode("utf-8")
+        path = tmp_path / "can.csv"
+        path.write_bytes(data)
+
+        got = ted._read_csv_es(io.BytesIO(data), 2020, block_size=256)
+        expected = ted._read_csv_es_pandas(path, 2020)
+        assert len(got) == 133
+        pd.testing.assert_frame_equal(got, expected.astype(object))
+
+
+class TestDownloadApiPeriodCache:
+    PAGE = {"totalNoticeCount": 1, "notices": NOTICES[1:2]}
+
+    def _run(self, monkeypatch, tmp_path, date_to):
+        import gzip
+        import json
+
+        cached = tmp_path / "page.json.gz"
+        cached.write_bytes(gzip.compress(json.dumps(self.PAGE).encode()))
+        monkeypatch.setattr(ted.TEDConfig, "API_PAGE_CACHE", True)
+        monkeypatch.setattr(ted, "_api_page_cache_file", lambda body: cached)
+
+        posts = []
+
+        class Response:
+            status_code = 200
+            content = json.dumps({"totalNoticeCount": 2, "notices": NOTICES[1:3]}).encode()
+
+            def raise_for_status(self):
+                pass
+
+        class Session:
+            def post(self, url, data, timeout):
+                posts.append(data)
+                return Response()
+
+            def close(self):
+                pass
+
+        monkeypatch.setattr(ted, "_new_api_session", Session)
+        columns, _ = ted._download_api_period(
+            2020, "20200101", date_to, "test", limiter=ted._RateLimiter(0),
+        )
+        return columns, posts
+
+    def test_closed_period_reads_cached_pages(self, monkeypatch, tmp_path):
+        columns, posts = self._run(monkeypatch, tmp_path, "20201231")
+        assert posts == []
+        assert columns["ted_notice_id"] == ["654321-2022"]
+
+    def test_open_period_goes_back_to_network(self, monkeypatch, tmp_path):
+        from datetime import date, timedelta
+
+        date_to = (date.today() + timedelta(days=1)).strftime("%Y%m%d")
+        columns, posts = self._run(monkeypatch, tmp_path, date_to)
+        assert len(posts) == 1
+        assert columns["ted_notice_id"] == ["654321-2022", "1-2021"]
+        # Las páginas de un periodo abierto tampoco se guardan
+        assert ted._read_api_page_cache(tmp_path / "page.json.gz") == self.PAGE